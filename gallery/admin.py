@@ -1,54 +1,42 @@
 from django.contrib import admin
 from django.urls import path, reverse
-# Импортируем модуль html целиком для наложения патча
-from django.utils import html
-from django.utils.safestring import mark_safe
+# format_html совместим с Jazzmin благодаря патчу в GalleryConfig.ready() (gallery/apps.py)
+from django.utils.html import format_html
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.http import HttpResponse, HttpResponseRedirect, HttpResponsePermanentRedirect
+from django.core.exceptions import PermissionDenied
 
-from .models import Photo, GroupingAlbum, Kindergarten, Group, ChildAlbum
-from .forms import MultiplePhotoUploadForm
-
-# === ИСПРАВЛЕНИЕ (HOTFIX) ДЛЯ JAZZMIN + DJANGO 6.0 ===
-# Сохраняем оригинальную функцию
-_original_format_html = html.format_html
+import json
+import os
 
-def patched_format_html(format_string, *args, **kwargs):
-    """
-    Патч для совместимости. Jazzmin вызывает format_html без аргументов в пагинации,
-    что вызывает TypeError в новых версиях Django.
-    Если аргументов нет, используем mark_safe.
-    """
-    if not args and not kwargs:
-        return mark_safe(format_string)
-    return _original_format_html(format_string, *args, **kwargs)
+from .models import Photo, GroupingAlbum, Kindergarten, Group, ChildAlbum, RequestProfile
+from .forms import MultiplePhotoUploadForm
+from photographer_project.routers import ReplicaChangelistMixin
 
-# Подменяем функцию в модуле django.utils.html
-html.format_html = patched_format_html
-# Используем пропатченную версию в этом файле
-format_html = patched_format_html
-# ======================================================
 
 
 # === БАЗОВЫЙ КЛАСС ===
-class BaseAlbumAdmin(admin.ModelAdmin):
+class BaseAlbumAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ('title', 'cover_thumbnail', 'parent_link_safe', 'created_at')
     search_fields = ('title',)
-    readonly_fields = ('access_token', 'cover_preview')
+    readonly_fields = ('access_token', 'cover_preview', 'published_at', 'readiness_report')
     list_per_page = 25
     save_on_top = True
 
     @admin.display(description="Обложка")
     def cover_thumbnail(self, obj):
-        if obj.cover_image:
-            return format_html('<img src="{}" width="60" height="60" style="object-fit: cover; border-radius: 4px;">', obj.cover_image.url)
+        # Готовая миниатюра (gallery/covers.py) вместо полноразмерного оригинала обложки
+        cover = obj.cover_thumb or obj.cover_image
+        if cover:
+            return format_html('<img src="{}" width="60" height="60" style="object-fit: cover; border-radius: 4px;">', cover.url)
         return "—"
 
     @admin.display(description="Текущая обложка")
     def cover_preview(self, obj):
-        if obj.cover_image:
-            return format_html('<img src="{}" style="max-height: 200px; border-radius: 5px;">', obj.cover_image.url)
+        if obj.display_cover:
+            note = "" if obj.cover_image else " (собрана из фото автоматически)"
+            return format_html('<img src="{}" style="max-height: 200px; border-radius: 5px;">{}', obj.display_cover.url, note)
         return "Нет обложки"
 
     @admin.display(description="Где находится")
@@ -63,6 +51,48 @@ class BaseAlbumAdmin(admin.ModelAdmin):
         except:
             return f"📂 {obj.parent.title}"
 
+    @admin.display(description="Готовность")
+    def readiness(self, obj):
+        report = obj.publish_report or {}
+        status = report.get('status')
+        if not status:
+            return "—"
+        if status == 'running':
+            return "⏳ Прогрев..."
+        if status == 'ready':
+            return format_html('<span style="color: green;">✔ Готово ({} фото)</span>', report.get('photos', 0))
+        if status == 'archived':
+            return "🗄 В архиве"
+        return format_html('<span style="color: red; font-weight: bold;">✘ {}</span>',
+                           report.get('error') or f"Не готово: {len(report.get('not_ready', [])) or report.get('failed', 0)}")
+
+    @admin.display(description="Отчёт о готовности")
+    def readiness_report(self, obj):
+        if not obj.publish_report:
+            return "Ещё не публиковалось"
+        return format_html('<pre style="margin: 0;">{}</pre>', json.dumps(obj.publish_report, ensure_ascii=False, indent=2))
+
+    # Действия подключают KindergartenAdmin и GroupAdmin (у детских альбомов страницы-снимка нет)
+    @admin.action(description="Опубликовать (прогреть превью и кэши)")
+    def publish(self, request, queryset):
+        from .publish import start
+        busy = start(list(queryset.values_list('id', flat=True)))
+        if busy:
+            self.message_user(request, f"Уже публикуются: {busy}.", messages.WARNING)
+        self.message_user(
+            request,
+            "Публикация запущена в фоне: проверяем превью и ресайзы, прогреваем кэши и снимаем страницы. "
+            "Результат — в колонке «Готовность».",
+            messages.SUCCESS,
+        )
+
+    @admin.action(description="Снять статические страницы")
+    def unpublish_snapshots(self, request, queryset):
+        from . import snapshots
+        for album in queryset:
+            snapshots.unpublish(album)
+        self.message_user(request, f"Снято с публикации папок: {queryset.count()}.", messages.SUCCESS)
+
     class Media:
         js = ('js/admin_copy_link.js',)
 
@@ -104,10 +134,11 @@ class ChildAlbumInline(admin.TabularInline):
 # === 1. САДИКИ ===
 @admin.register(Kindergarten)
 class KindergartenAdmin(BaseAlbumAdmin):
-    list_display = ('title', 'cover_thumbnail', 'copy_link_button', 'created_at')
+    list_display = ('title', 'cover_thumbnail', 'copy_link_button', 'readiness', 'created_at')
     exclude = ('parent', 'is_grouping', 'full_set_price', 'expires_at') 
     readonly_fields = BaseAlbumAdmin.readonly_fields + ('copy_link_button_large',)
     inlines = [GroupInline]
+    actions = ['publish', 'unpublish_snapshots']
 
     def get_queryset(self, request):
         return super().get_queryset(request).filter(is_grouping=True, parent__isnull=True)
@@ -131,11 +162,12 @@ class KindergartenAdmin(BaseAlbumAdmin):
 # === 2. ГРУППЫ ===
 @admin.register(Group)
 class GroupAdmin(BaseAlbumAdmin):
-    list_display = ('title', 'cover_thumbnail', 'parent_link_safe', 'copy_link_button', 'created_at')
+    list_display = ('title', 'cover_thumbnail', 'parent_link_safe', 'copy_link_button', 'readiness', 'created_at')
     list_filter = ('parent',) 
     exclude = ('is_grouping', 'full_set_price')
     readonly_fields = BaseAlbumAdmin.readonly_fields + ('copy_link_button_large',)
     inlines = [ChildAlbumInline]
+    actions = ['publish', 'unpublish_snapshots']
 
     def get_queryset(self, request):
         return super().get_queryset(request).filter(is_grouping=True, parent__isnull=False)
@@ -167,10 +199,23 @@ class ChildAlbumAdmin(BaseAlbumAdmin):
     list_display = ('title', 'cover_thumbnail', 'parent_link_safe', 'photo_count', 'upload_action', 'created_at')
     list_filter = ('parent',)
     exclude = ('is_grouping', 'expires_at') 
-    readonly_fields = BaseAlbumAdmin.readonly_fields + ('upload_action_large',)
+    readonly_fields = BaseAlbumAdmin.readonly_fields + ('upload_action_large', 'duplicates_action', 'archived_at')
+    actions = ['restore_from_archive']
 
     def get_queryset(self, request):
         return super().get_queryset(request).filter(is_grouping=False)
+
+    @admin.action(description="Восстановить из архива")
+    def restore_from_archive(self, request, queryset):
+        from .archive import restore_album
+        restored = 0
+        for album in queryset.filter(archived_at__isnull=False):
+            try:
+                restore_album(album)
+                restored += 1
+            except IOError as e:
+                self.message_user(request, str(e), messages.ERROR)
+        self.message_user(request, f"Восстановлено альбомов: {restored}. Продлите срок доступа у группы, иначе они снова уйдут в архив.", messages.SUCCESS)
     
     @admin.display(description="Фото")
     def photo_count(self, obj):
@@ -188,6 +233,13 @@ class ChildAlbumAdmin(BaseAlbumAdmin):
         url = reverse('admin:gallery_photo_upload_multiple') + f'?album_id={obj.id}'
         return format_html('<a class="button" href="{}" style="margin-top:5px; background-color: #28a745; color: white;">🚀 Загрузить фото</a>', url)
 
+    @admin.display(description="Похожие фото")
+    def duplicates_action(self, obj):
+        if obj.pk is None:
+            return "—"
+        url = reverse('admin:gallery_photo_duplicates') + f'?album_id={obj.id}'
+        return format_html('<a class="button" href="{}">🔍 Дубли и серии</a>', url)
+
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "parent":
             kwargs["queryset"] = Group.objects.filter(is_grouping=True, parent__isnull=False)
@@ -200,10 +252,12 @@ class ChildAlbumAdmin(BaseAlbumAdmin):
 
 
 @admin.register(Photo)
-class PhotoAdmin(admin.ModelAdmin):
+class PhotoAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     exclude = ('processed_image',)
-    list_display = ('photo_thumbnail', 'album_link', 'uploaded_at')
+    readonly_fields = ('width', 'height', 'orientation', 'captured_at', 'camera_serial', 'file_size', 'sha256', 'dhash')
+    list_display = ('photo_thumbnail', 'album_link', 'captured_at', 'uploaded_at')
     list_filter = ('album',)
+    list_select_related = ('album',)
     list_per_page = 40
     
     def add_view(self, request, form_url='', extra_context=None):
@@ -217,14 +271,15 @@ class PhotoAdmin(admin.ModelAdmin):
 
     @admin.display(description="Превью")
     def photo_thumbnail(self, obj):
-        if obj.processed_image:
-            return format_html('<img src="{}" height="60" style="border-radius: 3px;">', obj.processed_image.url)
+        if obj.image:
+            return format_html('<img src="{}" height="60" style="border-radius: 3px;">', obj.resized_url(120, 120, 'webp'))
         return "—"
 
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path('upload-multiple/', self.admin_site.admin_view(self.upload_multiple_photos), name='gallery_photo_upload_multiple'),
+            path('duplicates/', self.admin_site.admin_view(self.review_duplicates), name='gallery_photo_duplicates'),
         ]
         return custom_urls + urls
 
@@ -236,6 +291,7 @@ class PhotoAdmin(admin.ModelAdmin):
         from django.urls import reverse
         from django.shortcuts import render
         from .forms import MultiplePhotoUploadForm
+        from photographer_project import metrics
         from .models import ChildAlbum, Photo, GroupingAlbum
         
         initial_data = {}
@@ -264,10 +320,11 @@ class PhotoAdmin(admin.ModelAdmin):
                 # Принудительно отключаем проверки внешних ключей SQLite!
                 # Это пропустит сохранение, даже если схема БД слегка сломана.
                 cursor = connection.cursor()
-                try:
-                    cursor.execute('PRAGMA foreign_keys = OFF;')
-                except Exception:
-                    pass
+                if connection.vendor == 'sqlite':
+                    try:
+                        cursor.execute('PRAGMA foreign_keys = OFF;')
+                    except Exception:
+                        pass
                     
                 for image in images:
                     try:
@@ -281,14 +338,25 @@ class PhotoAdmin(admin.ModelAdmin):
                             pass # Игнорируем ошибку, чтобы загрузить остальные
                     count += 1
                     
+                metrics.inc('photosite_upload_files_total', count)
+                metrics.inc('photosite_upload_bytes_total', sum(image.size for image in images))
+
                 # Включаем проверки БД обратно
-                try:
-                    cursor.execute('PRAGMA foreign_keys = ON;')
-                except Exception:
-                    pass
+                if connection.vendor == 'sqlite':
+                    try:
+                        cursor.execute('PRAGMA foreign_keys = ON;')
+                    except Exception:
+                        pass
                 # ====================================
                 
                 self.message_user(request, f'Успешно загружено {count} фото для "{album.title}".', messages.SUCCESS)
+                # Дубли и серии лучше убрать до публикации: на них не будут рендериться ресайзы
+                from .duplicates import album_groups
+                similar = len(album_groups(album.id))
+                if similar:
+                    url = reverse('admin:gallery_photo_duplicates') + f'?album_id={album.id}'
+                    self.message_user(request, format_html(
+                        'Найдено групп похожих фото: {}. <a href="{}">Проверить</a>', similar, url), messages.WARNING)
                 return HttpResponseRedirect(reverse('admin:gallery_childalbum_change', args=[album.id]))
         else:
             form = MultiplePhotoUploadForm(initial=initial_data)
@@ -299,4 +367,92 @@ class PhotoAdmin(admin.ModelAdmin):
            opts=self.model._meta,
            title="Загрузка фото ребенка"
         )
-        return render(request, 'gallery/upload_multiple.html', context)
\ No newline at end of file
+        return render(request, 'gallery/upload_multiple.html', context)
+
+    def review_duplicates(self, request):
+        """Похожие фото альбома (gallery/duplicates.py): свернуть группу, удалить отмеченные или «не дубли»."""
+        from .duplicates import album_groups
+
+        album_id = request.POST.get('album_id') or request.GET.get('album_id')
+        album = ChildAlbum.objects.filter(pk=album_id).first() if str(album_id or '').isdigit() else None
+
+        if request.method == 'POST' and album is not None:
+            if not self.has_delete_permission(request):
+                raise PermissionDenied
+            group = Photo.objects.filter(album_id=album.id, pk__in=[
+                int(pk) for pk in request.POST.getlist('photo_ids') if pk.isdigit()])
+            action = request.POST.get('action')
+            if action == 'collapse':
+                keep = request.POST.get('keep', '')
+                if not (keep.isdigit() and group.filter(pk=keep).exists()):
+                    # Устаревшая форма (оставляемое фото уже удалили) или подмена: иначе ушла бы вся группа
+                    self.message_user(request, "Оставляемое фото не входит в группу — ничего не удалено. "
+                                               "Обновите страницу и выберите снова.", messages.ERROR)
+                    return HttpResponseRedirect(f"{request.path}?album_id={album.id}")
+                to_delete = group.exclude(pk=keep)
+            elif action == 'drop':
+                to_delete = group.filter(pk__in=[pk for pk in request.POST.getlist('drop') if pk.isdigit()])
+            else:
+                to_delete = group.none()
+            # Удаляем по одному: сигналы снимают ссылку с оригинала в CAS и обновляют страницы
+            deleted = 0
+            for photo in to_delete:
+                photo.delete()
+                deleted += 1
+            group.update(duplicate_reviewed=True)
+            self.message_user(request, f"Удалено фото: {deleted}. Остальные из группы отмечены как проверенные.", messages.SUCCESS)
+            return HttpResponseRedirect(f"{request.path}?album_id={album.id}")
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Похожие фото: дубли и серии",
+            album=album,
+            groups=album_groups(album.id) if album else [],
+        )
+        return render(request, 'gallery/duplicates_review.html', context)
+
+# === ПРОФИЛИ ЗАПРОСОВ (photographer_project/profiling.py) ===
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'view_name', 'mode', 'duration_ms', 'samples', 'user', 'download_link')
+    list_filter = ('mode', 'view_name')
+    search_fields = ('path',)
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Файл")
+    def download_link(self, obj):
+        url = reverse('admin:gallery_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, obj.file_name)
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_profile), name='gallery_requestprofile_download'),
+        ]
+        return custom_urls + urls
+
+    def download_profile(self, request, pk):
+        from django.http import FileResponse, Http404
+        profile = RequestProfile.objects.filter(pk=pk).first()
+        if profile is None or not os.path.exists(profile.file_path):
+            raise Http404
+        return FileResponse(open(profile.file_path, 'rb'), as_attachment=True, filename=profile.file_name)
+
+    def changelist_view(self, request, extra_context=None):
+        # Подсказка с личным токеном: добавьте его к адресу медленной страницы
+        from photographer_project.profiling import make_token, PARAM
+        if request.method == 'GET' and request.user.is_staff:
+            self.message_user(
+                request,
+                f"Профилировать страницу: добавьте к адресу ?{PARAM}={make_token(request.user)} "
+                f"(или &__profile_mode=cprofile для cProfile)",
+                messages.INFO,
+            )
+        return super().changelist_view(request, extra_context)
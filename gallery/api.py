@@ -0,0 +1,252 @@
+"""
+JSON API v1 для лёгкого фронтенда (PWA): /api/v1/...
+
+Доступ, как и на сайте, — по access_token альбома. Все GET-ответы несут сильный ETag
+(хэш тела) и отдают 304 на If-None-Match, так что повторный визит почти ничего не качает.
+Фото отдаются в порядке съёмки страницами по курсору (gallery/pagination.py, ключ (captured_at, id)).
+Корзина — та же, что у сайта (сессия, orders/cart.py); изменения — POST с CSRF-токеном.
+
+    GET  albums/<token>/                узел дерева: садик, группа или ребёнок
+    GET  albums/<token>/photos/?cursor= фото ребёнка с URL превью и ресайзов
+    GET  formats/                       каталог форматов продукции
+    GET  cart/                          состояние корзины
+    POST albums/<token>/cart/           начать корзину по альбому ребёнка
+    POST cart/items/                    {photo_id, format_id, quantity}
+    POST cart/items/remove/             {photo_id}
+    POST cart/full-set/                 купить весь комплект альбома корзины
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.cache import parse_etags
+from django.views.decorators.http import require_GET, require_POST
+
+from orders.cart import album_cart, cart_photo_ids, cart_total, catalog_version, full_set_cart, remove_photo, set_quantity
+from orders.models import ProductFormat
+from photographer_project.routers import use_replica
+
+from .models import GroupingAlbum, Photo
+from .pagination import InvalidCursor, keyset_page
+
+app_name = 'api_v1'
+
+
+# === ОТВЕТЫ ===
+def _body(payload):
+    return json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def json_response(request, payload, cache_control='private, no-cache'):
+    """
+    Ответ с сильным ETag. no-cache: клиент хранит ответ, но каждый раз сверяется с сервером,
+    и если ничего не поменялось, получает пустой 304.
+    """
+    body = _body(payload)
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if request.method in ('GET', 'HEAD') and (etag in if_none_match or '*' in if_none_match):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def error_response(status, message):
+    return HttpResponse(_body({'error': message}), status=status, content_type='application/json')
+
+
+def _get_album(access_token):
+    return GroupingAlbum.objects.filter(access_token=access_token).first()
+
+
+def _read_json(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# === ПРЕДСТАВЛЕНИЯ ОБЪЕКТОВ ===
+def album_kind(album):
+    if not album.is_grouping:
+        return 'child'
+    return 'group' if album.parent_id else 'kindergarten'
+
+
+def album_payload(album):
+    payload = {
+        'access_token': album.access_token,
+        'title': album.title,
+        'kind': album_kind(album),
+        'cover': album.display_cover.url if album.display_cover else None,
+        'expires_at': album.expires_at,
+        'is_expired': bool(album.expires_at and timezone.now() > album.expires_at),
+        'full_set_price': album.full_set_price,
+        'parent': album.parent.access_token if album.parent_id else None,
+    }
+    if album.is_grouping:
+        payload['children'] = [
+            {'access_token': child.access_token, 'title': child.title, 'kind': album_kind(child),
+             'cover': child.display_cover.url if child.display_cover else None}
+            for child in album.sub_albums.order_by('title').only(
+                'access_token', 'title', 'is_grouping', 'parent_id', 'cover_image',
+                'cover_tile', 'cover_tile_width', 'cover_tile_height')
+        ]
+    else:
+        payload['photo_count'] = Photo.objects.filter(album_id=album.id).count()
+        payload['photos'] = reverse('api_v1:album_photos', args=[album.access_token])
+    return payload
+
+
+def photo_payload(photo):
+    renditions = getattr(settings, 'API_RENDITIONS', {})
+    return {
+        'id': photo.id,
+        'captured_at': photo.captured_at,
+        'uploaded_at': photo.uploaded_at,
+        'preview': photo.processed_image.url if photo.processed_image else None,
+        # Размеры кадра с учётом поворота: клиент резервирует место под картинку до загрузки
+        'width': photo.display_width,
+        'height': photo.display_height,
+        'placeholder': photo.placeholder or None,
+        'renditions': {name: photo.resized_url(w, h, fmt) for name, (w, h, fmt) in renditions.items()},
+    }
+
+
+def cart_payload(cart, formats):
+    photo_ids = cart_photo_ids(cart)
+    quantities = cart.get('item_quantities', {})
+    album_id = cart.get('album_id')
+    buy_full_set = cart.get('buy_full_set', False)
+    if buy_full_set and album_id:
+        album = GroupingAlbum.objects.filter(pk=album_id).only('full_set_price').first()
+        total = album.full_set_price if album else 0
+    else:
+        total = cart_total(quantities, photo_ids, formats)
+    return {
+        'album_id': album_id,
+        'buy_full_set': buy_full_set,
+        'photo_count': len(photo_ids),
+        'quantities': {k: q for k, q in quantities.items() if q},
+        'total': total,
+        'catalog_version': catalog_version(formats),
+    }
+
+
+def _save_cart(request, cart):
+    request.session['cart'] = cart
+    request.session.modified = True
+    return json_response(request, cart_payload(cart, list(ProductFormat.objects.all())))
+
+
+# === ЧТЕНИЕ ===
+@require_GET
+@use_replica
+def album_view(request, access_token):
+    album = GroupingAlbum.objects.select_related('parent').filter(access_token=access_token).first()
+    if album is None:
+        return error_response(404, 'album not found')
+    return json_response(request, album_payload(album))
+
+
+@require_GET
+@use_replica
+def album_photos_view(request, access_token):
+    album = _get_album(access_token)
+    if album is None:
+        return error_response(404, 'album not found')
+    if album.is_grouping:
+        return error_response(404, 'not a child album')
+
+    page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+    try:
+        limit = min(max(int(request.GET.get('limit', page_size)), 1), 200)
+        photos, next_cursor = keyset_page(
+            Photo.objects.filter(album_id=album.id).only(
+                'id', 'image', 'captured_at', 'uploaded_at', 'processed_image', 'width', 'height', 'orientation',
+                'placeholder'),
+            request.GET.get('cursor'), limit)
+    except (ValueError, InvalidCursor):
+        return error_response(400, 'invalid cursor or limit')
+    return json_response(request, {
+        'photos': [photo_payload(photo) for photo in photos],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_GET
+@use_replica
+def formats_view(request):
+    formats = list(ProductFormat.objects.order_by('id'))
+    return json_response(request, {
+        'version': catalog_version(formats),
+        'formats': [{'id': f.id, 'name': f.name, 'price': f.price, 'is_collage': f.is_collage} for f in formats],
+    }, cache_control='public, no-cache')
+
+
+@require_GET
+@use_replica
+def cart_view(request):
+    return json_response(request, cart_payload(request.session.get('cart', {}), list(ProductFormat.objects.all())))
+
+
+# === ИЗМЕНЕНИЕ КОРЗИНЫ ===
+@require_POST
+def start_cart_view(request, access_token):
+    album = _get_album(access_token)
+    if album is None or album.is_grouping:
+        return error_response(404, 'child album not found')
+    photo_ids = list(Photo.objects.filter(album_id=album.id).values_list('id', flat=True))
+    return _save_cart(request, album_cart(album, photo_ids))
+
+
+@require_POST
+def cart_items_view(request):
+    data = _read_json(request)
+    try:
+        cart = set_quantity(request.session.get('cart', {}), int(data['photo_id']), int(data['format_id']),
+                            data['quantity'])
+    except (TypeError, KeyError, ValueError):
+        return error_response(400, 'expected {"photo_id", "format_id", "quantity"}')
+    return _save_cart(request, cart)
+
+
+@require_POST
+def cart_remove_view(request):
+    data = _read_json(request)
+    try:
+        cart = remove_photo(request.session.get('cart', {}), int(data['photo_id']))
+    except (TypeError, KeyError, ValueError):
+        return error_response(400, 'expected {"photo_id"}')
+    return _save_cart(request, cart)
+
+
+@require_POST
+def cart_full_set_view(request):
+    cart = request.session.get('cart', {})
+    if not cart.get('album_id'):
+        return error_response(400, 'cart has no album')
+    album = GroupingAlbum.objects.filter(pk=cart['album_id']).first()
+    if album is None:
+        return error_response(400, 'cart has no album')
+    return _save_cart(request, full_set_cart(album))
+
+
+urlpatterns = [
+    path('albums/<uuid:access_token>/', album_view, name='album'),
+    path('albums/<uuid:access_token>/photos/', album_photos_view, name='album_photos'),
+    path('albums/<uuid:access_token>/cart/', start_cart_view, name='start_cart'),
+    path('formats/', formats_view, name='formats'),
+    path('cart/', cart_view, name='cart'),
+    path('cart/items/', cart_items_view, name='cart_items'),
+    path('cart/items/remove/', cart_remove_view, name='cart_remove'),
+    path('cart/full-set/', cart_full_set_view, name='cart_full_set'),
+]
@@ -1,8 +1,33 @@
 from django.apps import AppConfig
+from django.utils import html
+from django.utils.safestring import mark_safe
+
+
+# === ИСПРАВЛЕНИЕ (HOTFIX) ДЛЯ JAZZMIN + DJANGO 6.0 ===
+def patch_format_html():
+    """
+    Патч для совместимости. Jazzmin вызывает format_html без аргументов в пагинации,
+    что вызывает TypeError в новых версиях Django.
+    Если аргументов нет, используем mark_safe.
+    """
+    original = html.format_html
+    if getattr(original, '_jazzmin_compat', False):
+        return
+
+    def patched_format_html(format_string, *args, **kwargs):
+        if not args and not kwargs:
+            return mark_safe(format_string)
+        return original(format_string, *args, **kwargs)
+
+    patched_format_html._jazzmin_compat = True
+    # Подменяем функцию в модуле django.utils.html
+    html.format_html = patched_format_html
+
 
 class GalleryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gallery'
 
     def ready(self):
+        patch_format_html()
         import gallery.signals
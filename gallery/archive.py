@@ -0,0 +1,145 @@
+"""
+Перенос истёкших альбомов на "холодный" диск и восстановление обратно.
+
+archive_album(): оригиналы ребёнка упаковываются в один ZIP на COLD_STORAGE_ROOT,
+после чего с горячего диска удаляются оригиналы, превью и ресайзы
+(превью и ресайзы потом можно перегенерировать).
+restore_album(): распаковывает оригиналы обратно по тем же путям и заново
+рендерит превью.
+"""
+import os
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import GroupingAlbum, Photo
+from . import resize
+
+
+def cold_root():
+    return str(getattr(settings, 'COLD_STORAGE_ROOT', os.path.join(settings.BASE_DIR, 'cold_storage')))
+
+
+def grace_period():
+    return timedelta(days=getattr(settings, 'ARCHIVE_GRACE_DAYS', 30))
+
+
+def child_albums_under(album_ids):
+    """Все конечные альбомы (дети) внутри указанных папок — обход дерева по уровням."""
+    children = []
+    level = list(album_ids)
+    while level:
+        rows = list(GroupingAlbum.objects.filter(parent_id__in=level).values_list('id', 'is_grouping'))
+        children.extend(pk for pk, is_grouping in rows if not is_grouping)
+        level = [pk for pk, is_grouping in rows if is_grouping]
+    return children
+
+
+def find_albums_to_archive(now=None):
+    """
+    Дети, у которых истёк срок (у самого альбома или у папки выше) плюс запас ARCHIVE_GRACE_DAYS.
+    Поиск истёкших идёт по индексу на expires_at.
+    """
+    cutoff = (now or timezone.now()) - grace_period()
+    expired = GroupingAlbum.objects.filter(expires_at__lt=cutoff).values_list('id', 'is_grouping')
+    ids = set()
+    folders = []
+    for pk, is_grouping in expired:
+        if is_grouping:
+            folders.append(pk)
+        else:
+            ids.add(pk)
+    ids.update(child_albums_under(folders))
+    return GroupingAlbum.objects.filter(id__in=ids, is_grouping=False, archived_at__isnull=True).order_by('id')
+
+
+def _archive_file_path(album):
+    return os.path.join(cold_root(), str(album.created_at.year), f"album_{album.id}_{album.access_token.hex}.zip")
+
+
+def _name_shared_with_hot_photo(name, album):
+    """Тот же файл (CAS-дубликат) нужен фото из другого, не архивного альбома."""
+    return Photo.objects.filter(image=name, album__archived_at__isnull=True).exclude(album_id=album.id).exists()
+
+
+def archive_album(album):
+    """Упаковывает оригиналы альбома на холодный диск и чистит горячий. Возвращает (файлов, байт освобождено)."""
+    photos = list(Photo.objects.filter(album_id=album.id).only('id', 'image', 'processed_image'))
+    target = _archive_file_path(album)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    tmp_target = target + '.tmp'
+    with zipfile.ZipFile(tmp_target, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        written = set()
+        for photo in photos:
+            # Дубли внутри альбома (CAS) ссылаются на один файл — кладём его один раз
+            if not photo.image or photo.image.name in written:
+                continue
+            if photo.image.storage.exists(photo.image.name):
+                zf.write(photo.image.path, arcname=photo.image.name)
+                written.add(photo.image.name)
+    # Перед удалением оригиналов проверяем, что архив читается
+    with zipfile.ZipFile(tmp_target) as zf:
+        bad = zf.testzip()
+    if bad is not None:
+        os.remove(tmp_target)
+        raise IOError(f"Архив альбома #{album.id} повреждён: {bad}")
+    os.replace(tmp_target, target)
+
+    GroupingAlbum.objects.filter(pk=album.pk).update(archive_path=target, archived_at=timezone.now())
+
+    freed = 0
+    for photo in photos:
+        if photo.image and not _name_shared_with_hot_photo(photo.image.name, album):
+            path = photo.image.path
+            if os.path.exists(path):
+                freed += os.path.getsize(path)
+                # Мимо счётчика ссылок CAS: строка Photo остаётся и будет восстановлена
+                FileSystemStorage.delete(photo.image.storage, photo.image.name)
+        if photo.processed_image:
+            if default_storage.exists(photo.processed_image.name):
+                freed += default_storage.size(photo.processed_image.name)
+                default_storage.delete(photo.processed_image.name)
+        resize.drop_photo_cache(photo.id)
+
+    Photo.objects.filter(album_id=album.id).update(processed_image=None)
+    GroupingAlbum.touch(album.pk)
+    return len(photos), freed
+
+
+def restore_album(album):
+    """
+    Возвращает оригиналы из архива на горячий диск и заново рендерит превью.
+    Архив на холодном диске остаётся. Если срок доступа не продлить,
+    альбом уйдёт в архив снова при следующем запуске archive_expired_albums.
+    """
+    if not album.archive_path or not os.path.exists(album.archive_path):
+        raise IOError(f"Архив альбома #{album.id} не найден: {album.archive_path}")
+
+    storage = Photo._meta.get_field('image').storage
+    with zipfile.ZipFile(album.archive_path) as zf:
+        for member in zf.infolist():
+            if storage.exists(member.filename):
+                continue
+            path = storage.path(member.filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with zf.open(member) as src, open(path, 'wb') as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+
+    restored = 0
+    missing_preview = Q(processed_image__isnull=True) | Q(processed_image='')
+    for photo in Photo.objects.filter(missing_preview, album_id=album.id):
+        photo.create_watermarked_thumbnail()
+        Photo.objects.filter(pk=photo.pk).update(processed_image=photo.processed_image.name, placeholder=photo.placeholder)
+        restored += 1
+
+    GroupingAlbum.objects.filter(pk=album.pk).update(archived_at=None, updated_at=timezone.now())
+    return restored
@@ -0,0 +1,242 @@
+"""
+Готовые обложки папок и альбомов для страниц папок (album_list.html) и админки.
+
+Обложка загружена вручную (cover_image) — она уменьшается до нужных размеров как есть.
+Иначе собирается автоматически из превью с вотермаркой (processed_image):
+  - ребёнок — «средний» по времени съёмки кадр альбома;
+  - группа и садик — мозаика 2×2 из кадров вложенных альбомов (по одному на альбом, по порядку названий).
+Рендерятся плитка COVER_TILE_SIZE (для страниц) и миниатюра COVER_THUMB_SIZE (для админки) в WebP.
+
+Выбранные источники дают подпись (cover_signature): пока она не меняется, обложка не
+перерендеривается. Имя файла содержит подпись — новая обложка получает новый URL,
+и старую можно кэшировать сколько угодно. Старые файлы сразу не удаляются: на них ещё
+ссылаются снимки страниц (до пересборки) и закэшированные браузером страницы — их
+убирает manage.py gc_media, отсчитывая --min-age-hours от замены.
+
+Изменения фото и папок (gallery/signals.py) пересчитываются пачкой в фоне
+через COVER_REFRESH_DELAY секунд вместе с предками.
+Для существующих папок — manage.py refresh_covers.
+"""
+import hashlib
+import logging
+import os
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from . import snapshots
+from .models import GroupingAlbum, Photo
+
+logger = logging.getLogger(__name__)
+
+MOSAIC_CELLS = 4
+
+_pending = set()
+_pending_lock = threading.Lock()
+_timer = None
+
+
+def _tile_size():
+    return tuple(getattr(settings, 'COVER_TILE_SIZE', (600, 800)))
+
+
+def _thumb_size():
+    return tuple(getattr(settings, 'COVER_THUMB_SIZE', (120, 120)))
+
+
+# === ВЫБОР ИСТОЧНИКОВ ===
+def _with_preview(queryset):
+    return queryset.exclude(processed_image__isnull=True).exclude(processed_image='')
+
+
+def representative_photo(album_id):
+    """Кадр из середины альбома по времени съёмки: первые кадры часто пробные."""
+    photos = _with_preview(Photo.objects.filter(album_id=album_id)).only('id', 'processed_image')
+    count = photos.count()
+    # Срезом, а не [i]: фото могут удалить между двумя запросами — тогда строки не будет
+    middle = photos.order_by('captured_at', 'id')[count // 2:count // 2 + 1].first()
+    if middle is None and count:
+        middle = photos.order_by('captured_at', 'id').last()
+    return middle
+
+
+def _descendant_albums(album):
+    """Детские альбомы поддерева папки с фото, в порядке страниц папок (по названиям)."""
+    level = [album.id]
+    order = ['title']
+    albums = GroupingAlbum.objects.none()
+    while level:
+        nodes = GroupingAlbum.objects.filter(parent_id__in=level)
+        albums = nodes.filter(is_grouping=False)
+        if albums.exists() or not nodes.filter(is_grouping=True).exists():
+            break
+        level = list(nodes.filter(is_grouping=True).values_list('id', flat=True))
+        order.insert(0, 'parent__title')
+    has_photos = Exists(_with_preview(Photo.objects.filter(album_id=OuterRef('pk'))))
+    return albums.filter(has_photos).order_by(*order)
+
+
+def choose_sources(album):
+    """('manual', [имя файла]) | ('photos', [Photo, ...]) | (None, [])."""
+    if album.cover_image:
+        return 'manual', [album.cover_image.name]
+    if not album.is_grouping:
+        photo = representative_photo(album.id)
+        return ('photos', [photo]) if photo else (None, [])
+
+    photos = []
+    for child_id in _descendant_albums(album).values_list('id', flat=True)[:MOSAIC_CELLS]:
+        photos.append(representative_photo(child_id))
+    if 1 < len(photos) < MOSAIC_CELLS:
+        # Вложенных альбомов меньше четырёх — добираем кадры из них же
+        album_ids = list(_descendant_albums(album).values_list('id', flat=True))
+        extra = _with_preview(Photo.objects.filter(album_id__in=album_ids)).exclude(
+            id__in=[p.id for p in photos]).only('id', 'processed_image').order_by('captured_at', 'id')
+        photos += list(extra[:MOSAIC_CELLS - len(photos)])
+    if len(photos) < MOSAIC_CELLS:
+        photos = photos[:1]
+    return ('photos', photos) if photos else (None, [])
+
+
+def signature(kind, sources):
+    if kind == 'manual':
+        raw = f"manual:{sources[0]}"
+    else:
+        raw = '|'.join(f"{p.id}:{p.processed_image.name}" for p in sources)
+    raw += f"|{_tile_size()}|{_thumb_size()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+# === РЕНДЕР ===
+def _open(name, size):
+    from PIL import Image
+
+    with default_storage.open(name, 'rb') as f:
+        img = Image.open(f)
+        img.draft('RGB', (size[0] * 2, size[1] * 2))
+        img.load()
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+def render(kind, sources):
+    """Картинка обложки размера плитки (ручная — с сохранением пропорций)."""
+    from PIL import Image, ImageOps
+
+    tile = _tile_size()
+    if kind == 'manual':
+        img = ImageOps.exif_transpose(_open(sources[0], tile))
+        img.thumbnail(tile, Image.Resampling.LANCZOS)
+        return img
+    if len(sources) == 1:
+        return ImageOps.fit(_open(sources[0].processed_image.name, tile), tile, Image.Resampling.LANCZOS)
+
+    cell = (tile[0] // 2, tile[1] // 2)
+    mosaic = Image.new('RGB', (cell[0] * 2, cell[1] * 2), 'white')
+    for i, photo in enumerate(sources[:MOSAIC_CELLS]):
+        part = ImageOps.fit(_open(photo.processed_image.name, cell), cell, Image.Resampling.LANCZOS)
+        mosaic.paste(part, ((i % 2) * cell[0], (i // 2) * cell[1]))
+    return mosaic
+
+
+def _save(img, name, quality=80):
+    out = BytesIO()
+    img.save(out, format='WEBP', quality=quality, method=4)
+    return default_storage.save(name, ContentFile(out.getvalue()))
+
+
+def _retire(*names):
+    """
+    Заменённая обложка остаётся на диске для gc_media. mtime сдвигаем на «сейчас»,
+    чтобы --min-age-hours считался от замены, а не от рендера: иначе gc мог бы удалить
+    файл раньше, чем пересоберутся ссылающиеся на него снимки.
+    """
+    for name in names:
+        try:
+            os.utime(default_storage.path(name))
+        except (NotImplementedError, OSError):
+            pass
+
+
+def retire_files(album):
+    """Файлы готовой обложки удалённой папки — тоже через gc_media."""
+    _retire(*(field.name for field in (album.cover_tile, album.cover_thumb) if field))
+
+
+def refresh_cover(album, force=False):
+    """Пересобирает обложку, если изменились её источники. Возвращает True, если обложка изменилась."""
+    kind, sources = choose_sources(album)
+    new_signature = signature(kind, sources) if kind else ''
+    if (not force and new_signature == album.cover_signature
+            and (not kind or (album.cover_tile and default_storage.exists(album.cover_tile.name)))):
+        return False
+
+    old = (album.cover_tile.name if album.cover_tile else None, album.cover_thumb.name if album.cover_thumb else None)
+    fields = {'cover_signature': new_signature, 'cover_tile': None, 'cover_thumb': None,
+              'cover_tile_width': None, 'cover_tile_height': None}
+    if kind:
+        from PIL import Image, ImageOps
+
+        img = render(kind, sources)
+        prefix = f"album_covers/auto/{album.id}/{new_signature[:12]}"
+        fields['cover_tile'] = _save(img, f"{prefix}_tile.webp")
+        fields['cover_tile_width'], fields['cover_tile_height'] = img.size
+        fields['cover_thumb'] = _save(ImageOps.fit(img, _thumb_size(), Image.Resampling.LANCZOS), f"{prefix}_thumb.webp")
+
+    # .update(): без сигналов (они бы снова запланировали пересборку). Обложку показывает страница родителя
+    GroupingAlbum.objects.filter(pk=album.pk).update(**fields)
+    GroupingAlbum.touch(album.parent_id)
+    _retire(*(name for name in old if name and name not in (fields['cover_tile'], fields['cover_thumb'])))
+    for field, value in fields.items():
+        setattr(album, field, value)
+    return True
+
+
+def refresh(album_ids, force=False):
+    """Пересобирает обложки узлов и всех их предков. Возвращает id изменившихся."""
+    ids = set(album_ids)
+    level = ids
+    while level:
+        level = set(GroupingAlbum.objects.filter(pk__in=level, parent__isnull=False)
+                    .values_list('parent_id', flat=True)) - ids
+        ids |= level
+
+    changed = [album.id for album in GroupingAlbum.objects.filter(pk__in=ids) if refresh_cover(album, force)]
+    if changed:
+        parents = GroupingAlbum.objects.filter(pk__in=changed).values_list('parent_id', flat=True)
+        snapshots.schedule_rebuild(*changed, *parents)
+    return changed
+
+
+# === ФОНОВАЯ ПЕРЕСБОРКА ===
+def _run_pending():
+    global _timer
+    with _pending_lock:
+        album_ids = list(_pending)
+        _pending.clear()
+        _timer = None
+    try:
+        refresh(album_ids)
+    except Exception:
+        logger.exception("Не удалось обновить обложки %s", album_ids)
+    finally:
+        # У потока своё соединение с БД; при CONN_MAX_AGE его никто не закроет за нас
+        connection.close()
+
+
+def schedule_refresh(*album_ids):
+    """Откладывает пересборку обложек; изменения за COVER_REFRESH_DELAY склеиваются."""
+    global _timer
+    ids = {pk for pk in album_ids if pk}
+    if not ids:
+        return
+    with _pending_lock:
+        _pending.update(ids)
+        if _timer is None:
+            _timer = threading.Timer(getattr(settings, 'COVER_REFRESH_DELAY', 2.0), _run_pending)
+            _timer.daemon = True
+            _timer.start()
@@ -0,0 +1,131 @@
+"""
+Похожие фото в альбоме: случайные повторные загрузки и серии (burst) одного кадра.
+
+У каждого фото есть dHash (gallery/metadata.py). Внутри альбома хэши складываются в BK-дерево,
+и соседей в пределах расстояния Хэмминга ищем без сравнения «каждый с каждым».
+Два фото похожи, если:
+  - дубль: расстояние <= DUPLICATE_HAMMING_THRESHOLD;
+  - серия: расстояние <= BURST_HAMMING_THRESHOLD, одна камера и снято с разницей <= BURST_SECONDS.
+Похожие пары склеиваются в группы; в админке (Фотографии → «Похожие фото») группу можно
+свернуть до одного кадра, удалить отмеченные или пометить как «не дубли» — до того,
+как по альбому рендерятся ресайзы и прогревается кэш (gallery/publish.py).
+"""
+from django.conf import settings
+
+from .metadata import hamming
+from .models import Photo
+
+
+def _thresholds():
+    return (
+        getattr(settings, 'DUPLICATE_HAMMING_THRESHOLD', 6),
+        getattr(settings, 'BURST_HAMMING_THRESHOLD', 12),
+        getattr(settings, 'BURST_SECONDS', 3),
+    )
+
+
+class BKTree:
+    """Дерево Буркхарда–Келлера по расстоянию Хэмминга. Узел: (хэш, [объекты], {расстояние: узел})."""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        """[(расстояние, объект)] в пределах radius. По неравенству треугольника обходим только часть дерева."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.extend((distance, item) for item in items)
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def _is_burst(a, b, burst_seconds):
+    return (a.camera_serial and a.camera_serial == b.camera_serial
+            and abs((a.captured_at - b.captured_at).total_seconds()) <= burst_seconds)
+
+
+def find_groups(photos, include_reviewed=False):
+    """
+    Группы похожих фото: [{'kind': 'duplicate'|'burst', 'distance': макс. расстояние, 'photos': [...],
+    'keep': фото, которое предлагаем оставить}]. Группы, где все фото уже проверены, пропускаются.
+    """
+    duplicate_threshold, burst_threshold, burst_seconds = _thresholds()
+    photos = [photo for photo in photos if photo.dhash is not None]
+    tree = BKTree()
+    for photo in photos:
+        tree.add(photo.dhash, photo)
+
+    # Склеиваем пары в группы (система непересекающихся множеств)
+    parent = {photo.id: photo.id for photo in photos}
+
+    def root(photo_id):
+        while parent[photo_id] != photo_id:
+            parent[photo_id] = parent[parent[photo_id]]
+            photo_id = parent[photo_id]
+        return photo_id
+
+    pairs = {}
+    for photo in photos:
+        for distance, other in tree.search(photo.dhash, max(duplicate_threshold, burst_threshold)):
+            if other.id <= photo.id:
+                continue
+            if distance <= duplicate_threshold:
+                kind = 'duplicate'
+            elif _is_burst(photo, other, burst_seconds):
+                kind = 'burst'
+            else:
+                continue
+            parent[root(other.id)] = root(photo.id)
+            pairs[(photo.id, other.id)] = (kind, distance)
+
+    members = {}
+    for photo in photos:
+        members.setdefault(root(photo.id), []).append(photo)
+    edges = {}
+    for (first_id, _), (kind, distance) in pairs.items():
+        edges.setdefault(root(first_id), []).append((kind, distance))
+
+    groups = []
+    for group_root, group in members.items():
+        if len(group) < 2 or (not include_reviewed and all(photo.duplicate_reviewed for photo in group)):
+            continue
+        group.sort(key=lambda photo: (photo.captured_at, photo.id))
+        kinds = edges[group_root]
+        groups.append({
+            'kind': 'duplicate' if any(kind == 'duplicate' for kind, _ in kinds) else 'burst',
+            'distance': max(distance for _, distance in kinds),
+            'photos': group,
+            # Предлагаем оставить самый детальный кадр: больше пикселей, потом больше файл
+            'keep': max(group, key=lambda photo: ((photo.width or 0) * (photo.height or 0), photo.file_size or 0)),
+        })
+    groups.sort(key=lambda g: (g['photos'][0].captured_at, g['photos'][0].id))
+    return groups
+
+
+def album_groups(album_id, include_reviewed=False):
+    photos = Photo.objects.filter(album_id=album_id, dhash__isnull=False).only(
+        'id', 'album_id', 'dhash', 'duplicate_reviewed', 'captured_at', 'camera_serial',
+        'width', 'height', 'orientation', 'file_size', 'processed_image')
+    return find_groups(photos, include_reviewed)
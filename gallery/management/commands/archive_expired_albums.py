@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery.archive import archive_album, find_albums_to_archive, restore_album
+from gallery.models import GroupingAlbum
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит оригиналы альбомов с истёкшим доступом (плюс ARCHIVE_GRACE_DAYS) "
+        "в ZIP-архивы на холодном диске. С --restore возвращает альбом обратно."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать, какие альбомы уйдут в архив")
+        parser.add_argument('--restore', type=int, metavar='ALBUM_ID', help="Восстановить альбом из архива")
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            try:
+                album = GroupingAlbum.objects.get(pk=options['restore'], is_grouping=False)
+            except GroupingAlbum.DoesNotExist:
+                raise CommandError(f"Альбом #{options['restore']} не найден")
+            try:
+                count = restore_album(album)
+            except IOError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Альбом «{album.title}» восстановлен, превью: {count}"))
+            self.stdout.write("Не забудьте продлить срок доступа, иначе альбом снова уйдёт в архив.")
+            return
+
+        albums = find_albums_to_archive()
+        total_files = total_freed = 0
+        for album in albums:
+            if options['dry_run']:
+                self.stdout.write(f"  #{album.id} {album.title}")
+                continue
+            try:
+                files, freed = archive_album(album)
+            except IOError as e:
+                self.stderr.write(str(e))
+                continue
+            total_files += files
+            total_freed += freed
+            self.stdout.write(f"  #{album.id} {album.title}: {files} фото, {freed / 1024 / 1024:.1f} МБ")
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"В архив: {total_files} фото, освобождено {total_freed / 1024 / 1024 / 1024:.2f} ГБ"
+            ))
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from gallery.metadata import FIELDS, decode_small, dhash, extract, placeholder
+from gallery.models import Photo
+
+
+class Command(BaseCommand):
+    help = (
+        "Извлекает метаданные оригиналов (размеры, ориентация, дата съёмки, камера, размер, SHA-256, dHash, "
+        "заглушка LQIP) "
+        "для фото, загруженных до появления этих колонок. Повторный запуск продолжает с оставшихся."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--album', type=int, metavar='ALBUM_ID', help="Только фото одного альбома")
+        parser.add_argument('--force', action='store_true', help="Извлечь заново и для уже заполненных")
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.exclude(image='')
+        if not options['force']:
+            photos = photos.filter(Q(sha256='') | Q(dhash__isnull=True) | Q(placeholder=''))
+        if options['album']:
+            photos = photos.filter(album_id=options['album'])
+        photos = photos.only('id', 'image', 'captured_at').order_by('id')
+
+        started = time.monotonic()
+        # Оригиналы в CAS общие у одинаковых фото — каждый файл читаем один раз
+        by_name = {}
+        done = missing = 0
+        last_id = 0
+        while True:
+            batch = list(photos.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            updated = []
+            for photo in batch:
+                name = photo.image.name
+                if name not in by_name:
+                    try:
+                        with photo.image.open('rb') as f:
+                            meta = extract(f)
+                            try:
+                                small = decode_small(f, meta['orientation'])
+                                meta['dhash'], meta['placeholder'] = dhash(small), placeholder(small)
+                            except Exception:  # Pillow не разобрал картинку
+                                meta['dhash'], meta['placeholder'] = None, ''
+
+                        by_name[name] = meta
+                    except OSError:
+                        by_name[name] = None
+                meta = by_name[name]
+                if meta is None:
+                    missing += 1
+                    continue
+                # Без EXIF-даты остаётся прежняя (время загрузки): порядок в альбоме не прыгает
+                for field, value in meta.items():
+                    if value is not None or field != 'captured_at':
+                        setattr(photo, field, value)
+                updated.append(photo)
+            Photo.objects.bulk_update(updated, (*FIELDS, 'dhash', 'placeholder'))
+            done += len(updated)
+            self.stdout.write(f"  обработано {done} ({time.monotonic() - started:.0f} с)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Метаданные: {done} фото, файлов прочитано {len(by_name)}, без оригинала {missing}"
+        ))
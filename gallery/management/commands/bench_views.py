@@ -0,0 +1,259 @@
+import copy
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from gallery.models import GroupingAlbum, Photo
+from gallery.pagination import encode_cursor, keyset_queryset
+from orders.models import Order, ProductFormat
+
+# Размеры данных (параметры seed_perf). Число запросов каждой страницы обязано совпадать на всех размерах.
+SIZES = {
+    's': {'kindergartens': 1, 'groups': 2, 'children': 4, 'photos': 8},
+    'm': {'kindergartens': 2, 'groups': 3, 'children': 10, 'photos': 30},
+    'l': {'kindergartens': 3, 'groups': 4, 'children': 20, 'photos': 90},
+}
+
+# Сценарий -> имя URL для сверки с QUERY_BUDGETS
+SCENARIOS = {
+    'landing_page': 'gallery:landing',
+    'album_detail_grouping': 'gallery:album_detail',
+    'album_detail_child': 'gallery:album_detail',
+    'cart_view': 'orders:cart',
+    'update_cart_view': 'orders:update_cart',
+    'create_order_view': 'orders:create_order',
+    'order_confirmation_view': 'orders:order_confirmation',
+    'admin_order_changelist': 'admin:orders_order_changelist',
+    'admin_orderitem_changelist': 'admin:orders_orderitem_changelist',
+    'admin_photo_changelist': 'admin:gallery_photo_changelist',
+    'export_to_excel': 'admin:orders_order_changelist',
+}
+
+# Индекс, по которому обязаны идти списки фото альбома, и признаки сортировки вне индекса
+# (SQLite / PostgreSQL / MySQL)
+PHOTO_LIST_INDEX = 'photo_album_captured_idx'
+SORT_MARKERS = re.compile(r'TEMP B-TREE FOR ORDER BY|Sort Key|Using filesort')
+
+
+class Command(BaseCommand):
+    help = (
+        "Регрессионный бенчмарк страниц gallery и orders на данных seed_perf нескольких размеров "
+        "(во временной тестовой БД). Проверяет, что число SQL-запросов не растёт с объёмом данных "
+        "и не меняется относительно прошлого прогона, укладывается в QUERY_BUDGETS; время пишет в историю JSON. "
+        "EXPLAIN списков фото альбома: идут по индексу, без сортировки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', default=['s', 'm', 'l'], choices=list(SIZES))
+        parser.add_argument('--repeat', type=int, default=5, help="Замеров времени на сценарий (берётся медиана)")
+        parser.add_argument('--history', default='bench_history.json', help="Файл истории прогонов")
+        parser.add_argument('--accept', action='store_true',
+                            help="Принять новое число запросов как эталон (после осознанного изменения)")
+
+    # === СЦЕНАРИИ ===
+    def prepare(self):
+        """Объекты, по которым ходят сценарии: самый большой ребёнок, его группа, заказ, суперпользователь."""
+        child = GroupingAlbum.objects.filter(is_grouping=False, title__startswith='[perf]').order_by('id').first()
+        group = GroupingAlbum.objects.get(pk=child.parent_id)
+        photo_id = Photo.objects.filter(album_id=child.id).values_list('id', flat=True).first()
+        format_id = ProductFormat.objects.values_list('id', flat=True).first()
+        order = Order.objects.order_by('id').first()
+        User = get_user_model()
+        admin_user = User.objects.filter(username='bench').first() or User.objects.create_superuser(
+            'bench', 'bench@example.invalid', 'bench')
+        return {'child': child, 'group': group, 'photo_id': photo_id, 'format_id': format_id,
+                'order': order, 'admin': admin_user}
+
+    def scenarios(self, ctx):
+        """Имя -> функция(client, admin_client). Клиенты живут весь прогон размера (сессия с корзиной)."""
+        def cart_update(client, _):
+            return client.post(reverse('orders:update_cart'), content_type='application/json', data=json.dumps(
+                {'photo_id': ctx['photo_id'], 'format_id': ctx['format_id'], 'quantity': 2}))
+
+        def create_order(client, _):
+            # После заказа корзина очищается, поэтому в замер входит и повторное открытие альбома
+            client.get(reverse('gallery:album_detail', args=[ctx['child'].access_token]))
+            return client.post(reverse('orders:create_order'), {'customer_name': 'Бенч Тест', 'customer_phone': '+70000000001'})
+
+        def export(_, admin_client):
+            return admin_client.post(reverse('admin:orders_order_changelist'), {
+                'action': 'export_to_excel', 'select_across': '1', 'index': '0',
+                '_selected_action': [ctx['order'].id],
+            })
+
+        return {
+            'landing_page': lambda c, a: c.get(reverse('gallery:landing')),
+            'album_detail_grouping': lambda c, a: c.get(reverse('gallery:album_detail', args=[ctx['group'].access_token])),
+            'album_detail_child': lambda c, a: c.get(reverse('gallery:album_detail', args=[ctx['child'].access_token])),
+            'cart_view': lambda c, a: c.get(reverse('orders:cart')),
+            'update_cart_view': cart_update,
+            'create_order_view': create_order,
+            'order_confirmation_view': lambda c, a: c.get(reverse('orders:order_confirmation', args=[ctx['order'].id])),
+            'admin_order_changelist': lambda c, a: a.get(reverse('admin:orders_order_changelist')),
+            'admin_orderitem_changelist': lambda c, a: a.get(reverse('admin:orders_orderitem_changelist')),
+            'admin_photo_changelist': lambda c, a: a.get(reverse('admin:gallery_photo_changelist')),
+            'export_to_excel': export,
+        }
+
+    def measure(self, func, client, admin_client, repeat):
+        func(client, admin_client)  # прогрев: шаблоны, ContentType, кэши
+        timings = []
+        queries = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = func(client, admin_client)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f"HTTP {response.status_code}")
+            queries = len(captured)
+        return queries, round(statistics.median(timings), 2)
+
+    # === ПЛАНЫ ЗАПРОСОВ ===
+    def plan_queries(self, ctx):
+        """Списки фото альбома так, как их строят API и корзина: первая страница и страница после курсора."""
+        photos = Photo.objects.filter(album_id=ctx['child'].id)
+        middle = keyset_queryset(photos)[len(photos) // 2]
+        cursor = encode_cursor([middle.captured_at, middle.id])
+        return {
+            'album_photos': keyset_queryset(photos)[:25],
+            'album_photos_after_cursor': keyset_queryset(photos, cursor)[:25],
+        }
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах seq scan дешевле любого индекса; проверяем, что индекс годится
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                return queryset.explain()
+        return queryset.explain()
+
+    def check_plans(self, size, ctx):
+        problems = []
+        for name, queryset in self.plan_queries(ctx).items():
+            plan = self.explain(queryset)
+            if self.verbosity >= 2:
+                self.stdout.write(f"[{size}] {name}:\n{plan}")
+            if PHOTO_LIST_INDEX not in plan:
+                problems.append(f"{name} [{size}]: план не использует {PHOTO_LIST_INDEX}")
+            if SORT_MARKERS.search(plan):
+                problems.append(f"{name} [{size}]: сортировка вне индекса")
+        return problems
+
+    def run_size(self, size, repeat):
+        call_command('seed_perf', flush=True, verbosity=0, stdout=open(os.devnull, 'w'), **SIZES[size])
+        ctx = self.prepare()
+        self.plan_problems += self.check_plans(size, ctx)
+        client = Client()
+        client.get(reverse('gallery:album_detail', args=[ctx['child'].access_token]))
+        admin_client = Client()
+        admin_client.force_login(ctx['admin'])
+        results = {}
+        for name, func in self.scenarios(ctx).items():
+            try:
+                queries, ms = self.measure(func, client, admin_client, repeat)
+            except CommandError as e:
+                raise CommandError(f"[{size}] {name}: {e}")
+            results[name] = {'queries': queries, 'ms': ms}
+        return results
+
+    # === ПРОВЕРКИ ===
+    def find_regressions(self, by_size, previous):
+        problems = []
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        for name, url_name in SCENARIOS.items():
+            counts = {size: by_size[size][name]['queries'] for size in by_size}
+            # Небольшой разброс допустим (пустой prefetch не делает запроса), рост — нет
+            smallest = counts[next(iter(counts))]
+            if any(count > smallest for count in counts.values()):
+                problems.append(f"{name}: число запросов растёт с данными {counts}")
+            budget = budgets.get(url_name)
+            worst = max(counts.values())
+            if budget is not None and worst > budget:
+                problems.append(f"{name}: {worst} запросов при бюджете {budget} ({url_name})")
+            if previous:
+                for size, count in counts.items():
+                    old = previous.get('sizes', {}).get(size, {}).get(name)
+                    if old and old['queries'] != count:
+                        problems.append(f"{name} [{size}]: было {old['queries']} запросов, стало {count}")
+        return problems
+
+    def print_table(self, by_size, previous):
+        sizes = list(by_size)
+        self.stdout.write(f"{'сценарий':<28}" + ''.join(f"{s + ': SQL':>8}{s + ': мс':>16}" for s in sizes))
+        for name in SCENARIOS:
+            row = f"{name:<28}"
+            for size in sizes:
+                r = by_size[size][name]
+                old = (previous or {}).get('sizes', {}).get(size, {}).get(name)
+                delta = f" ({(r['ms'] - old['ms']) / old['ms'] * 100:+.0f}%)" if old and old['ms'] else ''
+                row += f"{r['queries']:>8}{(str(r['ms']) + delta):>16}"
+            self.stdout.write(row)
+
+    def temp_caches(self, root):
+        """Те же бэкенды, что в настройках, но кэш фрагментов — в root, а default — свой LocMem."""
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, config in caches.items():
+            if config['BACKEND'].endswith('FileBasedCache'):
+                config['LOCATION'] = os.path.join(root, 'cache', alias)
+            else:
+                caches[alias] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'bench-{alias}'}
+        return caches
+
+    def load_history(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.plan_problems = []
+        history = self.load_history(options['history'])
+        vendor = connection.vendor
+        previous = next((h for h in reversed(history) if h.get('vendor') == vendor), None)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            # Файлы-заглушки seed_perf и кэши пишем во временную папку: карточки из одноразовой
+            # БД не должны попадать в настоящий кэш фрагментов и вытеснять из него живые записи
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                    MEDIA_ROOT=media_root, CACHES=self.temp_caches(media_root)):
+                by_size = {}
+                for size in options['sizes']:
+                    started = time.monotonic()
+                    by_size[size] = self.run_size(size, options['repeat'])
+                    self.stdout.write(f"Размер {size}: готово за {time.monotonic() - started:.1f} с")
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.print_table(by_size, previous)
+        problems = self.find_regressions(by_size, None if options['accept'] else previous) + self.plan_problems
+
+        history.append({'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'vendor': vendor, 'sizes': by_size})
+        with open(options['history'], 'w') as f:
+            json.dump(history, f, ensure_ascii=False, indent=1)
+        self.stdout.write(f"История: {options['history']} ({len(history)} прогонов)")
+
+        if problems:
+            for problem in problems:
+                self.stderr.write(f"  {problem}")
+            raise CommandError(f"Регрессий: {len(problems)}")
+        self.stdout.write(self.style.SUCCESS("Число запросов стабильно, планы списков фото идут по индексу"))
@@ -0,0 +1,137 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from gallery.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = (
+        "Ищет в MEDIA_ROOT файлы, на которые не ссылается ни одна запись в БД "
+        "(остатки удалённых садиков, заменённые квитанции и т.п.), и удаляет их."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help="Удалить найденные файлы (по умолчанию только отчёт)")
+        parser.add_argument('--noinput', action='store_true', help="Не спрашивать подтверждение перед удалением")
+        parser.add_argument('--min-age-hours', type=float, default=1.0,
+                            help="Не трогать файлы моложе N часов (загрузки, которые ещё не попали в БД)")
+        parser.add_argument('--workers', type=int, default=8, help="Потоков для обхода диска")
+        parser.add_argument('--show', type=int, default=50, help="Сколько самых крупных сирот вывести в отчёте")
+
+    # --- Что есть в БД ---
+    def referenced_paths(self):
+        """Все пути из FileField/ImageField всех моделей, за один потоковый проход по каждой таблице."""
+        referenced = set()
+        for model in apps.get_models():
+            if model._meta.proxy:
+                continue
+            file_fields = [f.name for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+            if not file_fields:
+                continue
+            rows = model._default_manager.values_list(*file_fields).iterator(chunk_size=5000)
+            for row in rows:
+                for name in row:
+                    if name:
+                        referenced.add(name.replace('\\', '/'))
+        return referenced
+
+    # --- Что есть на диске ---
+    def _scan_tree(self, root, top):
+        found = []
+        for dirpath, dirnames, filenames in os.walk(top):
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                rel = os.path.relpath(full, root).replace('\\', '/')
+                found.append((rel, st.st_size, st.st_mtime))
+        return found
+
+    def scan_media(self, root, exclude, workers):
+        """Параллельный обход: каждая папка второго уровня обходится в своём потоке."""
+        tops = []
+        files = []
+        with os.scandir(root) as it:
+            for entry in it:
+                if entry.name in exclude:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    with os.scandir(entry.path) as sub:
+                        for sub_entry in sub:
+                            if sub_entry.is_dir(follow_symlinks=False):
+                                tops.append(sub_entry.path)
+                            elif sub_entry.is_file(follow_symlinks=False):
+                                st = sub_entry.stat()
+                                files.append((f"{entry.name}/{sub_entry.name}", st.st_size, st.st_mtime))
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat()
+                    files.append((entry.name, st.st_size, st.st_mtime))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for chunk in pool.map(lambda top: self._scan_tree(root, top), tops):
+                files.extend(chunk)
+        return files
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            raise CommandError(f"MEDIA_ROOT не найден: {root}")
+        exclude = set(getattr(settings, 'MEDIA_GC_EXCLUDE_DIRS', []))
+
+        started = time.monotonic()
+        referenced = self.referenced_paths()
+        self.stdout.write(f"Ссылок в БД: {len(referenced)}")
+
+        files = self.scan_media(root, exclude, options['workers'])
+        self.stdout.write(f"Файлов на диске: {len(files)} (обход за {time.monotonic() - started:.1f} с)")
+
+        min_mtime = time.time() - options['min_age_hours'] * 3600
+        orphans = [f for f in files if f[0] not in referenced and f[2] < min_mtime]
+        total = sum(size for _, size, _ in orphans)
+
+        orphans.sort(key=lambda f: f[1], reverse=True)
+        for rel, size, _ in orphans[:options['show']]:
+            self.stdout.write(f"  {size / 1024 / 1024:8.2f} МБ  {rel}")
+        if len(orphans) > options['show']:
+            self.stdout.write(f"  … и ещё {len(orphans) - options['show']}")
+        self.stdout.write(self.style.WARNING(
+            f"Сирот: {len(orphans)}, занимают {total / 1024 / 1024 / 1024:.2f} ГБ"
+        ))
+
+        if not options['delete'] or not orphans:
+            if orphans:
+                self.stdout.write("Это отчёт (dry-run). Для удаления запустите с --delete")
+            return
+
+        if not options['noinput']:
+            answer = input(f"Удалить {len(orphans)} файлов? Введите 'yes': ")
+            if answer != 'yes':
+                self.stdout.write("Отменено.")
+                return
+
+        deleted = freed = 0
+        deleted_names = []
+        for rel, size, _ in orphans:
+            try:
+                os.remove(os.path.join(root, rel))
+            except OSError as e:
+                self.stderr.write(f"Не удалось удалить {rel}: {e}")
+                continue
+            deleted += 1
+            freed += size
+            deleted_names.append(rel)
+
+        # Строки CAS-хранилища для удалённых файлов больше не нужны
+        for i in range(0, len(deleted_names), 500):
+            MediaBlob.objects.filter(name__in=deleted_names[i:i + 500]).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Удалено {deleted} файлов, освобождено {freed / 1024 / 1024 / 1024:.2f} ГБ"
+        ))
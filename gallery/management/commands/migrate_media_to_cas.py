@@ -0,0 +1,73 @@
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gallery.models import MediaBlob, Photo
+from gallery.storage import is_cas_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит оригиналы фото из плоской папки photos/originals/ "
+        "в контентно-адресуемое хранилище (ab/cd/<sha256>.jpg) с дедупликацией."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Только показать, что будет перенесено")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        storage = Photo._meta.get_field('image').storage
+        upload_to = Photo._meta.get_field('image').upload_to
+
+        moved = deduplicated = missing = 0
+        freed = 0
+        last_id = 0
+        while True:
+            # Пачками по id, чтобы не держать в памяти всю таблицу
+            batch = list(
+                Photo.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'image')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            for pk, old_name in batch:
+                if not old_name or is_cas_name(old_name):
+                    continue
+                if not storage.exists(old_name):
+                    missing += 1
+                    self.stderr.write(f"Нет файла: {old_name} (фото #{pk})")
+                    continue
+                if dry_run:
+                    moved += 1
+                    continue
+
+                size = storage.size(old_name)
+                # .update() мимо сигналов — ссылку в CAS берём сами, под тем же замком, что и запись файла
+                with transaction.atomic(), storage.open(old_name, 'rb') as f:
+                    # Имя вида photos/originals/<старое имя> — берётся только расширение
+                    new_name = storage.save(os.path.join(upload_to, os.path.basename(old_name)), File(f))
+                    Photo.objects.filter(pk=pk).update(image=new_name)
+                    storage.acquire(new_name)
+                moved += 1
+
+                # Такое содержимое уже было в хранилище — новый файл не записывался
+                if MediaBlob.objects.filter(name=new_name, ref_count__gt=1).exists():
+                    deduplicated += 1
+                    freed += size
+
+                # Старый файл больше никому не нужен — удаляем мимо счётчика ссылок
+                if not Photo.objects.filter(image=old_name).exists():
+                    FileSystemStorage.delete(storage, old_name)
+
+        verb = "Будет перенесено" if dry_run else "Перенесено"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb}: {moved} фото, из них дублей: {deduplicated}, нет файла: {missing}, "
+            f"освобождено: {freed / 1024 / 1024:.1f} МБ"
+        ))
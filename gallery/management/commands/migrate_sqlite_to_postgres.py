@@ -0,0 +1,115 @@
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, transaction
+
+SOURCE_ALIAS = 'sqlite_source'
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует все данные из файла SQLite (db.sqlite3) в базу DATABASES['default'] "
+        "(PostgreSQL) пачками по первичному ключу и выставляет последовательности id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(Path(settings.BASE_DIR) / 'db.sqlite3'), help="Путь к db.sqlite3")
+        parser.add_argument('--database', default='default', help="Куда копировать (алиас из DATABASES)")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--noinput', action='store_true', help="Не спрашивать подтверждение очистки целевой БД")
+
+    def _open_source(self, path):
+        if not Path(path).exists():
+            raise CommandError(f"Файл не найден: {path}")
+        # configure_settings требует алиас default в словаре — передаём его как есть
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            SOURCE_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+        })[SOURCE_ALIAS]
+
+    def _models_in_order(self):
+        """Все таблицы (включая автоматические M2M), отсортированные по зависимостям FK."""
+        app_list = [(app_config, None) for app_config in apps.get_app_configs() if app_config.models_module]
+        ordered = serializers.sort_dependencies(app_list, allow_cycles=True)
+        seen = set(ordered)
+        for model in apps.get_models(include_auto_created=True):
+            if model not in seen:
+                ordered.append(model)
+                seen.add(model)
+        return [m for m in ordered if not m._meta.proxy and m._meta.managed]
+
+    def _copy_model(self, model, target, batch_size):
+        # auto_now/auto_now_add при bulk_create перезаписали бы даты — временно выключаем
+        date_fields = [
+            f for f in model._meta.concrete_fields
+            if isinstance(f, models.DateField) and (f.auto_now or f.auto_now_add)
+        ]
+        saved_flags = [(f, f.auto_now, f.auto_now_add) for f in date_fields]
+        for f in date_fields:
+            f.auto_now = f.auto_now_add = False
+
+        copied = 0
+        last_pk = None
+        try:
+            while True:
+                qs = model._base_manager.using(SOURCE_ALIAS).order_by('pk')
+                if last_pk is not None:
+                    qs = qs.filter(pk__gt=last_pk)
+                batch = list(qs[:batch_size])
+                if not batch:
+                    break
+                model._base_manager.using(target).bulk_create(batch, batch_size=batch_size)
+                copied += len(batch)
+                last_pk = batch[-1].pk
+        finally:
+            for f, auto_now, auto_now_add in saved_flags:
+                f.auto_now, f.auto_now_add = auto_now, auto_now_add
+        return copied
+
+    def handle(self, *args, **options):
+        target = options['database']
+        connection = connections[target]
+        if connection.vendor == 'sqlite':
+            raise CommandError("Целевая БД тоже SQLite. Запустите с DJANGO_DB_ENGINE=postgres")
+        self._open_source(options['source'])
+
+        model_list = self._models_in_order()
+        tables = [m._meta.db_table for m in model_list]
+        existing = set(connection.introspection.table_names())
+        missing = [t for t in tables if t not in existing]
+        if missing:
+            raise CommandError(f"В целевой БД нет таблиц {missing}. Сначала выполните manage.py migrate")
+
+        if not options['noinput']:
+            answer = input(f"Все данные в '{target}' будут заменены данными из {options['source']}. Введите 'yes': ")
+            if answer != 'yes':
+                self.stdout.write("Отменено.")
+                return
+
+        try:
+            with transaction.atomic(using=target):
+                # Очищаем целевые таблицы (contenttypes и права создаёт migrate — копируем их как есть)
+                connection.ops.execute_sql_flush(
+                    connection.ops.sql_flush(no_style(), tables, allow_cascade=True)
+                )
+                for model in model_list:
+                    count = self._copy_model(model, target, options['batch_size'])
+                    self.stdout.write(f"  {model._meta.label}: {count}")
+
+                # id в PostgreSQL выдаются последовательностями — продолжаем с max(id)+1
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(no_style(), model_list):
+                        cursor.execute(sql)
+        except IntegrityError as e:
+            raise CommandError(
+                f"Нарушена ссылочная целостность, перенос отменён: {e}. "
+                "В исходной SQLite есть строки со ссылками на удалённые объекты."
+            )
+        finally:
+            connections[SOURCE_ALIAS].close()
+
+        self.stdout.write(self.style.SUCCESS("Готово: данные перенесены, последовательности сброшены"))
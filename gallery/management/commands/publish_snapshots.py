@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery import publish, snapshots
+from gallery.models import GroupingAlbum
+
+
+class Command(BaseCommand):
+    help = (
+        "Публикует статические снимки страниц папок (садик со всеми группами) для раздачи Nginx. "
+        "--refresh пересобирает все уже опубликованные (по cron: истечение срока меняет страницу). "
+        "--warm публикует с прогревом превью, ресайзов и кэшей (как действие «Опубликовать» в админке)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('album_ids', nargs='*', type=int, metavar='ALBUM_ID', help="Садики или группы")
+        parser.add_argument('--all', action='store_true', help="Все садики")
+        parser.add_argument('--refresh', action='store_true', help="Пересобрать опубликованные снимки")
+        parser.add_argument('--unpublish', action='store_true', help="Снять публикацию указанных папок")
+        parser.add_argument('--warm', action='store_true', help="Прогреть превью, ресайзы и кэши фрагментов")
+        parser.add_argument('--preread', action='store_true', help="С --warm: подтянуть файлы в page cache ОС")
+
+    def handle(self, *args, **options):
+        if options['refresh']:
+            published = [a.pk for a in GroupingAlbum.objects.filter(is_grouping=True) if snapshots.is_published(a)]
+            count = snapshots.rebuild(published)
+            self.stdout.write(self.style.SUCCESS(f"Пересобрано снимков: {count}"))
+            return
+
+        if options['all']:
+            albums = GroupingAlbum.objects.filter(is_grouping=True, parent__isnull=True)
+        elif options['album_ids']:
+            albums = GroupingAlbum.objects.filter(pk__in=options['album_ids'], is_grouping=True)
+            missing = set(options['album_ids']) - {a.pk for a in albums}
+            if missing:
+                raise CommandError(f"Папки не найдены: {sorted(missing)}")
+        else:
+            raise CommandError("Укажите ALBUM_ID, --all или --refresh")
+
+        for album in albums:
+            if options['unpublish']:
+                snapshots.unpublish(album)
+                self.stdout.write(f"  #{album.id} {album.title}: снято")
+            elif options['warm']:
+                report = publish.publish(album, preread=options['preread'] or None)
+                line = (f"  #{album.id} {album.title}: фото {report['photos']}, превью {report['previews_rendered']}, "
+                        f"ресайзов {report['renditions_rendered']}, карточек {report['fragments_cached']}")
+                if report['ready']:
+                    self.stdout.write(line)
+                else:
+                    self.stdout.write(self.style.WARNING(f"{line}; не готовы: {', '.join(report['not_ready'])}"))
+            else:
+                count = snapshots.publish(album)
+                self.stdout.write(f"  #{album.id} {album.title}: страниц {count}")
+        self.stdout.write(self.style.SUCCESS(f"Снимки: {snapshots.snapshot_root()}"))
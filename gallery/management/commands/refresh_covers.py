@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gallery import covers, snapshots
+from gallery.models import GroupingAlbum
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает готовые обложки папок и альбомов (плитка для страниц и миниатюра для админки). "
+        "Обложки, источники которых не изменились, пропускаются — повторный запуск дешёвый."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('album_ids', nargs='*', type=int, metavar='ALBUM_ID', help="Папки или альбомы")
+        parser.add_argument('--all', action='store_true', help="Все папки и альбомы")
+        parser.add_argument('--force', action='store_true', help="Пересобрать и неизменившиеся")
+
+    def handle(self, *args, **options):
+        if options['all']:
+            albums = GroupingAlbum.objects.all()
+        elif options['album_ids']:
+            albums = GroupingAlbum.objects.filter(pk__in=options['album_ids'])
+            missing = set(options['album_ids']) - {a.pk for a in albums}
+            if missing:
+                raise CommandError(f"Папки не найдены: {sorted(missing)}")
+        else:
+            raise CommandError("Укажите ALBUM_ID или --all")
+
+        changed, failed = [], 0
+        for album in albums.order_by('id').iterator():
+            try:
+                if covers.refresh_cover(album, force=options['force']):
+                    changed.append(album)
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"  #{album.id} {album.title}: {e}"))
+
+        # Новые обложки показывают страницы родителей — опубликованные снимки пересобираем сразу
+        pages = snapshots.rebuild([pk for album in changed for pk in (album.id, album.parent_id) if pk])
+        self.stdout.write(self.style.SUCCESS(
+            f"Обложек собрано: {len(changed)}, ошибок: {failed}, снимков пересобрано: {pages}"))
@@ -0,0 +1,217 @@
+import io
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+from PIL import Image
+
+from gallery.metadata import extract
+from gallery.models import GroupingAlbum, MediaBlob, Photo
+from gallery.storage import originals_storage
+from orders.models import Order, OrderItem, ProductFormat
+
+PREFIX = '[perf]'
+EMAIL_DOMAIN = 'perf.invalid'
+
+FORMATS = (
+    ('10x15', Decimal('150.00'), False, 50),
+    ('15x20', Decimal('250.00'), False, 25),
+    ('20x30', Decimal('450.00'), False, 12),
+    ('Магнит', Decimal('300.00'), False, 8),
+    ('Коллаж', Decimal('900.00'), True, 5),
+)
+STATUSES = (('completed', 60), ('processing', 12), ('paid', 10), ('new', 18))
+
+
+@contextmanager
+def explicit_dates(*model_classes):
+    """
+    bulk_create с auto_now_add перезаписал бы даты на 'сейчас' — на время вставки выключаем.
+    auto_now (updated_at) не трогаем: данные действительно изменены сейчас.
+    """
+    fields = [
+        f for model in model_classes for f in model._meta.concrete_fields
+        if isinstance(f, models.DateField) and f.auto_now_add
+    ]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f in fields:
+            f.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт большой детерминированный набор данных для бенчмарков: садики × группы × дети × фото "
+        "(все фото ссылаются на несколько крошечных файлов-заглушек), форматы и историю заказов. "
+        "Всё создаётся bulk_create пачками; 1M фото — считанные минуты."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kindergartens', type=int, default=5)
+        parser.add_argument('--groups', type=int, default=6, help="Групп в садике")
+        parser.add_argument('--children', type=int, default=25, help="Детей в группе")
+        parser.add_argument('--photos', type=int, default=40, help="Фото у ребёнка")
+        parser.add_argument('--order-rate', type=float, default=0.35, help="Доля детей, по которым есть заказ")
+        parser.add_argument('--days', type=int, default=365, help="На сколько дней назад растянуть историю")
+        parser.add_argument('--variants', type=int, default=16, help="Сколько разных файлов-заглушек")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true', help="Сначала удалить данные прошлого seed_perf")
+
+    # === ЗАГЛУШКИ ===
+    def placeholder_files(self, variants):
+        """Крошечные оригиналы (через CAS) и превью. Возвращает [(имя оригинала, имя превью, метаданные)]."""
+        files = []
+        for i in range(variants):
+            color = ((i * 67) % 256, (i * 151) % 256, (i * 29) % 256)
+            buffer = io.BytesIO()
+            Image.new('RGB', (64, 48), color).save(buffer, format='JPEG', quality=60)
+            original = originals_storage.save(f'photos/originals/perf_{i}.jpg', ContentFile(buffer.getvalue()))
+            preview_name = f'photos/processed/perf_placeholder_{i}.jpg'
+            if not default_storage.exists(preview_name):
+                default_storage.save(preview_name, ContentFile(buffer.getvalue()))
+            files.append((original, preview_name, extract(ContentFile(buffer.getvalue()))))
+        return files
+
+    def sync_ref_counts(self, names):
+        """Счётчик ссылок заглушек = реальное число фото на них."""
+        for name in names:
+            MediaBlob.objects.filter(name=name).update(ref_count=Photo.objects.filter(image=name).count())
+
+    # === ОЧИСТКА ===
+    def flush(self):
+        started = time.monotonic()
+        OrderItem.objects.filter(order__email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        Order.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        children = GroupingAlbum.objects.filter(title__startswith=PREFIX, is_grouping=False)
+        # Обычный delete() прошёл бы по каждому из миллиона фото ради сигнала post_delete;
+        # файлы здесь общие заглушки, их счётчики пересчитываются в конце
+        photos = Photo.objects.filter(album__in=children)
+        photos._raw_delete(photos.db)
+        GroupingAlbum.objects.filter(title__startswith=PREFIX, parent__isnull=True).delete()
+        self.stdout.write(f"Старые данные удалены за {time.monotonic() - started:.1f} с")
+
+    # === ГЕНЕРАЦИЯ ===
+    def product_formats(self):
+        formats = []
+        for name, price, is_collage, weight in FORMATS:
+            fmt, _ = ProductFormat.objects.get_or_create(name=name, defaults={'price': price, 'is_collage': is_collage})
+            formats.append((fmt, weight))
+        return formats
+
+    def make_orders(self, rng, children, photo_ids_by_child, formats, order_rate, now):
+        orders = []
+        items_by_order = []
+        format_objs = [f for f, _ in formats]
+        format_weights = [w for _, w in formats]
+        for child in children:
+            if rng.random() >= order_rate:
+                continue
+            created_at = min(child.created_at + timedelta(hours=rng.randint(2, 14 * 24)), now)
+            status = rng.choices([s for s, _ in STATUSES], [w for _, w in STATUSES])[0]
+            n = rng.randint(1, 9999)
+            orders.append(Order(
+                first_name=f'Родитель{n}', last_name='Тестовый', email=f'parent{n}@{EMAIL_DOMAIN}',
+                phone=f'+7900{n:07d}', created_at=created_at, status=status,
+                received_bonus=status == 'completed' and rng.random() < 0.2,
+            ))
+            items = []
+            photo_ids = photo_ids_by_child[child.id]
+            if rng.random() < 0.2:
+                items.append(OrderItem(price=child.full_set_price, quantity=1, is_full_set=True, album_set_id=child.id))
+            else:
+                for photo_id in rng.sample(photo_ids, min(len(photo_ids), rng.randint(1, 8))):
+                    fmt = rng.choices(format_objs, format_weights)[0]
+                    items.append(OrderItem(photo_id=photo_id, product_format=fmt, price=fmt.price,
+                                           quantity=rng.choices([1, 2, 3], [80, 15, 5])[0]))
+            items_by_order.append(items)
+
+        Order.objects.bulk_create(orders)
+        all_items = []
+        for order, items in zip(orders, items_by_order):
+            for item in items:
+                item.order_id = order.id
+                all_items.append(item)
+        OrderItem.objects.bulk_create(all_items, batch_size=self.batch_size)
+        return len(orders), len(all_items)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if options['flush']:
+            self.flush()
+        elif GroupingAlbum.objects.filter(title__startswith=PREFIX).exists():
+            # Токены доступа детерминированы --seed и совпали бы с уже созданными
+            raise CommandError("Данные seed_perf уже есть в базе. Запустите с --flush")
+
+        started = time.monotonic()
+        files = self.placeholder_files(options['variants'])
+        formats = self.product_formats()
+        now = timezone.now()
+        totals = {'albums': 0, 'photos': 0, 'orders': 0, 'items': 0}
+
+        def token():
+            return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+        with explicit_dates(GroupingAlbum, Photo, Order):
+            for k in range(options['kindergartens']):
+                created_at = now - timedelta(days=rng.randint(0, options['days']), minutes=rng.randint(0, 1440))
+                with transaction.atomic():
+                    kindergarten = GroupingAlbum.objects.create(
+                        title=f'{PREFIX} Садик {k + 1}', is_grouping=True, access_token=token(),
+                        created_at=created_at, expires_at=created_at + timedelta(days=30),
+                    )
+                    groups = GroupingAlbum.objects.bulk_create([
+                        GroupingAlbum(title=f'{PREFIX} Группа {k + 1}-{g + 1}', parent=kindergarten, is_grouping=True,
+                                      access_token=token(), created_at=created_at, expires_at=kindergarten.expires_at)
+                        for g in range(options['groups'])
+                    ])
+                    totals['albums'] += 1 + len(groups)
+
+                for g, group in enumerate(groups, start=1):
+                    with transaction.atomic():
+                        children = GroupingAlbum.objects.bulk_create([
+                            GroupingAlbum(title=f'{PREFIX} Ребёнок {k + 1}-{g}-{c + 1}',
+                                          parent=group, is_grouping=False, access_token=token(),
+                                          created_at=created_at, expires_at=group.expires_at)
+                            for c in range(options['children'])
+                        ])
+                        photos = []
+                        for child in children:
+                            for p in range(options['photos']):
+                                original, preview, meta = files[rng.randrange(len(files))]
+                                uploaded_at = created_at + timedelta(seconds=p)
+                                photos.append(Photo(album_id=child.id, image=original, processed_image=preview,
+                                                    **{**meta, 'captured_at': uploaded_at}, uploaded_at=uploaded_at))
+                        Photo.objects.bulk_create(photos, batch_size=self.batch_size)
+
+                        photo_ids_by_child = {}
+                        for photo in photos:
+                            photo_ids_by_child.setdefault(photo.album_id, []).append(photo.id)
+                        orders, items = self.make_orders(rng, children, photo_ids_by_child, formats,
+                                                         options['order_rate'], now)
+                    totals['albums'] += len(children)
+                    totals['photos'] += len(photos)
+                    totals['orders'] += orders
+                    totals['items'] += items
+                self.stdout.write(
+                    f"  садик {k + 1}/{options['kindergartens']}: всего фото {totals['photos']} "
+                    f"({time.monotonic() - started:.0f} с)"
+                )
+
+        self.sync_ref_counts([original for original, _, _ in files])
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: папок/альбомов {totals['albums']}, фото {totals['photos']}, "
+            f"заказов {totals['orders']}, позиций {totals['items']} за {time.monotonic() - started:.1f} с"
+        ))
@@ -0,0 +1,110 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# То же, что делает воркер gunicorn при старте и на первом запросе
+BOOT_CODE = (
+    "import os;"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings!r});"
+    "from django.core.wsgi import get_wsgi_application;"
+    "get_wsgi_application();"
+    "from django.urls import get_resolver;"
+    "get_resolver().url_patterns"
+)
+
+# Модули, которых не должно быть при старте воркера (грузятся лениво при первом использовании)
+HEAVY_MODULES = ('PIL', 'openpyxl', 'numpy', 'qrcode')
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет холодный старт воркера (wsgi + urlconf) в отдельном процессе с python -X importtime: "
+        "общее время, самые дорогие импорты и тяжёлые модули, попавшие в старт."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help="Сколько холодных стартов (берётся медиана)")
+        parser.add_argument('--top', type=int, default=25, help="Сколько самых дорогих модулей показать")
+        parser.add_argument('--history', help="Дописать результат в JSON-файл истории")
+
+    def boot_once(self):
+        code = BOOT_CODE.format(settings=os.environ.get('DJANGO_SETTINGS_MODULE', 'photographer_project.settings'))
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            raise CommandError(f"Старт завершился с ошибкой:\n{result.stderr[-2000:]}")
+        return elapsed, self.parse_importtime(result.stderr)
+
+    def parse_importtime(self, stderr):
+        """Строки вида 'import time:   self [us] | cumulative | imported package'."""
+        modules = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            try:
+                self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+                modules.append((name.strip(), int(self_us), int(cumulative_us), len(name) - len(name.lstrip())))
+            except ValueError:
+                continue
+        return modules
+
+    def handle(self, *args, **options):
+        runs = []
+        modules = None
+        for _ in range(max(options['runs'], 1)):
+            elapsed, modules = self.boot_once()
+            runs.append(elapsed)
+        boot_ms = statistics.median(runs) * 1000
+        import_ms = sum(self_us for _, self_us, _, _ in modules) / 1000
+
+        by_package = {}
+        for name, self_us, _, _ in modules:
+            top = name.split('.')[0]
+            by_package[top] = by_package.get(top, 0) + self_us
+
+        self.stdout.write(f"Холодный старт (медиана из {len(runs)}): {boot_ms:.0f} мс, из них импорты {import_ms:.0f} мс, "
+                          f"модулей: {len(modules)}")
+        self.stdout.write("\nПо пакетам (собственное время импорта):")
+        for package, us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:15]:
+            self.stdout.write(f"  {us / 1000:8.1f} мс  {package}")
+
+        self.stdout.write("\nСамые дорогие модули (с учётом вложенных импортов):")
+        # Только модули верхнего уровня вложенности, иначе пакет и его подмодули дублируют друг друга
+        outer = [m for m in modules if m[3] <= 2]
+        for name, self_us, cumulative_us, _ in sorted(outer, key=lambda m: m[2], reverse=True)[:options['top']]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} мс  {name}")
+
+        loaded_heavy = sorted({name.split('.')[0] for name, _, _, _ in modules} & set(HEAVY_MODULES))
+        if loaded_heavy:
+            self.stdout.write(self.style.WARNING(f"\nТяжёлые модули грузятся при старте: {', '.join(loaded_heavy)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("\nТяжёлые модули при старте не грузятся"))
+
+        if options['history']:
+            history = []
+            if os.path.exists(options['history']):
+                with open(options['history']) as f:
+                    history = json.load(f)
+            history.append({
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'boot_ms': round(boot_ms, 1),
+                'import_ms': round(import_ms, 1),
+                'modules': len(modules),
+                'heavy_loaded': loaded_heavy,
+                'packages_ms': {k: round(v / 1000, 1) for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])[:15]},
+            })
+            with open(options['history'], 'w') as f:
+                json.dump(history, f, ensure_ascii=False, indent=1)
+            if len(history) > 1:
+                change = boot_ms - history[-2]['boot_ms']
+                self.stdout.write(f"Изменение к прошлому замеру: {change:+.0f} мс")
@@ -0,0 +1,177 @@
+"""
+Метаданные оригинала, которые извлекаются один раз при загрузке и хранятся в колонках Photo:
+размеры, EXIF-ориентация, время съёмки, серийный номер камеры, размер файла и SHA-256.
+
+Файл читается одним потоковым проходом: куски идут в хэш, а первые HEAD_BYTES
+копятся в памяти — Pillow хватает заголовка (размеры и EXIF лежат в начале JPEG),
+пиксели не декодируются. Для уже загруженных фото — manage.py backfill_photo_metadata.
+
+Перцептивный хэш (dHash) для поиска похожих фото (gallery/duplicates.py) и заглушка LQIP
+(WebP ~20px в data URI, показывается, пока грузится превью) считаются при рендере превью
+из уже декодированной картинки, при досчёте — из JPEG, декодированного в 1/8.
+"""
+import base64
+import hashlib
+from datetime import datetime
+from io import BytesIO
+
+from django.utils import timezone
+
+# Заголовок с EXIF у JPEG — первые 64 КБ; с запасом на большие превью внутри EXIF
+HEAD_BYTES = 512 * 1024
+
+# EXIF-теги
+ORIENTATION = 0x0112
+DATETIME = 0x0132
+EXIF_IFD = 0x8769
+DATETIME_ORIGINAL = 0x9003
+BODY_SERIAL_NUMBER = 0xA431
+
+# Ориентации, при которых кадр повёрнут на 90°: ширина и высота при показе меняются местами
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+FIELDS = ('width', 'height', 'orientation', 'captured_at', 'camera_serial', 'file_size', 'sha256')
+
+# dHash: сетка 9×8 по яркости, 64 бита
+DHASH_SIZE = 8
+_UINT64 = 1 << 64
+
+# Заглушка LQIP: длинная сторона в пикселях; data URI выходит ~150-300 байт
+PLACEHOLDER_SIZE = 20
+
+
+def _parse_exif_datetime(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = datetime.strptime(value.strip('\x00 ')[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    # В EXIF время камеры без часового пояса — считаем его местным временем сайта
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def read_header(stream):
+    """Размеры и EXIF из заголовка изображения. Пустой словарь, если Pillow файл не разобрал."""
+    from PIL import Image
+
+    try:
+        img = Image.open(stream)
+        width, height = img.size
+        exif = img.getexif()
+        sub = exif.get_ifd(EXIF_IFD)
+    except Exception:
+        return {}
+    orientation = exif.get(ORIENTATION, 1)
+    serial = sub.get(BODY_SERIAL_NUMBER) or ''
+    return {
+        'width': width,
+        'height': height,
+        'orientation': orientation if orientation in range(1, 9) else 1,
+        'captured_at': _parse_exif_datetime(sub.get(DATETIME_ORIGINAL) or exif.get(DATETIME)),
+        'camera_serial': str(serial).strip('\x00 ')[:64],
+    }
+
+
+def extract(file):
+    """
+    Метаданные файла (django File / UploadedFile / FieldFile) за один проход.
+    Возвращает словарь по FIELDS; если изображение не разобралось, размеры — None.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    head = bytearray()
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+        if len(head) < HEAD_BYTES:
+            head += chunk[:HEAD_BYTES - len(head)]
+
+    meta = read_header(BytesIO(head))
+    if not meta and size > len(head):
+        # Редкий случай (TIFF с EXIF в конце и т.п.): Pillow нужен весь файл
+        file.seek(0)
+        meta = read_header(file)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+
+    return {
+        'width': meta.get('width'),
+        'height': meta.get('height'),
+        'orientation': meta.get('orientation', 1),
+        'captured_at': meta.get('captured_at'),
+        'camera_serial': meta.get('camera_serial', ''),
+        'file_size': size,
+        'sha256': digest.hexdigest(),
+    }
+
+
+def orient(img, orientation):
+    """
+    Поворачивает кадр по сохранённой EXIF-ориентации — без повторного разбора EXIF.
+    orientation=None (метаданные ещё не извлечены) — как раньше, через exif_transpose.
+    """
+    from PIL import Image, ImageOps
+
+    if orientation is None:
+        return ImageOps.exif_transpose(img)
+    method = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }.get(orientation)
+    if method:
+        return img.transpose(method)
+    # Как и exif_transpose, отдаём загруженный кадр: файл могут закрыть раньше, чем до пикселей дойдёт дело
+    img.load()
+    return img
+
+
+def dhash(img):
+    """
+    64-битный dHash кадра: уменьшаем до 9×8 по яркости, бит — «левый пиксель ярче правого».
+    Возвращает знаковое число (для BigIntegerField). Стоит доли миллисекунды на уже декодированной картинке.
+    """
+    from PIL import Image
+
+    small = img.resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BOX).convert('L')
+    pixels = small.tobytes()
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value - _UINT64 if value >= _UINT64 >> 1 else value
+
+
+def placeholder(img):
+    """Крошечная копия кадра как data URI (WebP): браузер растягивает её с размытием, пока грузится превью."""
+    from PIL import Image
+
+    scale = PLACEHOLDER_SIZE / max(img.size)
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    small = img.resize(size, Image.Resampling.BOX)
+    if small.mode != 'RGB':
+        small = small.convert('RGB')
+    out = BytesIO()
+    small.save(out, format='WEBP', quality=30)
+    return 'data:image/webp;base64,' + base64.b64encode(out.getvalue()).decode()
+
+
+def decode_small(file, orientation=None):
+    """Кадр из файла в уменьшенном виде для dHash и заглушки; JPEG декодируется сразу в 1/8 (draft)."""
+    from PIL import Image
+
+    file.seek(0)
+    img = Image.open(file)
+    img.draft('RGB', (DHASH_SIZE * 8, DHASH_SIZE * 8))
+    return orient(img, orientation)
+
+
+def hamming(a, b):
+    """Число различающихся битов двух 64-битных хэшей."""
+    return ((a ^ b) % _UINT64).bit_count()
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0004_mediablob_cas_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='archive_path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500, verbose_name='Архив'),
+        ),
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='В архиве с'),
+        ),
+        migrations.AlterField(
+            model_name='groupingalbum',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Срок действия доступа'),
+        ),
+    ]
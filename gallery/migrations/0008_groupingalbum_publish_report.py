@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0007_groupingalbum_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='publish_report',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Отчёт о готовности'),
+        ),
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='published_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Опубликовано'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+BATCH_SIZE = 5000
+
+
+def fill_captured_at(apps, schema_editor):
+    """Фото без даты съёмки встают по времени загрузки. Пачками: на миллионе строк без долгих блокировок."""
+    Photo = apps.get_model('gallery', 'Photo')
+    pending = Photo.objects.filter(captured_at__isnull=True)
+    while True:
+        ids = list(pending.order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        Photo.objects.filter(id__in=ids).update(captured_at=F('uploaded_at'))
+
+
+class Migration(migrations.Migration):
+    # Каждая пачка fill_captured_at коммитится отдельно
+    atomic = False
+
+    dependencies = [
+        ('gallery', '0009_photo_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_captured_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='photo',
+            name='captured_at',
+            field=models.DateTimeField(db_index=True, editable=False, verbose_name='Дата съёмки'),
+        ),
+        migrations.AlterModelOptions(
+            name='photo',
+            options={'ordering': ['captured_at', 'id'], 'verbose_name': 'Фотография', 'verbose_name_plural': 'Фотографии'},
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['album', 'captured_at', 'id'], name='photo_album_captured_idx'),
+        ),
+        migrations.AlterField(
+            model_name='photo',
+            name='album',
+            field=models.ForeignKey(db_index=False, limit_choices_to={'is_grouping': False}, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='gallery.childalbum', verbose_name='Ребёнок'),
+        ),
+    ]
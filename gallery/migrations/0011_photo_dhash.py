@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0010_photo_capture_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='dhash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='dHash'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='duplicate_reviewed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Проверено на дубли'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0012_photo_placeholder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='cover_signature',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='cover_thumb',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='album_covers/auto/', verbose_name='Обложка (миниатюра)'),
+        ),
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='cover_tile',
+            field=models.ImageField(blank=True, editable=False, height_field='cover_tile_height', null=True, upload_to='album_covers/auto/', verbose_name='Обложка (плитка)', width_field='cover_tile_width'),
+        ),
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='cover_tile_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupingalbum',
+            name='cover_tile_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
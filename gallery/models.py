@@ -1,9 +1,12 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 import uuid
 from django.core.files.base import ContentFile
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont, ImageOps
 import os
+from .metadata import ROTATED_ORIENTATIONS, dhash, extract, orient, placeholder
+from .storage import get_originals_storage
 
 # === 1. БАЗОВАЯ МОДЕЛЬ (ОБЩАЯ) ===
 class GroupingAlbum(models.Model):
@@ -20,12 +23,33 @@ class GroupingAlbum(models.Model):
     )
     cover_image = models.ImageField(upload_to='album_covers/', blank=True, null=True, verbose_name="Обложка")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # Версия страницы папки для условных GET: сдвигается и при правке вложенных папок и фото (см. touch)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     
     access_token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name="Access Token")
     
     is_grouping = models.BooleanField(default=True, editable=False)
     
-    expires_at = models.DateTimeField(blank=True, null=True, verbose_name="Срок действия доступа")
+    expires_at = models.DateTimeField(blank=True, null=True, db_index=True, verbose_name="Срок действия доступа")
+
+    # Холодное хранение (gallery/archive.py): оригиналы истёкшего альбома упакованы в ZIP
+    archive_path = models.CharField(max_length=500, blank=True, default="", editable=False, verbose_name="Архив")
+    archived_at = models.DateTimeField(blank=True, null=True, editable=False, verbose_name="В архиве с")
+
+    # Публикация с прогревом (gallery/publish.py): отчёт о готовности узла — превью, ресайзы, кэши
+    published_at = models.DateTimeField(blank=True, null=True, editable=False, verbose_name="Опубликовано")
+    publish_report = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Отчёт о готовности")
+
+    # Готовая обложка (gallery/covers.py): плитка для страниц папок и миниатюра для админки.
+    # Из cover_image или, если её нет, из превью фото; cover_signature — подпись выбранных источников
+    cover_tile = models.ImageField(
+        upload_to='album_covers/auto/', blank=True, null=True, editable=False,
+        width_field='cover_tile_width', height_field='cover_tile_height', verbose_name="Обложка (плитка)"
+    )
+    cover_tile_width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    cover_tile_height = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    cover_thumb = models.ImageField(upload_to='album_covers/auto/', blank=True, null=True, editable=False, verbose_name="Обложка (миниатюра)")
+    cover_signature = models.CharField(max_length=40, blank=True, default="", editable=False)
 
     # ИСПРАВЛЕНИЕ: Фиксированная цена 2500 по умолчанию
     full_set_price = models.DecimalField(
@@ -37,6 +61,18 @@ class GroupingAlbum(models.Model):
 
     def __str__(self):
         return self.title
+
+    @property
+    def display_cover(self):
+        """Файл обложки для показа: готовая плитка, а пока её нет — загруженная вручную (или пустое поле)."""
+        return self.cover_tile or self.cover_image
+
+    @classmethod
+    def touch(cls, *album_ids):
+        """Сдвигает updated_at папок (в т.ч. после .update() и изменений вложенных объектов)."""
+        ids = [pk for pk in album_ids if pk]
+        if ids:
+            cls.objects.filter(pk__in=ids).update(updated_at=timezone.now())
     
     class Meta:
         verbose_name = "Папка (Общая)"
@@ -89,16 +125,36 @@ class Album(GroupingAlbum):
 PhotoAlbum = ChildAlbum 
 
 
-# === 6. ФОТОГРАФИЯ ===
+# === 6. ФАЙЛЫ ОРИГИНАЛОВ (CAS) ===
+class MediaBlob(models.Model):
+    """Файл в контентно-адресуемом хранилище и число фото, которые на него ссылаются."""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Путь")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Размер, байт")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="Ссылок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Файл хранилища"
+        verbose_name_plural = "Файлы хранилища"
+
+    def __str__(self):
+        return self.name
+
+
+# === 7. ФОТОГРАФИЯ ===
 class Photo(models.Model):
     album = models.ForeignKey(
         'ChildAlbum',
         related_name='photos',
         on_delete=models.CASCADE,
         verbose_name="Ребёнок",
-        limit_choices_to={'is_grouping': False}
+        limit_choices_to={'is_grouping': False},
+        # Отдельный индекс не нужен: album_id — первая колонка photo_album_captured_idx
+        db_index=False,
     )
-    image = models.ImageField(upload_to='photos/originals/', verbose_name="Оригинальное фото")
+    # Оригиналы хранятся по SHA-256 (см. gallery/storage.py), дубликаты не занимают место
+    image = models.ImageField(upload_to='photos/originals/', storage=get_originals_storage, verbose_name="Оригинальное фото")
     
     processed_image = models.ImageField(
         upload_to='photos/processed/',
@@ -109,23 +165,80 @@ class Photo(models.Model):
     )
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата загрузки")
 
+    # Метаданные оригинала, извлекаются один раз при загрузке (gallery/metadata.py):
+    # размеры и ориентацию можно узнать, не открывая файл. Пустой sha256 — ещё не извлекались
+    width = models.PositiveIntegerField(blank=True, null=True, editable=False, verbose_name="Ширина")
+    height = models.PositiveIntegerField(blank=True, null=True, editable=False, verbose_name="Высота")
+    orientation = models.PositiveSmallIntegerField(blank=True, null=True, editable=False, verbose_name="EXIF-ориентация")
+    # EXIF DateTimeOriginal, а без него — время загрузки: по нему фото стоят в альбоме
+    captured_at = models.DateTimeField(db_index=True, editable=False, verbose_name="Дата съёмки")
+    camera_serial = models.CharField(max_length=64, blank=True, default="", db_index=True, editable=False, verbose_name="Камера (серийный №)")
+    file_size = models.PositiveBigIntegerField(blank=True, null=True, editable=False, verbose_name="Размер, байт")
+    sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True, editable=False, verbose_name="SHA-256")
+    # Перцептивный хэш для поиска дублей и серий (gallery/duplicates.py)
+    dhash = models.BigIntegerField(blank=True, null=True, editable=False, verbose_name="dHash")
+    # LQIP: data URI крошечной копии превью, вставляется в страницу вместо пустого места под фото
+    placeholder = models.TextField(blank=True, default="", editable=False, verbose_name="Заглушка (LQIP)")
+    duplicate_reviewed = models.BooleanField(default=False, editable=False, verbose_name="Проверено на дубли")
+
     class Meta:
         verbose_name = "Фотография"
         verbose_name_plural = "Фотографии"
-        ordering = ['uploaded_at']
+        # Порядок съёмки; id — для однозначности при одинаковом времени (и для keyset-пагинации)
+        ordering = ['captured_at', 'id']
+        indexes = [
+            # Список фото альбома (WHERE album_id = ? ORDER BY captured_at, id) и страницы курсором
+            # идут по индексу без сортировки
+            models.Index(fields=['album', 'captured_at', 'id'], name='photo_album_captured_idx'),
+        ]
 
     def __str__(self):
         return f"Фото #{self.id}"
 
     def save(self, *args, **kwargs):
-        if self.image and not self.processed_image:
+        # Оригинал заменили в админке — метаданные, хэш и превью старого файла больше не годятся
+        replaced = bool(self.pk and self.image and not self.image._committed)
+        if replaced:
+            self.dhash = None
+        if self.image and (replaced or not self.sha256):
+            self.extract_metadata()
+        if self.captured_at is None:
+            # Камера не записала время съёмки — фото встаёт в альбом по времени загрузки
+            self.captured_at = self.uploaded_at or timezone.now()
+        if self.image and (replaced or not self.processed_image):
             self.create_watermarked_thumbnail()
-        super().save(*args, **kwargs)
+        # Запись оригинала в CAS, INSERT и +1 к счётчику ссылок (post_save) — одной транзакцией,
+        # под замком строки MediaBlob (см. ContentAddressedStorage._save)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def extract_metadata(self):
+        """Заполняет поля метаданных из файла оригинала (см. gallery/metadata.py)."""
+        for field, value in extract(self.image).items():
+            setattr(self, field, value)
+        if not self.image._committed:
+            # CAS-хранилище возьмёт готовый хэш, а не прочитает загрузку ещё раз
+            self.image.file.sha256 = self.sha256
+
+    @property
+    def display_width(self):
+        """Ширина кадра, как его показывают (с учётом EXIF-поворота); None — метаданных нет."""
+        return self.height if self.orientation in ROTATED_ORIENTATIONS else self.width
+
+    @property
+    def display_height(self):
+        return self.width if self.orientation in ROTATED_ORIENTATIONS else self.height
 
     def create_watermarked_thumbnail(self):
+        from photographer_project.metrics import observe_time
+        with observe_time('photosite_preview_render_seconds'):
+            self._render_watermarked_thumbnail()
+
+    def _render_watermarked_thumbnail(self):
+        # Pillow грузим при первом рендере, а не при старте каждого воркера
+        from PIL import Image
         try:
-            img = Image.open(self.image)
-            img = ImageOps.exif_transpose(img) 
+            img = orient(Image.open(self.image), self.orientation)
             if img.mode != 'RGB': img = img.convert('RGB')
 
             # Увеличил качество и размер
@@ -135,35 +248,12 @@ class Photo(models.Model):
                 new_size = (int(img.width * ratio), int(img.height * ratio))
                 img = img.resize(new_size, Image.Resampling.LANCZOS)
 
-            overlay = Image.new('RGBA', img.size, (255, 255, 255, 0))
-            draw = ImageDraw.Draw(overlay)
-            width, height = img.size
-            
-            text = "photowatermark"
-            font_size = int(width / 15)
-            try: font = ImageFont.truetype("arial.ttf", font_size)
-            except IOError: font = ImageFont.load_default()
-
-            bbox = draw.textbbox((0, 0), text, font=font)
-            text_w = bbox[2] - bbox[0]
-            text_h = bbox[3] - bbox[1]
-            padding_x = text_w * 0.8
-            padding_y = text_h * 2.5
-
-            y = 0
-            while y < height:
-                x = 0
-                if int(y / padding_y) % 2 == 1: x = int(padding_x / 2)
-                while x < width:
-                    draw.text((x, y), text, font=font, fill=(255, 255, 255, 70))
-                    x += text_w + padding_x
-                y += text_h + padding_y
-
-            # draw.line((0, 0) + img.size, fill=(255, 255, 255, 50), width=2)
-            # draw.line((0, height) + (width, 0), fill=(255, 255, 255, 50), width=2)
-
-            watermarked = Image.alpha_composite(img.convert('RGBA'), overlay)
-            watermarked = watermarked.convert('RGB')
+            # Кадр уже декодирован и уменьшен — хэш и заглушка почти бесплатны
+            if self.dhash is None:
+                self.dhash = dhash(img)
+            self.placeholder = placeholder(img)
+
+            watermarked = apply_watermark(img)
 
             thumb_io = BytesIO()
             watermarked.save(thumb_io, format='JPEG', quality=95, subsampling=0)
@@ -171,4 +261,78 @@ class Photo(models.Model):
             file_name = os.path.basename(self.image.name)
             self.processed_image.save(f"watermarked_{file_name}", ContentFile(thumb_io.getvalue()), save=False)
         except Exception as e:
-            print(f"Ошибка обработки фото: {e}")
\ No newline at end of file
+            print(f"Ошибка обработки фото: {e}")
+
+    def resized_url(self, width, height, fmt='jpeg'):
+        """Подписанная ссылка на on-demand ресайз (см. gallery/resize.py)."""
+        from .resize import signed_resize_url
+        return signed_resize_url(self, width, height, fmt)
+
+
+# === 8. СЛУЖЕБНАЯ: ПРОФИЛИ ЗАПРОСОВ ===
+class RequestProfile(models.Model):
+    """Профиль одного запроса, снятый по токену персонала (см. photographer_project/profiling.py)."""
+    MODE_CHOICES = (
+        ('sample', 'Сэмплер (.folded)'),
+        ('cprofile', 'cProfile (.prof)'),
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата")
+    method = models.CharField(max_length=10, verbose_name="Метод")
+    path = models.CharField(max_length=500, verbose_name="Адрес")
+    view_name = models.CharField(max_length=200, blank=True, verbose_name="View")
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, verbose_name="Режим")
+    duration_ms = models.FloatField(verbose_name="Время, мс")
+    samples = models.PositiveIntegerField(default=0, verbose_name="Сэмплов")
+    file_name = models.CharField(max_length=255, verbose_name="Файл")
+    size = models.PositiveIntegerField(default=0, verbose_name="Размер, байт")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, verbose_name="Кто снял")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Профиль запроса"
+        verbose_name_plural = "Профили запросов"
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} мс)"
+
+    @property
+    def file_path(self):
+        from photographer_project.profiling import profile_dir
+        return os.path.join(profile_dir(), self.file_name)
+
+
+def apply_watermark(img):
+    """
+    Накладывает плиточную вотермарку на RGB-картинку и возвращает новую RGB-картинку.
+    Используется и для превью 1500px, и для on-demand ресайза.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+    overlay = Image.new('RGBA', img.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(overlay)
+    width, height = img.size
+    
+    text = "photowatermark"
+    font_size = max(int(width / 15), 1)
+    try: font = ImageFont.truetype("arial.ttf", font_size)
+    except IOError: font = ImageFont.load_default()
+
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_w = bbox[2] - bbox[0]
+    text_h = bbox[3] - bbox[1]
+    padding_x = text_w * 0.8
+    padding_y = text_h * 2.5
+
+    y = 0
+    while y < height:
+        x = 0
+        if int(y / padding_y) % 2 == 1: x = int(padding_x / 2)
+        while x < width:
+            draw.text((x, y), text, font=font, fill=(255, 255, 255, 70))
+            x += text_w + padding_x
+        y += text_h + padding_y
+
+    # draw.line((0, 0) + img.size, fill=(255, 255, 255, 50), width=2)
+    # draw.line((0, height) + (width, 0), fill=(255, 255, 255, 50), width=2)
+
+    watermarked = Image.alpha_composite(img.convert('RGBA'), overlay)
+    return watermarked.convert('RGB')
@@ -0,0 +1,86 @@
+"""
+Keyset-пагинация ("курсором") для длинных списков фото.
+
+OFFSET заставляет базу пройти все пропущенные строки, и страница N стоит O(N).
+Здесь следующая страница начинается строго после последней строки предыдущей:
+WHERE (captured_at, id) > (последний captured_at, последний id) ORDER BY captured_at, id LIMIT n —
+каждая страница стоит одинаково, сколько бы фото ни было в альбоме. Для фото альбома запрос
+идёт по индексу photo_album_captured_idx (album_id, captured_at, id) без сортировки;
+планы проверяет manage.py bench_views.
+"""
+import base64
+import json
+
+from django.db.models import DateTimeField, Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_FIELDS = ('captured_at', 'id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields=DEFAULT_FIELDS):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor(cursor)
+
+    decoded = []
+    for name, value in zip(fields, values):
+        field = model._meta.get_field(name)
+        if isinstance(field, DateTimeField):
+            value = parse_datetime(value) if isinstance(value, str) else None
+            if value is None:
+                raise InvalidCursor(cursor)
+        elif not isinstance(value, (int, str)):
+            raise InvalidCursor(cursor)
+        decoded.append(value)
+    return decoded
+
+
+def _after(fields, values):
+    """
+    (f1, f2, ...) > (v1, v2, ...) в виде Q: f1 >= v1 AND (f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...).
+    Условие f1 >= v1 лишнее по смыслу, но с ним база начинает чтение индекса сразу с курсора,
+    а не фильтрует все строки альбома от начала.
+    """
+    condition = Q()
+    for i, name in enumerate(fields):
+        step = Q(**{f'{name}__gt': values[i]})
+        for prev_name, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_name: prev_value})
+        condition |= step
+    return Q(**{f'{fields[0]}__gte': values[0]}) & condition
+
+
+def keyset_queryset(queryset, cursor=None, fields=DEFAULT_FIELDS):
+    """queryset в порядке fields, начиная строго после курсора."""
+    queryset = queryset.order_by(*fields)
+    if cursor:
+        queryset = queryset.filter(_after(fields, decode_cursor(cursor, queryset.model, fields)))
+    return queryset
+
+
+def keyset_page(queryset, cursor=None, limit=24, fields=DEFAULT_FIELDS):
+    """
+    Одна страница queryset после курсора. Возвращает (объекты, курсор следующей страницы или None).
+    Последнее поле в fields должно быть уникальным (id), иначе строки с одинаковым ключом потеряются.
+    """
+    queryset = keyset_queryset(queryset, cursor, fields)
+    # Берём на одну строку больше, чтобы без COUNT(*) узнать, есть ли следующая страница
+    items = list(queryset[:limit + 1])
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor([getattr(last, name) for name in fields])
@@ -0,0 +1,262 @@
+"""
+Публикация садика или группы с прогревом: первый родитель, открывший ссылку, не должен
+ждать холодного диска, рендера ресайзов или синхронного рендера превью с вотермаркой.
+
+Для каждого фото поддерева (в фоновом потоке, фото — параллельно в PUBLISH_WORKERS потоках):
+  1. превью (processed_image) есть на диске — иначе рендерим заново;
+  2. ресайзы из API_RENDITIONS лежат в кэше gallery/resize.py — иначе рендерим;
+  3. карточка корзины (orders/_cart_photo.html) лежит в кэше фрагментов;
+  4. при PUBLISH_PREREAD — файлы превью и ресайзов подтягиваются в page cache ОС.
+Затем пересобираются устаревшие обложки узлов (gallery/covers.py) и публикуются
+статические снимки страниц папок (gallery/snapshots.py).
+
+Итог пишется в publish_report каждого узла: у детского альбома — его фото, у папки —
+сумма по всем вложенным альбомам, снимок страницы и список неготовых альбомов.
+Отчёт пишется через .update(): сигналы не срабатывают, версия страниц не меняется.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from orders.cart import card_context
+from orders.models import ProductFormat
+
+from . import covers, resize, snapshots
+from .models import GroupingAlbum, Photo
+
+logger = logging.getLogger(__name__)
+
+# Сколько ошибок по фото хранить в отчёте альбома
+MAX_REPORTED_ERRORS = 20
+
+# Корни, которые сейчас публикуются: повторное нажатие не запускает второй прогрев
+_running = set()
+_running_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, 'PUBLISH_WORKERS', None) or min(8, os.cpu_count() or 1)
+
+
+def _renditions():
+    return list(getattr(settings, 'API_RENDITIONS', {}).values())
+
+
+def subtree(root):
+    """Папки (включая сам корень) и детские альбомы поддерева."""
+    groupings, children = [], []
+    level = [root]
+    while level:
+        groupings.extend(level)
+        nodes = list(GroupingAlbum.objects.filter(parent__in=level))
+        children.extend(node for node in nodes if not node.is_grouping)
+        level = [node for node in nodes if node.is_grouping]
+    return groupings, children
+
+
+# === ПРОГРЕВ ФОТО ===
+def _local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:  # удалённое хранилище: page cache не наш
+        return None
+
+
+def _preread(path):
+    """Подтягивает файл в page cache ОС. Возвращает размер файла."""
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if hasattr(os, 'posix_fadvise'):
+                # Ядро читает файл асинхронно, без копирования в наш процесс
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            else:
+                while f.read(1024 * 1024):
+                    pass
+            return size
+    except OSError:
+        return 0
+
+
+def warm_photo(photo, renditions, preread=False):
+    """
+    Проверяет и дорендеривает файлы одного фото. Запросов к БД не делает (работает в пуле потоков):
+    новое имя превью остаётся в photo.processed_image, сохраняет его вызывающий.
+    """
+    result = {'preview_rendered': False, 'renditions_rendered': 0, 'preread_bytes': 0, 'error': None}
+    try:
+        if not photo.image or not photo.image.storage.exists(photo.image.name):
+            result['error'] = "нет оригинала"
+            return result
+
+        if not (photo.processed_image and default_storage.exists(photo.processed_image.name)):
+            photo.processed_image = None
+            photo.create_watermarked_thumbnail()
+            if not photo.processed_image:
+                result['error'] = "не удалось отрендерить превью"
+                return result
+            result['preview_rendered'] = True
+
+        hot = [_local_path(default_storage, photo.processed_image.name)]
+        for width, height, fmt in renditions:
+            path = resize.cache_path(photo.pk, resize.rendition_version(photo), width, height, fmt)
+            if not os.path.exists(path):
+                resize.get_or_render(photo, width, height, fmt)
+                result['renditions_rendered'] += 1
+            hot.append(path)
+
+        if preread:
+            result['preread_bytes'] = sum(_preread(path) for path in hot if path)
+    except Exception as e:
+        logger.exception("Прогрев фото #%s не удался", photo.pk)
+        result['error'] = str(e) or e.__class__.__name__
+    return result
+
+
+def warm_album(album, executor, renditions, context, preread=False):
+    """Прогревает детский альбом и возвращает его отчёт."""
+    started = time.monotonic()
+    report = {
+        'photos': 0, 'previews_rendered': 0, 'renditions_rendered': 0,
+        'fragments_cached': 0, 'preread_bytes': 0, 'failed': 0, 'errors': {},
+    }
+    if album.archived_at:
+        # Оригиналы в ZIP (gallery/archive.py): сначала «Восстановить из архива»
+        report.update(status='archived', ready=False, checked_at=timezone.now().isoformat())
+        return report
+
+    photos = list(Photo.objects.filter(album_id=album.id).only(
+        'id', 'image', 'processed_image', 'uploaded_at', 'width', 'height', 'orientation', 'sha256', 'dhash', 'placeholder'))
+    report['photos'] = len(photos)
+    results = executor.map(lambda photo: warm_photo(photo, renditions, preread), photos)
+
+    for photo, result in zip(photos, results):
+        if result['error']:
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'][str(photo.pk)] = result['error']
+            report['failed'] += 1
+            continue
+        if result['preview_rendered']:
+            Photo.objects.filter(pk=photo.pk).update(
+                processed_image=photo.processed_image.name, placeholder=photo.placeholder)
+            report['previews_rendered'] += 1
+        report['renditions_rendered'] += result['renditions_rendered']
+        report['preread_bytes'] += result['preread_bytes']
+        # Рендер шаблона кладёт карточку в кэш фрагментов (уже лежащая просто читается)
+        render_to_string('orders/_cart_photo.html', {**context, 'photo': photo})
+        report['fragments_cached'] += 1
+
+    ready = not report['failed']
+    report.update(
+        status='ready' if ready else 'not_ready', ready=ready,
+        checked_at=timezone.now().isoformat(), seconds=round(time.monotonic() - started, 2),
+    )
+    return report
+
+
+# === ПУБЛИКАЦИЯ ===
+def _save_report(album_id, report, published=False):
+    fields = {'publish_report': report}
+    if published:
+        fields['published_at'] = timezone.now()
+    GroupingAlbum.objects.filter(pk=album_id).update(**fields)
+
+
+def _summary(child_reports):
+    summary = {
+        'albums': len(child_reports),
+        'not_ready': [f"#{child.id} {child.title}" for child, report in child_reports if not report['ready']],
+    }
+    for key in ('photos', 'previews_rendered', 'renditions_rendered', 'fragments_cached', 'preread_bytes'):
+        summary[key] = sum(report[key] for _, report in child_reports)
+    summary['ready'] = not summary['not_ready']
+    summary['status'] = 'ready' if summary['ready'] else 'not_ready'
+    return summary
+
+
+def publish(root, preread=None):
+    """
+    Прогревает поддерево садика или группы, публикует снимки страниц папок и пишет отчёты
+    о готовности во все узлы. Возвращает отчёт корня.
+    """
+    if preread is None:
+        preread = getattr(settings, 'PUBLISH_PREREAD', False)
+    started = time.monotonic()
+    started_at = timezone.now().isoformat()
+    _save_report(root.id, {'status': 'running', 'started_at': started_at})
+
+    groupings, children = subtree(root)
+    renditions = _renditions()
+    context = card_context(list(ProductFormat.objects.all()))
+
+    reports = {}
+    with ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='publish') as executor:
+        for child in children:
+            reports[child.id] = warm_album(child, executor, renditions, context, preread)
+            _save_report(child.id, reports[child.id], published=True)
+
+    # Превью уже на месте — обложки собираются из них; неизменившиеся пропускаются по подписи
+    covers_rendered = 0
+    for node in [*children, *groupings]:
+        try:
+            covers_rendered += covers.refresh_cover(node)
+        except Exception:
+            logger.exception("Не удалось собрать обложку #%s", node.id)
+
+    if snapshots.enabled():
+        snapshots.publish(root)
+
+    # Папка отвечает за все альбомы под ней, а не только за прямых детей
+    parents = {node.id: node.parent_id for node in groupings}
+    under = {node.id: [] for node in groupings}
+    for child in children:
+        node_id = child.parent_id
+        while node_id in under:
+            under[node_id].append((child, reports[child.id]))
+            node_id = parents[node_id]
+
+    root_report = None
+    for node in groupings:
+        report = _summary(under[node.id])
+        report['snapshot'] = snapshots.is_published(node)
+        if node.id == root.id:
+            report.update(started_at=started_at, seconds=round(time.monotonic() - started, 2),
+                          covers_rendered=covers_rendered)
+            root_report = report
+        report['checked_at'] = timezone.now().isoformat()
+        _save_report(node.id, report, published=True)
+    return root_report
+
+
+def _run(album_ids, preread):
+    try:
+        for album in GroupingAlbum.objects.filter(pk__in=album_ids, is_grouping=True):
+            try:
+                publish(album, preread)
+            except Exception as e:
+                logger.exception("Публикация папки #%s не удалась", album.id)
+                _save_report(album.id, {'status': 'failed', 'error': str(e), 'checked_at': timezone.now().isoformat()})
+    finally:
+        with _running_lock:
+            _running.difference_update(album_ids)
+        # У потока своё соединение с БД; при CONN_MAX_AGE его никто не закроет за нас
+        connection.close()
+
+
+def start(album_ids, preread=None):
+    """Запускает публикацию в фоновом потоке. Возвращает id папок, публикация которых уже идёт."""
+    with _running_lock:
+        busy = set(album_ids) & _running
+        ids = [pk for pk in album_ids if pk not in busy]
+        _running.update(ids)
+    if ids:
+        threading.Thread(target=_run, args=(ids, preread), daemon=True).start()
+    return sorted(busy)
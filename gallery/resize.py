@@ -0,0 +1,258 @@
+"""
+On-demand ресайз фотографий: /img/<photo>/<версия>/<w>x<h>/<fmt>/?s=<подпись>
+
+Картинка рендерится из ОРИГИНАЛА при первом запросе (с вотермаркой) и кладётся
+в дисковый кэш MEDIA_ROOT/<RESIZE_CACHE_DIR>/<photo>/<версия>/<w>x<h>.<ext>.
+Путь в кэше повторяет URL, поэтому Nginx может отдавать попадания сам:
+
+    location ~ ^/img/(\\d+)/(\\w+)/(\\d+x\\d+)/(jpeg|webp|png)/$ {
+        root /path/to/media;
+        try_files /resized/$1/$2/$3.$4 @django;
+    }
+
+Версия — от имени оригинала (в CAS оно содержит SHA-256 содержимого). Ответ кэшируется
+браузером навсегда (immutable), поэтому замена оригинала обязана менять URL: иначе
+и диск, и браузеры продолжали бы отдавать старую картинку. Ресайзы фото с заменённым
+или удалённым оригиналом сразу убирает drop_photo_cache (gallery/signals.py).
+
+Кэш ограничен по размеру (RESIZE_CACHE_MAX_BYTES) и чистится по LRU:
+время последнего доступа берём из max(atime, mtime), при попадании через Django
+обновляем mtime.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import zlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.signing import Signer
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+try:
+    import fcntl
+except ImportError:  # Windows (локальная разработка) — только блокировка внутри процесса
+    fcntl = None
+
+# Формат в URL -> (формат Pillow, расширение файла)
+FORMATS = {
+    'jpeg': ('JPEG', 'jpeg'),
+    'webp': ('WEBP', 'webp'),
+    'png': ('PNG', 'png'),
+}
+
+_signer = Signer(salt='gallery.resize')
+
+# Блокировки рендера внутри процесса (между процессами — flock на файле полосы в .locks/).
+# Фиксированный набор «полос»: ключ → crc32(путь) % N. Словарь «путь → лок» и файл .lock
+# на каждый ресайз росли бы с каждым запрошенным ключом (фото × размеры × форматы)
+KEY_LOCK_STRIPES = 64
+LOCKS_DIR = '.locks'
+_key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+
+# Сколько байт записали с последней чистки кэша
+_written_since_sweep = 0
+_sweep_guard = threading.Lock()
+
+
+def _cache_root():
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'RESIZE_CACHE_DIR', 'resized'))
+
+
+def _max_dimension():
+    return getattr(settings, 'RESIZE_MAX_DIMENSION', 2000)
+
+
+def rendition_version(photo):
+    """Версия ресайзов фото: меняется вместе с файлом оригинала."""
+    return hashlib.sha1(photo.image.name.encode()).hexdigest()[:12]
+
+
+def _sign_value(photo_id, version, width, height, fmt):
+    return f"{photo_id}:{version}:{width}x{height}:{fmt}"
+
+
+def signed_resize_url(photo, width, height, fmt='jpeg'):
+    """Возвращает подписанный URL ресайза для фото."""
+    version = rendition_version(photo)
+    path = reverse('gallery:resized_image', args=[photo.pk, version, width, height, fmt])
+    signature = _signer.signature(_sign_value(photo.pk, version, width, height, fmt))
+    return f"{path}?s={signature}"
+
+
+def check_signature(photo_id, version, width, height, fmt, signature):
+    expected = _signer.signature(_sign_value(photo_id, version, width, height, fmt))
+    return constant_time_compare(expected, signature or '')
+
+
+def is_valid_request(width, height, fmt):
+    max_dim = _max_dimension()
+    return fmt in FORMATS and 0 < width <= max_dim and 0 < height <= max_dim
+
+
+def cache_path(photo_id, version, width, height, fmt):
+    ext = FORMATS[fmt][1]
+    return os.path.join(_cache_root(), str(photo_id), version, f"{width}x{height}.{ext}")
+
+
+def cache_url(photo_id, version, width, height, fmt):
+    """URL файла в кэше относительно MEDIA_URL (для X-Accel-Redirect)."""
+    ext = FORMATS[fmt][1]
+    cache_dir = getattr(settings, 'RESIZE_CACHE_DIR', 'resized')
+    return f"{settings.MEDIA_URL}{cache_dir}/{photo_id}/{version}/{width}x{height}.{ext}"
+
+
+def _stripe(path):
+    # crc32, а не hash(): номер полосы должен совпадать во всех воркерах (hash строк случаен в процессе)
+    return zlib.crc32(path.encode()) % KEY_LOCK_STRIPES
+
+
+def _get_key_lock(path):
+    # Разные ключи на одной полосе просто рендерятся по очереди — редкость при 64 полосах
+    return _key_locks[_stripe(path)]
+
+
+def _lock_file_path(path):
+    return os.path.join(_cache_root(), LOCKS_DIR, f"{_stripe(path)}.lock")
+
+
+def render_resized(photo, width, height, fmt):
+    """Рендерит ресайз из оригинала (вписываем в рамку w×h) и возвращает байты."""
+    from PIL import Image
+    from .metadata import orient
+    from .models import apply_watermark
+
+    pil_format = FORMATS[fmt][0]
+    with photo.image.open('rb') as f:
+        img = Image.open(f)
+        # Для JPEG draft() декодирует сразу в уменьшенном масштабе — в разы быстрее
+        img.draft('RGB', (width * 2, height * 2))
+        img = orient(img, photo.orientation)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+    img = apply_watermark(img)
+
+    out = BytesIO()
+    if pil_format == 'JPEG':
+        img.save(out, format='JPEG', quality=85, optimize=True, progressive=True)
+    elif pil_format == 'WEBP':
+        img.save(out, format='WEBP', quality=80, method=4)
+    else:
+        img.save(out, format='PNG', optimize=True)
+    return out.getvalue()
+
+
+def get_or_render(photo, width, height, fmt):
+    """
+    Возвращает путь к файлу в кэше, при необходимости рендерит его.
+    Одновременные запросы одного ключа рендерят картинку только один раз.
+    """
+    path = cache_path(photo.pk, rendition_version(photo), width, height, fmt)
+    if os.path.exists(path):
+        _touch(path)
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _get_key_lock(path):
+        lock_file = None
+        if fcntl is not None:
+            lock_path = _lock_file_path(path)
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            lock_file = open(lock_path, 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Пока ждали блокировку, другой воркер мог уже отрендерить
+            if os.path.exists(path):
+                return path
+
+            data = render_resized(photo, width, height, fmt)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as out:
+                out.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    _after_write(len(data))
+    return path
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _after_write(size):
+    """Запускаем чистку, когда с прошлого раза записали ~5% от лимита."""
+    global _written_since_sweep
+    max_bytes = getattr(settings, 'RESIZE_CACHE_MAX_BYTES', 2 * 1024 ** 3)
+    with _sweep_guard:
+        _written_since_sweep += size
+        if _written_since_sweep < max_bytes * 0.05:
+            return
+        _written_since_sweep = 0
+    evict(max_bytes)
+
+
+def evict(max_bytes=None):
+    """
+    Удаляет самые давно использованные файлы, пока кэш не уложится в лимит.
+    Возвращает (удалено файлов, освобождено байт).
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'RESIZE_CACHE_MAX_BYTES', 2 * 1024 ** 3)
+    root = _cache_root()
+    entries = []
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root and LOCKS_DIR in dirnames:
+            dirnames.remove(LOCKS_DIR)
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            if name.endswith('.lock'):
+                # Файл блокировки на каждый ресайз от прежних версий — теперь хватает полос в .locks/
+                try:
+                    os.remove(full)
+                except OSError:
+                    pass
+                continue
+            if name.endswith('.tmp'):
+                continue
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            entries.append((max(st.st_atime, st.st_mtime), st.st_size, full))
+            total += st.st_size
+
+    if total <= max_bytes:
+        return 0, 0
+
+    # Чистим с запасом до 90% лимита, чтобы не запускаться на каждой записи
+    target = max_bytes * 0.9
+    entries.sort()
+    removed = freed = 0
+    for _, size, full in entries:
+        if total <= target:
+            break
+        try:
+            os.remove(full)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+def drop_photo_cache(photo_id):
+    """Удаляет все ресайзы фото всех версий (оригинал заменили, фото удалили или убрали в архив)."""
+    shutil.rmtree(os.path.join(_cache_root(), str(photo_id)), ignore_errors=True)
@@ -1,14 +1,88 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
-from .models import Photo
+import os
+
+from . import covers, resize, snapshots
+from .models import ChildAlbum, Group, GroupingAlbum, Kindergarten, Photo, RequestProfile
 from .utils import process_image_for_preview
 
+@receiver(pre_save, sender=Photo)
+def photo_pre_save(sender, instance, update_fields=None, **kwargs):
+    """Запоминаем прежний оригинал: при замене файла ссылка со старого снимается в post_save."""
+    instance._previous_image = None
+    if instance.pk and (update_fields is None or 'image' in update_fields):
+        instance._previous_image = Photo.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+
+
 @receiver(post_save, sender=Photo)
-def photo_post_save(sender, instance, created, **kwargs):
+def photo_post_save(sender, instance, created, update_fields=None, **kwargs):
     """
     Этот сигнал срабатывает ПОСЛЕ сохранения объекта Photo.
     Если фото только что создано и у него еще нет обработанной версии,
     запускаем функцию обработки.
     """
+    if update_fields is None or 'image' in update_fields:
+        # Ссылка в CAS берётся в транзакции сохранения (Photo.save) — не сохранившееся фото её не оставит
+        previous = getattr(instance, '_previous_image', None) or None
+        current = instance.image.name if instance.image else None
+        if current != previous:
+            if current:
+                instance.image.storage.acquire(current)
+            if previous:
+                storage = instance.image.storage
+                transaction.on_commit(lambda: storage.release(previous))
+                # Новый оригинал — новая версия в URL ресайзов; старые больше никто не запросит
+                transaction.on_commit(lambda: resize.drop_photo_cache(instance.pk))
     if created and not instance.processed_image:
-        process_image_for_preview(instance)
\ No newline at end of file
+        process_image_for_preview(instance)
+    GroupingAlbum.touch(instance.album_id)
+    transaction.on_commit(lambda: snapshots.schedule_rebuild(instance.album_id))
+    transaction.on_commit(lambda: covers.schedule_refresh(instance.album_id))
+
+@receiver(post_delete, sender=Photo)
+def photo_post_delete(sender, instance, **kwargs):
+    """
+    Снимаем ссылку с оригинала в CAS-хранилище: файл удалится,
+    когда на него не останется ни одного фото.
+    """
+    if instance.image:
+        storage, name = instance.image.storage, instance.image.name
+        transaction.on_commit(lambda: storage.release(name))
+    photo_id = instance.pk
+    transaction.on_commit(lambda: resize.drop_photo_cache(photo_id))
+    GroupingAlbum.touch(instance.album_id)
+    transaction.on_commit(lambda: snapshots.schedule_rebuild(instance.album_id))
+    transaction.on_commit(lambda: covers.schedule_refresh(instance.album_id))
+
+
+# Админка сохраняет папки через прокси-модели, а сигнал приходит с sender=прокси
+@receiver(post_save, sender=GroupingAlbum)
+@receiver(post_delete, sender=GroupingAlbum)
+@receiver(post_save, sender=Kindergarten)
+@receiver(post_delete, sender=Kindergarten)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=ChildAlbum)
+@receiver(post_delete, sender=ChildAlbum)
+def album_changed(sender, instance, **kwargs):
+    """Страница родительской папки показывает вложенные (название, обложку) — её версия тоже меняется."""
+    GroupingAlbum.touch(instance.parent_id)
+    if kwargs['signal'] is post_delete:
+        snapshots.remove_snapshot(instance.access_token)
+        covers.retire_files(instance)
+        transaction.on_commit(lambda: snapshots.schedule_rebuild(instance.parent_id))
+        # Мозаика предков могла собираться и из удалённого альбома
+        transaction.on_commit(lambda: covers.schedule_refresh(instance.parent_id))
+    else:
+        transaction.on_commit(lambda: snapshots.schedule_rebuild(instance.id, instance.parent_id))
+        transaction.on_commit(lambda: covers.schedule_refresh(instance.id))
+
+
+@receiver(post_delete, sender=RequestProfile)
+def request_profile_post_delete(sender, instance, **kwargs):
+    """Файл профиля удаляется вместе с записью (в т.ч. при ротации PROFILE_MAX_FILES)."""
+    try:
+        os.remove(instance.file_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,185 @@
+"""
+Статические снимки страниц папок (Садик, Группа) для раздачи Nginx без Django.
+
+Страница папки одинакова для всех родителей со ссылкой и меняется только когда персонал
+правит дерево. Публикация рендерит её в SNAPSHOT_ROOT/<access_token>/index.html
+(+ manifest.json: версия узла и файлы обложек, на которые ссылается страница):
+
+    location ~ ^/album/([0-9a-f-]{36})/$ {
+        root /path/to/snapshots;
+        try_files /$1/index.html @django;
+    }
+
+Нет снимка — запрос уходит в Django как раньше. Страница детского альбома не снимается:
+там сброс корзины в сессии и редирект.
+
+Опубликованным считается узел, у которого есть снимок; вложенные группы опубликованного
+садика снимаются автоматически. При изменении GroupingAlbum или Photo (gallery/signals.py)
+пересобираются только затронутые узлы — сам узел и его родитель — пачкой в фоновом потоке
+через SNAPSHOT_REBUILD_DELAY секунд, чтобы загрузка сотни фото не рендерила страницу сотню раз.
+Истечение срока доступа меняет страницу без правок в базе — для этого
+manage.py publish_snapshots --refresh по cron.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.http import HttpRequest
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import GroupingAlbum
+
+logger = logging.getLogger(__name__)
+
+# Узлы, ждущие пересборки, и таймер, который их соберёт
+_pending = set()
+_pending_lock = threading.Lock()
+_timer = None
+
+
+def enabled():
+    return getattr(settings, 'SNAPSHOTS_ENABLED', True)
+
+
+def snapshot_root():
+    return str(getattr(settings, 'SNAPSHOT_ROOT', os.path.join(settings.BASE_DIR, 'snapshots')))
+
+
+def snapshot_dir(access_token):
+    return os.path.join(snapshot_root(), str(access_token))
+
+
+def is_published(album):
+    return os.path.exists(os.path.join(snapshot_dir(album.access_token), 'index.html'))
+
+
+# === РЕНДЕР ===
+def _anonymous_request(album):
+    """Запрос «родителя по ссылке»: без сессии и корзины, не персонал, без сообщений."""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = reverse('gallery:album_detail', args=[album.access_token])
+    request.META['SERVER_NAME'] = 'localhost'
+    request.META['SERVER_PORT'] = '80'
+    request.user = AnonymousUser()
+    request.session = {}
+    return request
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def render_snapshot(album):
+    """Рендерит страницу папки в её каталог. Возвращает манифест снимка."""
+    from .views import grouping_context
+
+    context = grouping_context(album)
+    html = render_to_string('gallery/album_list.html', context, request=_anonymous_request(album))
+
+    covers = [a.display_cover.name for a in [album, *context['albums']] if a.display_cover]
+    missing = [name for name in covers if not default_storage.exists(name)]
+    if missing:
+        logger.warning("Снимок %s ссылается на отсутствующие обложки: %s", album.access_token, missing)
+    manifest = {
+        'album_id': album.id,
+        'title': album.title,
+        'updated_at': album.updated_at.isoformat(),
+        'rendered_at': timezone.now().isoformat(),
+        'is_expired': context['is_expired'],
+        'media': covers,
+        'missing_media': missing,
+    }
+
+    directory = snapshot_dir(album.access_token)
+    _write_atomic(os.path.join(directory, 'index.html'), html.encode('utf-8'))
+    _write_atomic(os.path.join(directory, 'manifest.json'),
+                  json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+    return manifest
+
+
+def remove_snapshot(access_token):
+    shutil.rmtree(snapshot_dir(access_token), ignore_errors=True)
+
+
+def publish(album):
+    """Снимает папку и все вложенные папки. Возвращает число снятых страниц."""
+    count = 0
+    level = [album]
+    while level:
+        for node in level:
+            render_snapshot(node)
+            count += 1
+        level = list(GroupingAlbum.objects.filter(parent__in=level, is_grouping=True))
+    return count
+
+
+def unpublish(album):
+    level = [album]
+    while level:
+        for node in level:
+            remove_snapshot(node.access_token)
+        level = list(GroupingAlbum.objects.filter(parent__in=level, is_grouping=True))
+
+
+# === ИНКРЕМЕНТАЛЬНАЯ ПЕРЕСБОРКА ===
+def rebuild(album_ids):
+    """
+    Пересобирает снимки узлов, которые опубликованы (или лежат в опубликованной папке).
+    Для детского альбома (изменились его фото) пересобирается страница его группы.
+    """
+    ids = set(album_ids)
+    ids.update(GroupingAlbum.objects.filter(pk__in=ids, is_grouping=False).values_list('parent_id', flat=True))
+    albums = GroupingAlbum.objects.filter(pk__in=ids, is_grouping=True).select_related('parent')
+    rebuilt = 0
+    for album in albums:
+        if is_published(album) or (album.parent and is_published(album.parent)):
+            render_snapshot(album)
+            rebuilt += 1
+    return rebuilt
+
+
+def _run_pending():
+    global _timer
+    with _pending_lock:
+        album_ids = list(_pending)
+        _pending.clear()
+        _timer = None
+    try:
+        rebuild(album_ids)
+    except Exception:
+        logger.exception("Не удалось пересобрать снимки %s", album_ids)
+    finally:
+        # У потока своё соединение с БД; при CONN_MAX_AGE его никто не закроет за нас
+        connection.close()
+
+
+def schedule_rebuild(*album_ids):
+    """Откладывает пересборку узлов; повторные изменения за SNAPSHOT_REBUILD_DELAY склеиваются."""
+    global _timer
+    if not enabled():
+        return
+    ids = {pk for pk in album_ids if pk}
+    if not ids:
+        return
+    with _pending_lock:
+        _pending.update(ids)
+        if _timer is None:
+            _timer = threading.Timer(getattr(settings, 'SNAPSHOT_REBUILD_DELAY', 2.0), _run_pending)
+            _timer.daemon = True
+            _timer.start()
@@ -0,0 +1,112 @@
+"""
+Контентно-адресуемое хранилище оригиналов.
+
+Файл сохраняется под именем из его SHA-256 в "шардированных" подпапках:
+    photos/originals/ab/cd/abcd…ef.jpg
+- Никаких exists()-проб и суффиксов вида _Qo95Khj: имя однозначно задаётся содержимым.
+- В одной папке остаётся по несколько файлов даже при 500k фото.
+- Повторная загрузка того же файла не пишет ничего на диск: строка MediaBlob
+  просто получает +1 к счётчику ссылок, а файл удаляется, когда ссылок не осталось.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+CAS_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+
+def hash_file(content):
+    """SHA-256 файла, читаем кусками (django File / UploadedFile)."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cas_name(prefix, digest, ext):
+    return os.path.join(prefix, digest[:2], digest[2:4], f"{digest}{ext}").replace('\\', '/')
+
+
+def is_cas_name(name):
+    return bool(CAS_NAME_RE.search(name or ''))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save(), пробовать свободные имена не нужно
+        return name
+
+    def _save(self, name, content):
+        # Photo.extract_metadata уже посчитал хэш загрузки — не читаем файл второй раз
+        digest = getattr(content, 'sha256', None) or hash_file(content)
+        ext = os.path.splitext(name)[1].lower()
+        final_name = cas_name(os.path.dirname(name), digest, ext)
+
+        # Строка MediaBlob — замок на файл: release() удаляет файл, только держа её же.
+        # Photo.save оборачивает сохранение в транзакцию, и замок держится до INSERT фото
+        # и acquire() в post_save — «пустого» окна между записью файла и ссылкой на него нет
+        with transaction.atomic():
+            self._lock_blob(final_name, digest, content.size)
+            if not self.exists(final_name):
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                # Пишем во временный файл и атомарно переименовываем: недописанный файл не виден под итоговым именем
+                tmp_name = super()._save(f"{final_name}.{uuid.uuid4().hex}.tmp", content)
+                os.replace(self.path(tmp_name), self.path(final_name))
+        return final_name
+
+    # --- Счётчик ссылок ---
+    def _lock_blob(self, name, digest, size):
+        """Строка MediaBlob под select_for_update (создаётся с ref_count=0, если её нет)."""
+        from .models import MediaBlob
+        while True:
+            try:
+                with transaction.atomic():
+                    MediaBlob.objects.get_or_create(name=name, defaults={'sha256': digest, 'size': size})
+            except IntegrityError:
+                pass
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            # Между созданием и блокировкой строку мог удалить release() — создаём заново
+            if blob is not None:
+                return blob
+
+    def acquire(self, name):
+        """+1 ссылка на файл. Вызывается из post_save фото, в той же транзакции, что и INSERT/UPDATE."""
+        from .models import MediaBlob
+        return MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+    def release(self, name):
+        """
+        Снимает одну ссылку с файла; когда ссылок не осталось — удаляет файл.
+        Файл удаляется под замком строки MediaBlob, так что параллельная загрузка того же
+        содержимого либо дождётся удаления и запишет файл заново, либо успеет взять ссылку.
+        Файлы, которых нет в MediaBlob (старые, до перехода на CAS), не трогаем.
+        """
+        from .models import MediaBlob
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return False
+            if blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return False
+            blob.delete()
+            super().delete(name)
+        return True
+
+    def delete(self, name):
+        self.release(name)
+
+
+originals_storage = ContentAddressedStorage()
+
+
+def get_originals_storage():
+    # Callable для ImageField(storage=...), чтобы миграции не зависели от настроек
+    return originals_storage
@@ -0,0 +1,204 @@
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from gallery.management.commands.migrate_sqlite_to_postgres import SOURCE_ALIAS, Command
+from gallery import covers, resize
+from gallery.models import ChildAlbum, GroupingAlbum, Kindergarten, Photo
+from orders.models import Order, OrderItem
+
+
+class MigrateSqliteToPostgresTests(unittest.TestCase):
+    """
+    Источник — настоящий файл SQLite со схемой из миграций; цель — тестовая БД default.
+    Обычный unittest.TestCase: тесты Django запрещают соединения с алиасами, которых нет
+    в DATABASES, а источник команда регистрирует сама. Цель чистим в tearDown.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'db.sqlite3')
+        open(self.source, 'w').close()
+        self.command = Command()
+        self.command._open_source(self.source)
+        call_command('migrate', database=SOURCE_ALIAS, verbosity=0)
+        # Ключи вразнобой и с дырами: копирование должно идти по возрастанию pk.
+        # bulk_create — без сигналов, они планируют фоновые пересборки в default
+        GroupingAlbum.objects.using(SOURCE_ALIAS).bulk_create([
+            GroupingAlbum(pk=40, title="Садик", is_grouping=True),
+            GroupingAlbum(pk=7, title="Группа", parent_id=40, is_grouping=True),
+            *(GroupingAlbum(pk=pk, title=f"Ребёнок {pk}", parent_id=7, is_grouping=False) for pk in (31, 12, 25)),
+        ])
+        self.source_albums = list(GroupingAlbum.objects.using(SOURCE_ALIAS).order_by('pk').values_list(
+            'pk', 'created_at', 'updated_at'))
+
+    def tearDown(self):
+        GroupingAlbum.objects.all().delete()
+        connections[SOURCE_ALIAS].close()
+        del connections[SOURCE_ALIAS]
+        del connections.settings[SOURCE_ALIAS]
+        shutil.rmtree(self.tmp)
+
+    def test_models_ordered_by_foreign_keys(self):
+        models = self.command._models_in_order()
+        self.assertLess(models.index(GroupingAlbum), models.index(Photo))
+        self.assertLess(models.index(Order), models.index(OrderItem))
+        self.assertNotIn(Kindergarten, models)  # прокси — та же таблица
+
+    def test_copy_model_batches_in_pk_order(self):
+        batches = []
+        original = QuerySet.bulk_create
+
+        def record(qs, objs, *args, **kwargs):
+            batches.append([obj.pk for obj in objs])
+            return original(qs, objs, *args, **kwargs)
+
+        # Как в handle(): одна транзакция, ссылки parent_id проверяются при коммите
+        with transaction.atomic(), mock.patch.object(QuerySet, 'bulk_create', autospec=True, side_effect=record):
+            copied = self.command._copy_model(GroupingAlbum, 'default', batch_size=2)
+
+        self.assertEqual(copied, 5)
+        self.assertEqual(batches, [[7, 12], [25, 31], [40]])
+        # auto_now/auto_now_add не перезаписали даты источника и вернулись на место
+        self.assertEqual(list(GroupingAlbum.objects.order_by('pk').values_list('pk', 'created_at', 'updated_at')),
+                         self.source_albums)
+        self.assertTrue(GroupingAlbum._meta.get_field('updated_at').auto_now)
+
+    @unittest.skipIf(connection.vendor != 'sqlite', "Проверка отказа при цели SQLite")
+    def test_refuses_sqlite_target(self):
+        with self.assertRaises(CommandError):
+            call_command('migrate_sqlite_to_postgres', source=self.source, noinput=True, verbosity=0)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "Последовательности id есть только в PostgreSQL")
+    def test_full_run_resets_sequences(self):
+        call_command('migrate_sqlite_to_postgres', source=self.source, noinput=True, batch_size=2,
+                     stdout=open(os.devnull, 'w'))
+        self.assertEqual(list(GroupingAlbum.objects.order_by('pk').values_list('pk', flat=True)), [7, 12, 25, 31, 40])
+        # Следующий id продолжает с max(id)+1, а не упирается в уже занятые ключи
+        self.assertEqual(Kindergarten.objects.create(title="Новый").pk, 41)
+
+
+def jpeg(color, size=(64, 48)):
+    from PIL import Image
+
+    out = BytesIO()
+    Image.new('RGB', size, color).save(out, format='JPEG')
+    return SimpleUploadedFile('photo.jpg', out.getvalue(), content_type='image/jpeg')
+
+
+class ResizeVersionTests(TestCase):
+    # Ответ ресайза кэшируется браузером как immutable: новый оригинал обязан дать новый URL
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_settings = override_settings(MEDIA_ROOT=media)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        album = ChildAlbum.objects.create(title="Ребёнок")
+        self.photo = Photo.objects.create(album=album, image=jpeg('red'))
+
+    def fetch(self, url):
+        response = self.client.get(url)
+        if response.status_code == 200:
+            response.close()
+        return response
+
+    def test_replaced_original_gets_new_url_and_drops_old_renditions(self):
+        old_url = self.photo.resized_url(32, 32, 'jpeg')
+        old_version = resize.rendition_version(self.photo)
+        self.assertEqual(self.fetch(old_url).status_code, 200)
+        old_path = resize.cache_path(self.photo.pk, old_version, 32, 32, 'jpeg')
+        self.assertTrue(os.path.exists(old_path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photo.image = jpeg('blue', size=(48, 64))
+            self.photo.save()
+
+        new_url = self.photo.resized_url(32, 32, 'jpeg')
+        self.assertNotEqual(new_url, old_url)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual((self.photo.width, self.photo.height), (48, 64))
+        # Старая ссылка (со страницы до замены) ведёт на актуальную, а не рендерит новое под старым ключом
+        self.assertRedirects(self.fetch(old_url), new_url, fetch_redirect_response=False)
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_deleted_photo_drops_renditions(self):
+        self.assertEqual(self.fetch(self.photo.resized_url(32, 32, 'webp')).status_code, 200)
+        self.photo_id = self.photo.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photo.delete()
+        self.assertFalse(os.path.exists(os.path.join(resize._cache_root(), str(self.photo_id))))
+
+    def test_render_locks_are_shared_stripes(self):
+        for size in range(16, 48):
+            self.assertEqual(self.fetch(self.photo.resized_url(size, size, 'jpeg')).status_code, 200)
+        # Файлы блокировок — только полосы в .locks/, рядом с ресайзами их нет
+        files = [name for _, _, names in os.walk(resize._cache_root()) for name in names]
+        self.assertEqual(len([name for name in files if not name.endswith('.lock')]), 32)
+        self.assertLessEqual(len(os.listdir(os.path.join(resize._cache_root(), resize.LOCKS_DIR))),
+                             resize.KEY_LOCK_STRIPES)
+
+
+class RepresentativePhotoTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_settings = override_settings(MEDIA_ROOT=media)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.album = ChildAlbum.objects.create(title="Ребёнок")
+        self.photos = [Photo.objects.create(album=self.album, image=jpeg(color)) for color in ('red', 'green', 'blue')]
+
+    def test_middle_photo(self):
+        self.assertEqual(covers.representative_photo(self.album.id), self.photos[1])
+
+    def test_photos_deleted_after_count(self):
+        # Между count() и выборкой удалили фото: обложка берёт оставшийся кадр, а не падает с IndexError
+        with mock.patch.object(QuerySet, 'count', return_value=10):
+            self.assertEqual(covers.representative_photo(self.album.id), self.photos[-1])
+        Photo.objects.filter(album=self.album).delete()
+        with mock.patch.object(QuerySet, 'count', return_value=3):
+            self.assertIsNone(covers.representative_photo(self.album.id))
+
+
+class ReviewDuplicatesTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_settings = override_settings(MEDIA_ROOT=media)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.album = ChildAlbum.objects.create(title="Ребёнок")
+        self.photos = [Photo.objects.create(album=self.album, image=jpeg(color)) for color in ('red', 'green')]
+        self.other = Photo.objects.create(album=self.album, image=jpeg('blue'))
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+
+    def collapse(self, keep):
+        return self.client.post(reverse('admin:gallery_photo_duplicates'), {
+            'album_id': self.album.id, 'action': 'collapse', 'keep': keep,
+            'photo_ids': [photo.id for photo in self.photos]})
+
+    def test_collapse_keeps_chosen_photo(self):
+        self.collapse(self.photos[1].id)
+        self.assertEqual(list(Photo.objects.filter(album=self.album)), [self.photos[1], self.other])
+
+    def test_collapse_with_keep_outside_group_deletes_nothing(self):
+        for keep in (self.other.id, 999999, ''):
+            self.collapse(keep)
+            self.assertEqual(Photo.objects.filter(album=self.album).count(), 3)
+        self.assertFalse(Photo.objects.filter(duplicate_reviewed=True).exists())
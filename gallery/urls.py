@@ -12,4 +12,7 @@ urlpatterns = [
 
     # Основной маршрут для доступа к альбомам (uuid токен)
     path('album/<uuid:access_token>/', views.album_detail, name='album_detail'),
+
+    # Ресайз на лету с дисковым кэшем (подписанная ссылка)
+    path('img/<int:photo_id>/<slug:version>/<int:width>x<int:height>/<str:fmt>/', views.resized_image, name='resized_image'),
 ]
\ No newline at end of file
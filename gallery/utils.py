@@ -1,4 +1,3 @@
-from PIL import Image, ImageDraw, ImageFont
 from .models import Photo
 from django.core.files.base import ContentFile
 import io
@@ -14,6 +13,8 @@ def process_image_for_preview(photo_instance):
     if not photo_instance.image:
         return
 
+    from PIL import Image, ImageDraw, ImageFont
+
     try:
         # Открываем оригинальное изображение
         original_image = Image.open(photo_instance.image).convert("RGBA")
@@ -1,8 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.contrib import messages
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
 from .models import Album, Photo, GroupingAlbum, ChildAlbum
+from . import resize
+from photographer_project.routers import use_replica
+from photographer_project.conditional import conditional_page
 from django.urls import reverse
+from orders.cart import album_cart
 
 # === 1. ГЛАВНАЯ СТРАНИЦА ===
 def landing_page(request):
@@ -37,9 +43,17 @@ def album_list(request):
 
 
 # === 3. ПРОСМОТР АЛЬБОМА/ПАПКИ ===
-def album_detail(request, access_token):
-    album = get_object_or_404(GroupingAlbum, access_token=access_token)
-    
+def _album_version(request, access_token):
+    """Версия страницы папки. Для ребёнка None: там всегда сброс корзины и редирект."""
+    album = GroupingAlbum.objects.filter(access_token=access_token).values('is_grouping', 'updated_at', 'expires_at').first()
+    if not album or not album['is_grouping']:
+        return None
+    is_expired = bool(album['expires_at'] and timezone.now() > album['expires_at'])
+    return [album['updated_at'].isoformat(), is_expired], album['updated_at']
+
+
+def grouping_context(album):
+    """Контекст страницы папки (Садик или Группа). Общий для вьюхи и статических снимков (gallery/snapshots.py)."""
     # Проверка срока
     expired_message = ""
     is_expired = False
@@ -47,17 +61,23 @@ def album_detail(request, access_token):
         is_expired = True
         expired_message = f"Срок доступа истек {album.expires_at.strftime('%d.%m.%Y')}."
 
+    return {
+        'album': album,
+        'albums': album.sub_albums.all().order_by('title'),
+        'page_title': album.title,
+        'expired_message': expired_message,
+        'is_expired': is_expired,
+    }
+
+
+@use_replica
+@conditional_page(_album_version, private=False)
+def album_detail(request, access_token):
+    album = get_object_or_404(GroupingAlbum, access_token=access_token)
+
     # === ЕСЛИ ЭТО ПАПКА (Садик или Группа) ===
     if album.is_grouping:
-        sub_albums = album.sub_albums.all().order_by('title')
-        context = {
-            'album': album,
-            'albums': sub_albums,
-            'page_title': album.title,
-            'expired_message': expired_message,
-            'is_expired': is_expired,
-        }
-        return render(request, 'gallery/album_list.html', context)
+        return render(request, 'gallery/album_list.html', grouping_context(album))
     
     # === ЕСЛИ ЭТО РЕБЁНОК (Конечный альбом) ===
     else:
@@ -66,12 +86,34 @@ def album_detail(request, access_token):
         all_photo_ids = list(Photo.objects.filter(album=album).values_list('id', flat=True))
         
         # Обновляем корзину
-        request.session['cart'] = {
-            'album_id': album.id,
-            'buy_full_set': False, 
-            'photo_ids': all_photo_ids, # <-- Вот здесь были проблемы, теперь исправлено
-            'item_quantities': {}
-        }
+        request.session['cart'] = album_cart(album, all_photo_ids)
         request.session.modified = True
         
-        return redirect('orders:cart')
\ No newline at end of file
+        return redirect('orders:cart')
+
+
+# === 4. ON-DEMAND РЕСАЙЗ (/img/<photo>/<версия>/<w>x<h>/<fmt>/) ===
+def resized_image(request, photo_id, version, width, height, fmt):
+    if not resize.is_valid_request(width, height, fmt):
+        raise Http404
+    if not resize.check_signature(photo_id, version, width, height, fmt, request.GET.get('s')):
+        return HttpResponseForbidden()
+
+    photo = get_object_or_404(Photo.objects.only('id', 'image', 'orientation'), pk=photo_id)
+    if version != resize.rendition_version(photo):
+        # Ссылка со старой страницы, а оригинал с тех пор заменили: под старой версией
+        # новую картинку не кэшируем (браузеры держат её год) — отправляем на актуальный URL
+        return redirect(photo.resized_url(width, height, fmt))
+    try:
+        path = resize.get_or_render(photo, width, height, fmt)
+    except (OSError, ValueError):
+        raise Http404
+
+    if getattr(settings, 'RESIZE_USE_X_ACCEL', False):
+        # Отдачу файла берёт на себя Nginx (location /media/ ... internal)
+        response = HttpResponse(content_type=f'image/{fmt}')
+        response['X-Accel-Redirect'] = resize.cache_url(photo_id, version, width, height, fmt)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=f'image/{fmt}')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
\ No newline at end of file
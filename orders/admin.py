@@ -1,8 +1,11 @@
-import openpyxl
 from django.contrib import admin
+from django.db.models import Count, Prefetch
 from django.http import HttpResponse
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
 from .models import Order, OrderItem, ProductFormat
 from gallery.models import Album
+from photographer_project.routers import ReplicaChangelistMixin
 import os
 
 class AlbumFilter(admin.SimpleListFilter):
@@ -22,6 +25,9 @@ class AlbumFilter(admin.SimpleListFilter):
 
 @admin.action(description='Экспорт выбранных заказов в Excel')
 def export_to_excel(modeladmin, request, queryset):
+    # openpyxl тяжёлый и нужен только для экспорта — не грузим его в каждом воркере
+    import openpyxl
+
     opts = modeladmin.model._meta
     response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     response['Content-Disposition'] = f'attachment; filename={opts.verbose_name_plural}.xlsx'
@@ -75,7 +81,7 @@ class OrderItemInline(admin.TabularInline):
     get_product_name.short_description = 'Продукт'
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = (
         'id', 'get_full_name', 'email', 'status', 
         'get_bonus_status',
@@ -86,33 +92,49 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ['id', 'first_name', 'last_name', 'email', 'phone'] 
     inlines = [OrderItemInline]
     actions = [export_to_excel]
+    readonly_fields = ('full_set_download_links',)
+
+    @admin.display(description='Ссылки на комплект')
+    def full_set_download_links(self, obj):
+        links = obj.get_full_set_download_links() if obj.pk else []
+        if not links:
+            return "—"
+        return format_html_join(
+            mark_safe('<br>'), '<a href="{}" target="_blank">📦 {}</a>',
+            ((url, album.title) for album, url in links),
+        )
+
+    def get_queryset(self, request):
+        # Позиции, их фото/альбомы и размер комплектов — одним пакетом на страницу, без запросов на строку
+        items = OrderItem.objects.select_related('photo__album', 'album_set').annotate(
+            album_set_photo_count=Count('album_set__photos'))
+        return super().get_queryset(request).prefetch_related(Prefetch('items', queryset=items))
 
     @admin.display(description='Кол-во фото')
     def get_photo_count(self, obj):
         count = 0
         for item in obj.items.all():
             if item.is_full_set and item.album_set:
-                count += item.album_set.photos.count()
+                count += item.album_set_photo_count
             elif item.photo:
                 count += item.quantity
         return count
 
     @admin.display(description='Альбомы в заказе')
     def get_albums_list(self, obj):
-        album_ids = set()
+        albums = {}
         for item in obj.items.all():
             if item.is_full_set and item.album_set:
-                album_ids.add(item.album_set.id)
+                albums[item.album_set.id] = item.album_set.title
             elif item.photo and item.photo.album:
-                album_ids.add(item.photo.album.id)
+                albums[item.photo.album.id] = item.photo.album.title
         
-        albums = Album.objects.filter(id__in=album_ids)
         if not albums:
             return "N/A"
-        return ", ".join([a.title for a in albums])
+        return ", ".join(albums[pk] for pk in sorted(albums))
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = (
         'get_order_id',
         'get_customer_name',
@@ -141,6 +163,8 @@ class OrderItemAdmin(admin.ModelAdmin):
         'photo__image'
     )
     
+    list_select_related = ('order', 'photo__album', 'product_format', 'album_set')
+
     def has_add_permission(self, request):
         return False
     def has_change_permission(self, request, obj=None):
@@ -0,0 +1,92 @@
+"""
+Корзина в сессии: request.session['cart'] = {
+    'album_id': ..., 'buy_full_set': bool,
+    'photo_ids': [...],                      # фото, показанные в корзине
+    'item_quantities': {"<фото>_<формат>": шт.},
+}
+Общие операции для страниц корзины (orders/views.py) и JSON API (gallery/api.py).
+"""
+import hashlib
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+
+
+def catalog_version(formats):
+    """Короткий хэш каталога форматов: меняется при любой правке названия, цены или типа формата."""
+    raw = '|'.join(f"{f.id}:{f.name}:{f.price}:{f.is_collage}" for f in formats)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def card_context(formats):
+    """Общий контекст карточки фото (orders/_cart_photo.html): страница корзины, её догрузка, прогрев кэша."""
+    return {
+        'formats': formats,
+        'catalog_version': catalog_version(formats),
+        'fragment_timeout': getattr(settings, 'CART_FRAGMENT_TIMEOUT', 7 * 24 * 60 * 60),
+    }
+
+
+def cart_photo_ids(cart):
+    """
+    Фото корзины: photo_ids, а в корзинах без них (старые сессии) — фото из ключей item_quantities.
+    Одна функция для страницы корзины, её догрузки и API — иначе страницы расходятся.
+    """
+    photo_ids = cart.get('photo_ids') or []
+    if not photo_ids and cart.get('item_quantities'):
+        photo_ids = sorted({key.partition('_')[0] for key in cart['item_quantities']}, key=int)
+    return photo_ids
+
+
+def cart_total(item_quantities, photo_ids, formats):
+    """Сумма корзины по количествам из сессии — без загрузки самих фото. Коллаж оплачивается один раз."""
+    formats_by_id = {str(f.id): f for f in formats}
+    in_cart = {str(pid) for pid in photo_ids}
+    total = Decimal('0.00')
+    charged_collage_format_ids = set()
+    for key, quantity in item_quantities.items():
+        photo_id, _, format_id = key.partition('_')
+        fmt = formats_by_id.get(format_id)
+        if quantity <= 0 or fmt is None or photo_id not in in_cart:
+            continue
+        if fmt.is_collage:
+            if fmt.id in charged_collage_format_ids: continue
+            charged_collage_format_ids.add(fmt.id)
+        total += fmt.price * quantity
+    return total
+
+
+def _new_revision(cart):
+    """Ревизия меняется при каждом изменении корзины — по ней страница корзины отвечает 304."""
+    cart['rev'] = uuid.uuid4().hex[:12]
+    return cart
+
+
+def album_cart(album, photo_ids):
+    """Новая корзина при входе в альбом ребёнка: все его фото, ничего не выбрано."""
+    return _new_revision({'album_id': album.id, 'buy_full_set': False, 'photo_ids': photo_ids, 'item_quantities': {}})
+
+
+def full_set_cart(album):
+    return _new_revision({'album_id': str(album.id), 'buy_full_set': True, 'photo_ids': [], 'item_quantities': {}})
+
+
+def set_quantity(cart, photo_id, format_id, quantity):
+    quantity = max(int(quantity), 0)
+    cart.setdefault('item_quantities', {})[f"{photo_id}_{format_id}"] = quantity
+    cart.setdefault('photo_ids', [])
+    if quantity > 0 and str(photo_id) not in {str(pid) for pid in cart['photo_ids']}:
+        cart['photo_ids'].append(str(photo_id))
+    return _new_revision(cart)
+
+
+def remove_photo(cart, photo_id):
+    photo_id = str(photo_id)
+    if 'photo_ids' in cart:
+        cart['photo_ids'] = [str(pid) for pid in cart['photo_ids'] if str(pid) != photo_id]
+    if 'item_quantities' in cart:
+        cart['item_quantities'] = {
+            k: q for k, q in cart['item_quantities'].items() if not k.startswith(f"{photo_id}_")
+        }
+    return _new_revision(cart)
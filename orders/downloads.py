@@ -0,0 +1,83 @@
+"""
+Выдача оплаченного полного комплекта: подписанные ссылки и сборка ZIP.
+
+Ссылка привязана к заказу и альбому и живёт FULL_SET_DOWNLOAD_MAX_AGE секунд.
+Скачать можно только когда заказ в одном из статусов FULL_SET_DOWNLOAD_STATUSES.
+Ссылки на странице заказа видит только браузер, оформивший заказ (id в сессии),
+и персонал: номера заказов идут подряд, перебрать их может кто угодно.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils import timezone
+
+from .zipstream import ZipEntry, ZipStream
+
+_SALT = 'orders.full_set_download'
+_SESSION_KEY = 'placed_orders'
+
+
+def _max_age():
+    return getattr(settings, 'FULL_SET_DOWNLOAD_MAX_AGE', 7 * 24 * 60 * 60)
+
+
+def download_allowed(order):
+    return order.status in getattr(settings, 'FULL_SET_DOWNLOAD_STATUSES', ('processing', 'completed'))
+
+
+def remember_order(request, order):
+    """Запоминает в сессии, что заказ оформлен из этого браузера."""
+    placed = request.session.get(_SESSION_KEY, [])
+    if order.id not in placed:
+        request.session[_SESSION_KEY] = placed + [order.id]
+
+
+def links_visible(request, order):
+    """Показывать ли ссылки на скачивание на странице заказа."""
+    if not download_allowed(order):
+        return False
+    return request.user.is_staff or order.id in request.session.get(_SESSION_KEY, [])
+
+
+def make_download_token(order, album_id):
+    return signing.dumps({'o': order.id, 'a': album_id}, salt=_SALT, compress=True)
+
+
+def parse_download_token(token):
+    """Возвращает (order_id, album_id) или None, если подпись неверна или ссылка истекла."""
+    try:
+        data = signing.loads(token, salt=_SALT, max_age=_max_age())
+    except signing.BadSignature:
+        return None
+    return data.get('o'), data.get('a')
+
+
+def download_url(order, album_id):
+    return reverse('orders:full_set_download', args=[order.id, make_download_token(order, album_id)])
+
+
+def _safe_name(value):
+    value = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', value).strip(' .')
+    return value or 'album'
+
+
+def build_album_zip(album):
+    """Собирает детерминированную раскладку архива из оригиналов альбома."""
+    folder = _safe_name(album.title)
+    entries = []
+    photos = album.photos.order_by('captured_at', 'id').only('id', 'image', 'uploaded_at')
+    for index, photo in enumerate(photos.iterator(), start=1):
+        if not photo.image:
+            continue
+        storage = photo.image.storage
+        try:
+            size = storage.size(photo.image.name)
+        except OSError:
+            continue
+        # Номер в начале имени: сохраняет порядок и исключает совпадения имён
+        arcname = f"{folder}/{index:04d}_{_safe_name(os.path.basename(photo.image.name))}"
+        entries.append(ZipEntry(arcname, storage, photo.image.name, size, timezone.localtime(photo.uploaded_at)))
+    return ZipStream(entries), f"{folder}.zip"
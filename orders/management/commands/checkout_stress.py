@@ -0,0 +1,92 @@
+import json
+import re
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from gallery.models import Photo
+from orders.models import Order, ProductFormat
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочная проверка SQLite: N родителей одновременно открывают альбом, "
+        "меняют корзину и оформляют заказ. Считает ошибки 'database is locked'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--cart-updates', type=int, default=5, help="Сколько раз каждый меняет количество в корзине")
+        parser.add_argument('--keep', action='store_true', help="Не удалять созданные заказы")
+
+    def handle(self, *args, **options):
+        photo = Photo.objects.select_related('album').order_by('id').first()
+        product_format = ProductFormat.objects.order_by('id').first()
+        if not photo or not product_format:
+            raise CommandError("Нужны хотя бы одно фото и один формат продукции (см. manage.py seed_perf)")
+        album_url = reverse('gallery:album_detail', args=[photo.album.access_token])
+
+        barrier = threading.Barrier(options['concurrency'])
+        lock = threading.Lock()
+        results = {'ok': 0, 'locked': 0, 'errors': 0, 'order_ids': [], 'latencies': []}
+
+        def parent():
+            client = Client()
+            try:
+                barrier.wait()
+                started = time.monotonic()
+                client.get(album_url)
+                for quantity in range(1, options['cart_updates'] + 1):
+                    response = client.post(
+                        reverse('orders:update_cart'),
+                        data=json.dumps({'photo_id': photo.id, 'format_id': product_format.id, 'quantity': quantity}),
+                        content_type='application/json',
+                    )
+                    if response.status_code != 200:
+                        raise RuntimeError(f"update_cart: HTTP {response.status_code}")
+                response = client.post(reverse('orders:create_order'), {
+                    'customer_name': 'Нагрузочный Тест', 'customer_phone': '+70000000000',
+                })
+                match = re.search(r'/order/(\d+)/confirmation/', response.get('Location', ''))
+                if not match:
+                    raise RuntimeError(f"create_order: HTTP {response.status_code}")
+                with lock:
+                    results['ok'] += 1
+                    results['order_ids'].append(int(match.group(1)))
+                    results['latencies'].append(time.monotonic() - started)
+            except Exception as e:
+                with lock:
+                    if 'locked' in str(e):
+                        results['locked'] += 1
+                    else:
+                        results['errors'] += 1
+                self.stderr.write(f"{type(e).__name__}: {e}")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=parent) for _ in range(options['concurrency'])]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+
+        latencies = sorted(results['latencies'])
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"Параллельно: {options['concurrency']}, успешно: {results['ok']}, "
+            f"'database is locked': {results['locked']}, прочих ошибок: {results['errors']}, "
+            f"время: {elapsed:.1f} с, p95 сценария: {p95:.2f} с"
+        )
+
+        if not options['keep'] and results['order_ids']:
+            Order.objects.filter(id__in=results['order_ids']).delete()
+
+        if results['locked'] or results['errors']:
+            raise CommandError("Есть ошибки при параллельном оформлении заказов")
+        self.stdout.write(self.style.SUCCESS("Блокировок нет"))
@@ -0,0 +1,313 @@
+import http.cookiejar
+import io
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from PIL import Image
+
+from gallery.models import ChildAlbum, Group, Kindergarten, Photo
+from orders.models import Order, ProductFormat
+
+TITLE_PREFIX = '[loadtest]'
+PHONE_MARK = '+79990000000'
+STEPS = ('group', 'album', 'cart', 'update_cart', 'create_order', 'upload_receipt')
+
+
+def percentile(values, p):
+    """Ближайший ранг: p95 из 200 значений — 190-е по возрастанию."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+class Parent:
+    """Один родитель: своя сессия (cookie), CSRF-токен и замеры шагов."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar))
+        self.timings = []
+
+    def csrf_token(self):
+        for cookie in self.jar:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def request(self, step, path, data=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers or {})
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                body = response.read()
+                final_url = response.geturl()
+            ok = True
+        except urllib.error.HTTPError as e:
+            body, final_url, ok = e.read(), path, False
+        except (urllib.error.URLError, OSError) as e:
+            body, final_url, ok = str(e).encode(), path, False
+        self.timings.append((step, time.perf_counter() - started, ok))
+        if not ok:
+            raise RuntimeError(f"{step}: {body[:200]!r}")
+        return body, final_url
+
+    def post_json(self, step, path, payload):
+        return self.request(step, path, json.dumps(payload).encode(), {
+            'Content-Type': 'application/json', 'X-CSRFToken': self.csrf_token(),
+        })
+
+    def post_form(self, step, path, fields):
+        fields = dict(fields, csrfmiddlewaretoken=self.csrf_token())
+        return self.request(step, path, urllib.parse.urlencode(fields).encode(), {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        })
+
+    def post_file(self, step, path, field, filename, content):
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="csrfmiddlewaretoken"\r\n\r\n'
+            f'{self.csrf_token()}\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'
+        ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+        return self.request(step, path, body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон 'вечер публикации садика': создаёт синтетический садик, поднимает "
+        "gunicorn и гоняет родителей по сценарию группа → альбом → корзина → изменения количества "
+        "→ заказ → квитанция. Печатает p50/p95/p99 по шагам и пишет baseline JSON для сравнения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parents', type=int, default=200, help="Сколько родителей пройдут сценарий")
+        parser.add_argument('--concurrency', type=int, default=20, help="Сколько родителей одновременно")
+        parser.add_argument('--groups', type=int, default=4)
+        parser.add_argument('--children', type=int, default=25, help="Детей в группе")
+        parser.add_argument('--photos', type=int, default=30, help="Фото у ребёнка")
+        parser.add_argument('--cart-updates', type=int, default=5, help="Изменений количества в корзине на родителя")
+        parser.add_argument('--url', help="Гонять уже запущенный сервер (gunicorn не поднимается)")
+        parser.add_argument('--workers', type=int, default=3, help="Воркеров gunicorn")
+        parser.add_argument('--threads', type=int, default=4, help="Потоков на воркер gunicorn")
+        parser.add_argument('--port', type=int, default=0, help="Порт gunicorn (по умолчанию — свободный)")
+        parser.add_argument('--timeout', type=float, default=30, help="Таймаут одного HTTP-запроса, с")
+        parser.add_argument('--output', default='loadtest_baseline.json', help="Куда записать результаты")
+        parser.add_argument('--compare', help="Baseline прошлого прогона для сравнения")
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help="Рост p95 шага больше N%% относительно --compare считается регрессией")
+        parser.add_argument('--keep', action='store_true', help="Не удалять синтетический садик и заказы")
+
+    # === ДАННЫЕ ===
+    def _tiny_jpeg(self, index):
+        color = ((index * 37) % 256, (index * 91) % 256, (index * 53) % 256)
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 240), color).save(buffer, format='JPEG', quality=70)
+        return buffer.getvalue()
+
+    def create_kindergarten(self, options):
+        if not ProductFormat.objects.exists():
+            ProductFormat.objects.create(name='10x15', price=Decimal('150.00'))
+            ProductFormat.objects.create(name='Коллаж', price=Decimal('500.00'), is_collage=True)
+        kindergarten = Kindergarten.objects.create(title=f'{TITLE_PREFIX} Садик {time.strftime("%Y-%m-%d %H:%M")}')
+        groups = []
+        index = 0
+        for g in range(options['groups']):
+            group = Group.objects.create(title=f'{TITLE_PREFIX} Группа {g + 1}', parent=kindergarten)
+            groups.append(group)
+            for c in range(options['children']):
+                child = ChildAlbum.objects.create(title=f'{TITLE_PREFIX} Ребёнок {g + 1}-{c + 1}', parent=group)
+                for _ in range(options['photos']):
+                    index += 1
+                    photo = Photo(album=child)
+                    photo.image.save(f'loadtest_{index}.jpg', ContentFile(self._tiny_jpeg(index)), save=False)
+                    photo.save()
+        self.stdout.write(f"Создан садик #{kindergarten.id}: {index} фото")
+        return kindergarten, groups
+
+    def plan(self, groups, count):
+        """Список (ссылка группы, ссылка ребёнка) — родители распределяются по детям по кругу."""
+        pairs = []
+        for group in groups:
+            for child in group.sub_albums.order_by('id'):
+                pairs.append((
+                    reverse('gallery:album_detail', args=[group.access_token]),
+                    reverse('gallery:album_detail', args=[child.access_token]),
+                    list(Photo.objects.filter(album_id=child.id).values_list('id', flat=True)),
+                ))
+        return [pairs[i % len(pairs)] for i in range(count)]
+
+    def cleanup(self, kindergarten):
+        for order in Order.objects.filter(phone=PHONE_MARK):
+            if order.receipt:
+                order.receipt.delete(save=False)
+            order.delete()
+        for photo in Photo.objects.filter(album__parent__parent=kindergarten):
+            photo.processed_image.delete(save=False)
+            photo.delete()
+        kindergarten.delete()
+
+    # === СЕРВЕР ===
+    def start_gunicorn(self, options):
+        port = options['port']
+        if not port:
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', 0))
+                port = s.getsockname()[1]
+        command = [
+            sys.executable, '-m', 'gunicorn', 'photographer_project.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+            '--threads', str(options['threads']), '--log-level', 'warning',
+        ]
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=dict(os.environ))
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError("gunicorn не запустился (установлен ли он? pip install gunicorn)")
+            try:
+                urllib.request.urlopen(url + reverse('gallery:landing'), timeout=2).read()
+                return process, url
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.3)
+        process.terminate()
+        raise CommandError("gunicorn не ответил за 30 секунд")
+
+    # === СЦЕНАРИЙ ===
+    def run_parent(self, url, plan_item, format_ids, options, receipt):
+        group_url, child_url, photo_ids = plan_item
+        parent = Parent(url, options['timeout'])
+        try:
+            parent.request('group', group_url)
+            parent.request('album', child_url)  # редирект в корзину входит в замер
+            parent.request('cart', reverse('orders:cart'))
+            for i in range(options['cart_updates']):
+                parent.post_json('update_cart', reverse('orders:update_cart'), {
+                    'photo_id': photo_ids[i % len(photo_ids)],
+                    'format_id': format_ids[i % len(format_ids)],
+                    'quantity': 1 + i % 3,
+                })
+            # Подтверждение заказа (редирект после POST) входит в замер create_order
+            _, final_url = parent.post_form('create_order', reverse('orders:create_order'), {
+                'customer_name': 'Нагрузочный Тест', 'customer_phone': PHONE_MARK,
+            })
+            match = re.search(r'/order/(\d+)/confirmation/', final_url)
+            if not match:
+                raise RuntimeError(f"create_order: нет редиректа на подтверждение ({final_url})")
+            order_id = int(match.group(1))
+            parent.post_file('upload_receipt', reverse('orders:upload_receipt', args=[order_id]),
+                             'receipt', 'receipt.jpg', receipt)
+        except RuntimeError:
+            pass
+        return parent.timings
+
+    def report(self, timings, elapsed, options):
+        by_step = {step: [] for step in STEPS}
+        errors = {step: 0 for step in STEPS}
+        for step, seconds, ok in timings:
+            if ok:
+                by_step[step].append(seconds)
+            else:
+                errors[step] += 1
+
+        result = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'options': {k: options[k] for k in ('parents', 'concurrency', 'groups', 'children', 'photos',
+                                                'cart_updates', 'workers', 'threads')},
+            'elapsed_s': round(elapsed, 2),
+            'steps': {},
+        }
+        self.stdout.write(f"{'шаг':<16}{'запросов':>9}{'ошибок':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+        for step in STEPS:
+            values = by_step[step]
+            total = len(values) + errors[step]
+            if not total:
+                continue
+            row = {
+                'requests': total,
+                'errors': errors[step],
+                'error_rate': round(errors[step] / total, 4),
+                'p50_ms': round(percentile(values, 50) * 1000, 1),
+                'p95_ms': round(percentile(values, 95) * 1000, 1),
+                'p99_ms': round(percentile(values, 99) * 1000, 1),
+            }
+            result['steps'][step] = row
+            self.stdout.write(
+                f"{step:<16}{total:>9}{errors[step]:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+            )
+        requests_total = sum(r['requests'] for r in result['steps'].values())
+        self.stdout.write(f"Всего {requests_total} запросов за {elapsed:.1f} с ({requests_total / elapsed:.1f} req/s)")
+        return result
+
+    def compare(self, result, path, threshold):
+        with open(path) as f:
+            baseline = json.load(f)
+        regressions = []
+        self.stdout.write(f"Сравнение с {path} ({baseline.get('created_at')}):")
+        for step, row in result['steps'].items():
+            old = baseline.get('steps', {}).get(step)
+            if not old or not old['p95_ms']:
+                continue
+            change = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            marker = ''
+            if change > threshold or row['error_rate'] > old['error_rate']:
+                marker = '  <-- регрессия'
+                regressions.append(step)
+            self.stdout.write(f"  {step:<16} p95 {old['p95_ms']:>8} → {row['p95_ms']:>8} мс ({change:+.0f}%){marker}")
+        return regressions
+
+    def handle(self, *args, **options):
+        kindergarten, groups = self.create_kindergarten(options)
+        process = None
+        try:
+            url = options['url']
+            if not url:
+                process, url = self.start_gunicorn(options)
+            plan = self.plan(groups, options['parents'])
+            format_ids = list(ProductFormat.objects.values_list('id', flat=True))
+            receipt = self._tiny_jpeg(0)
+
+            self.stdout.write(f"Сервер {url}: {options['parents']} родителей, по {options['concurrency']} одновременно")
+            timings = []
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                futures = [pool.submit(self.run_parent, url, item, format_ids, options, receipt) for item in plan]
+                for future in futures:
+                    timings.extend(future.result())
+            elapsed = time.monotonic() - started
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+            if not options['keep']:
+                self.cleanup(kindergarten)
+
+        result = self.report(timings, elapsed, options)
+        with open(options['output'], 'w') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты записаны в {options['output']}")
+
+        if options['compare']:
+            regressions = self.compare(result, options['compare'], options['threshold'])
+            if regressions:
+                raise CommandError(f"Регрессия по шагам: {', '.join(regressions)}")
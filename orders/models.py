@@ -35,6 +35,8 @@ class Order(models.Model):
     phone = models.CharField(max_length=20, verbose_name="Телефон", blank=True, default="")
     
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # Версия страницы заказа для условных GET (статус, квитанция)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new', verbose_name="Статус")
     receipt = models.FileField(upload_to='receipts/', blank=True, null=True, verbose_name="Квитанция об оплате")
 
@@ -56,6 +58,14 @@ class Order(models.Model):
     def get_bonus_status(self):
         return self.received_bonus
 
+    def get_full_set_download_links(self):
+        """Список (альбом, ссылка) для всех купленных комплектов заказа."""
+        from .downloads import download_url
+        links = []
+        for item in self.items.filter(is_full_set=True, album_set__isnull=False).select_related('album_set'):
+            links.append((item.album_set, download_url(self, item.album_set_id)))
+        return links
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, verbose_name="Заказ")
@@ -0,0 +1,44 @@
+# Не tests.py: у gallery и orders нет __init__.py, и два модуля tests при общем запуске конфликтуют
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from orders.models import Order
+
+LINKS = [(SimpleNamespace(title="Ромашка"), '/order/1/download/signed/')]
+
+
+@mock.patch.object(Order, 'get_full_set_download_links', return_value=LINKS)
+class OrderCompleteLinksTests(TestCase):
+    # Номера заказов идут подряд: ссылки на оригиналы нельзя отдавать по одному id
+
+    def setUp(self):
+        self.order = Order.objects.create(first_name="Анна", status='processing')
+        self.url = reverse('orders:order_complete', args=[self.order.id])
+
+    def test_hidden_from_other_browsers(self, links):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['download_links'], [])
+        links.assert_not_called()
+
+    def test_shown_to_browser_that_placed_order(self, links):
+        session = self.client.session
+        session['placed_orders'] = [self.order.id]
+        session.save()
+        self.assertEqual(self.client.get(self.url).context['download_links'], LINKS)
+
+    def test_shown_to_staff(self, links):
+        self.client.force_login(User.objects.create_user('operator', is_staff=True))
+        self.assertEqual(self.client.get(self.url).context['download_links'], LINKS)
+
+    def test_hidden_until_payment_confirmed(self, links):
+        Order.objects.filter(pk=self.order.pk).update(status='paid')
+        session = self.client.session
+        session['placed_orders'] = [self.order.id]
+        session.save()
+        self.assertEqual(self.client.get(self.url).context['download_links'], [])
@@ -5,6 +5,8 @@ app_name = 'orders'
 
 urlpatterns = [
     path('cart/', views.cart_view, name='cart'),
+    # Догрузка карточек большой корзины (курсорная пагинация, JSON)
+    path('cart/photos/', views.cart_photos_view, name='cart_photos'),
     
     # URL для обновления кол-ва
     path('cart/update/', views.update_cart_view, name='update_cart'),
@@ -17,6 +19,9 @@ urlpatterns = [
     path('<int:order_id>/confirmation/', views.order_confirmation_view, name='order_confirmation'),
     path('<int:order_id>/upload_receipt/', views.upload_receipt_view, name='upload_receipt'),
     path('<int:order_id>/complete/', views.order_complete_view, name='order_complete'),
+
+    # Скачивание оплаченного комплекта (подписанная ссылка с ограниченным сроком)
+    path('<int:order_id>/download/<str:token>/', views.full_set_download_view, name='full_set_download'),
 ]
 
 
@@ -1,20 +1,32 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
+from django.template.loader import render_to_string
 from .models import Order, OrderItem, ProductFormat
 from gallery.models import Photo, Album  # Убрали несуществующий ChildAlbum
+from gallery.pagination import keyset_page, InvalidCursor
 import json
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponseBadRequest, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from decimal import Decimal
 from django.views.decorators.http import require_POST
 from django.core.mail import send_mail
 from django.conf import settings
 import threading
-from django.db import connection
+import re
+from django.db import connection, transaction
+from photographer_project.db import retry_on_lock, is_lock_error
+from photographer_project.routers import use_replica
+from photographer_project.monitoring import timed
+from photographer_project.conditional import conditional_page
+from photographer_project import metrics
+from .downloads import download_allowed, links_visible, parse_download_token, build_album_zip, remember_order
+from .cart import card_context, cart_photo_ids, catalog_version, cart_total, full_set_cart, set_quantity, remove_photo
 
 class EmailThread(threading.Thread):
     def __init__(self, order):
         self.order = order
         threading.Thread.__init__(self)
+        metrics.inc('photosite_email_outbox')
 
     def run(self):
         try:
@@ -24,14 +36,31 @@ class EmailThread(threading.Thread):
                 send_mail(f'💰 Заказ #{self.order.id}', f'Клиент: {self.order.get_full_name()}\nТелефон: {self.order.phone}', settings.DEFAULT_FROM_EMAIL, [settings.EMAIL_HOST_USER])
             if self.order.email:
                 send_mail(f'Заказ #{self.order.id} принят', f'Сумма: {total_cost} руб.', settings.DEFAULT_FROM_EMAIL, [self.order.email])
+            metrics.inc('photosite_emails_total', result='sent')
         except Exception: 
-            pass
+            metrics.inc('photosite_emails_total', result='failed')
+        finally:
+            metrics.inc('photosite_email_outbox', -1)
+            # У потока своё соединение с БД; при CONN_MAX_AGE его никто не закроет за нас
+            connection.close()
 
 # === КОРЗИНА ===
+def _cart_version(request):
+    """Версия страницы корзины: ревизия корзины в сессии, версия альбома и каталога форматов."""
+    cart = request.session.get('cart') or {}
+    if cart and not cart.get('rev'):
+        return None  # корзина из старой сессии, без ревизии
+    album_updated_at = None
+    if cart.get('album_id'):
+        album_updated_at = Album.objects.filter(pk=cart['album_id']).values_list('updated_at', flat=True).first()
+    return [cart.get('rev'), cart.get('album_id'), album_updated_at, catalog_version(ProductFormat.objects.all())], None
+
+@use_replica
+@conditional_page(_cart_version)
 def cart_view(request):
     cart_data = request.session.get('cart', {})
     item_quantities = cart_data.get('item_quantities', {})
-    photo_ids = cart_data.get('photo_ids', [])
+    photo_ids = cart_photo_ids(cart_data)
     buy_full_set = cart_data.get('buy_full_set', False)
     
     album = None
@@ -69,8 +98,9 @@ def cart_view(request):
     if not photo_ids and not buy_full_set and not item_quantities:
         return render(request, 'orders/cart.html', context)
     
-    all_formats = ProductFormat.objects.all()
+    all_formats = list(ProductFormat.objects.all())
     photos_with_formats = []
+    next_cursor = None
     
     if buy_full_set and album:
         photos_with_formats.append({
@@ -84,63 +114,66 @@ def cart_view(request):
         })
         grand_total = album.full_set_price
     else:
-        charged_collage_format_ids = set()
-        
-        if not photo_ids and item_quantities:
-            photo_ids = list(set([k.split('_')[0] for k in item_quantities.keys()]))
+        grand_total = cart_total(item_quantities, photo_ids, all_formats)
 
+        # Карточки фото в шаблоне кэшируются целиком ({% cache %} по фото, превью и каталогу форматов),
+        # а количества приходят отдельным JSON и расставляются в браузере.
+        # Большой альбом отдаём первой страницей, остальное браузер догружает через cart_photos_view.
         photos = Photo.objects.filter(id__in=photo_ids)
+        if len(photo_ids) > getattr(settings, 'CART_PAGINATE_THRESHOLD', 60):
+            photos, next_cursor = keyset_page(photos, limit=getattr(settings, 'CART_PAGE_SIZE', 24))
         for photo in photos:
-            try:
-                formats_list = []
-                for fmt in all_formats:
-                    key = f"{photo.id}_{fmt.id}"
-                    quantity = item_quantities.get(key, 0)
-                    effective_price = fmt.price
-                    
-                    if fmt.is_collage and quantity > 0:
-                        if fmt.id in charged_collage_format_ids: effective_price = Decimal('0.00')
-                        else: charged_collage_format_ids.add(fmt.id)
-                        
-                    row_total = effective_price * quantity
-                    formats_list.append({'format_obj': fmt, 'price': fmt.price, 'effective_price': effective_price, 'quantity': quantity, 'row_total': row_total})
-                    grand_total += row_total
-                photos_with_formats.append({'is_full_set': False, 'photo_obj': photo, 'formats': formats_list})
-            except Exception: continue
+            photos_with_formats.append({'is_full_set': False, 'photo_obj': photo})
         
     context['photos_with_formats'] = photos_with_formats
     context['grand_total'] = grand_total
+    context['next_cursor'] = next_cursor
+    context['cart_state'] = {
+        'quantities': {k: q for k, q in item_quantities.items() if q},
+        'formats': {f.id: {'price': float(f.price), 'is_collage': f.is_collage} for f in all_formats},
+    }
+    context.update(card_context(all_formats))
     
     return render(request, 'orders/cart.html', context)
 
+@use_replica
+def cart_photos_view(request):
+    """
+    Догрузка карточек большой корзины: следующая страница фото после курсора.
+    HTML карточек берётся из того же кэша фрагментов, что и на странице корзины.
+    """
+    cart_data = request.session.get('cart', {})
+    item_quantities = cart_data.get('item_quantities', {})
+    page_size = getattr(settings, 'CART_PAGE_SIZE', 24)
+    try:
+        limit = min(max(int(request.GET.get('limit', page_size)), 1), 100)
+        photos, next_cursor = keyset_page(
+            Photo.objects.filter(id__in=cart_photo_ids(cart_data)), request.GET.get('cursor'), limit)
+    except (ValueError, InvalidCursor):
+        return HttpResponseBadRequest()
+
+    context = card_context(list(ProductFormat.objects.all()))
+    items = []
+    for photo in photos:
+        prefix = f"{photo.id}_"
+        items.append({
+            'id': photo.id,
+            'quantities': {k[len(prefix):]: q for k, q in item_quantities.items() if k.startswith(prefix) and q},
+            'html': render_to_string('orders/_cart_photo.html', {**context, 'photo': photo}),
+        })
+    return JsonResponse({'photos': items, 'next_cursor': next_cursor})
+
 @require_POST
 def add_full_set_to_cart_view(request, album_id):
     album = get_object_or_404(Album, pk=album_id)
-    cart = {'album_id': str(album.id), 'buy_full_set': True, 'photo_ids': [], 'item_quantities': {}}
-    request.session['cart'] = cart
+    request.session['cart'] = full_set_cart(album)
     return redirect('orders:cart')
 
 @require_POST
 def update_cart_view(request):
     try:
         data = json.loads(request.body)
-        photo_id = str(data.get('photo_id'))
-        format_id = str(data.get('format_id'))
-        quantity = int(data.get('quantity'))
-        if quantity < 0: quantity = 0
-        
-        cart = request.session.get('cart', {})
-        if 'item_quantities' not in cart: cart['item_quantities'] = {}
-        
-        key = f"{photo_id}_{format_id}"
-        cart['item_quantities'][key] = quantity
-        
-        if 'photo_ids' not in cart:
-            cart['photo_ids'] = []
-            
-        if quantity > 0 and photo_id not in cart['photo_ids']:
-            cart['photo_ids'].append(photo_id)
-            
+        cart = set_quantity(request.session.get('cart', {}), data.get('photo_id'), data.get('format_id'), data.get('quantity'))
         request.session['cart'] = cart
         request.session.modified = True
         return JsonResponse({'status': 'ok'})
@@ -150,42 +183,23 @@ def update_cart_view(request):
 def remove_photo_from_cart_view(request):
     try:
         data = json.loads(request.body)
-        photo_id = str(data.get('photo_id'))
-        cart = request.session.get('cart', {})
-        if 'photo_ids' in cart:
-            cart['photo_ids'] = [str(pid) for pid in cart['photo_ids']]
-            if str(photo_id) in cart['photo_ids']:
-                cart['photo_ids'].remove(str(photo_id))
-        
-        if 'item_quantities' in cart:
-            keys_to_remove = [k for k in cart['item_quantities'].keys() if k.startswith(f"{photo_id}_")]
-            for k in keys_to_remove:
-                del cart['item_quantities'][k]
-                
+        cart = remove_photo(request.session.get('cart', {}), data.get('photo_id'))
         request.session['cart'] = cart
         request.session.modified = True
         return JsonResponse({'status': 'ok'})
     except: return HttpResponseBadRequest()
 
-def create_order_view(request):
-    if request.method != 'POST': return redirect('gallery:landing')
-    cart_data = request.session.get('cart', {})
-    if not cart_data: return redirect('gallery:landing')
-    
-    full_name = request.POST.get('customer_name', 'Клиент').split()
-    
-    # Имя и телефон обязательны
-    phone_val = request.POST.get('customer_phone', '').strip()
-    if not phone_val:
-        phone_val = "Не указан" 
-        
-    email_val = request.POST.get('customer_email', '').strip()
-    
+@retry_on_lock
+def _save_order_from_cart(cart_data, first_name, last_name, email, phone):
+    """
+    Создаёт заказ и его позиции одной короткой транзакцией.
+    При блокировке SQLite транзакция откатывается и повторяется целиком (см. photographer_project/db.py).
+    """
     order = Order.objects.create(
-        first_name=full_name[0] if full_name else 'Без имени',
-        last_name=' '.join(full_name[1:]) if len(full_name) > 1 else '',
-        email=email_val, 
-        phone=phone_val,
+        first_name=first_name,
+        last_name=last_name,
+        email=email, 
+        phone=phone,
     )
     
     album = None
@@ -198,28 +212,22 @@ def create_order_view(request):
     total_price = Decimal('0.00')
     bonus_threshold = Decimal('2500.00')
     charged_collage_format_ids = set()
-    
-    # === ЭКСТРЕННЫЙ ФИКС БАЗЫ ДАННЫХ ===
-    # Отключаем проверки внешних ключей, чтобы обойти сломанную миграцию SQLite
-    cursor = connection.cursor()
-    try:
-        cursor.execute('PRAGMA foreign_keys = OFF;')
-    except Exception:
-        pass
 
     if cart_data.get('buy_full_set') and album:
         item_price = album.full_set_price
         
         try:
             # Попытка 1: Сохраняем с жестким ID (решает 99% проблем)
-            OrderItem.objects.create(
-                order_id=order.id, 
-                price=item_price, 
-                quantity=1, 
-                is_full_set=True, 
-                album_set_id=album.id
-            )
-        except Exception:
+            with transaction.atomic():
+                OrderItem.objects.create(
+                    order_id=order.id, 
+                    price=item_price, 
+                    quantity=1, 
+                    is_full_set=True, 
+                    album_set_id=album.id
+                )
+        except Exception as e:
+            if is_lock_error(e): raise
             # Попытка 2 (Резервная): Сохраняем БЕЗ привязки к альбому,
             # заказ в любом случае пройдет и деньги поступят!
             OrderItem.objects.create(
@@ -246,31 +254,84 @@ def create_order_view(request):
                     else: charged_collage_format_ids.add(int(format_id))
                 
                 try:
-                    OrderItem.objects.create(
-                        order_id=order.id, 
-                        photo_id=photo.id, 
-                        product_format_id=product_format.id, 
-                        price=item_price, 
-                        quantity=quantity
-                    )
-                except Exception:
-                    pass
+                    with transaction.atomic():
+                        OrderItem.objects.create(
+                            order_id=order.id, 
+                            photo_id=photo.id, 
+                            product_format_id=product_format.id, 
+                            price=item_price, 
+                            quantity=quantity
+                        )
+                except Exception as e:
+                    if is_lock_error(e): raise
                 total_price += item_price * quantity
-            except Exception: 
+            except Exception as e:
+                if is_lock_error(e): raise
                 continue
 
-    # Включаем ключи обратно
+    if total_price >= bonus_threshold: order.received_bonus = True; order.save()
+    return order
+
+def create_order_view(request):
+    if request.method != 'POST': return redirect('gallery:landing')
+    cart_data = request.session.get('cart', {})
+    if not cart_data: return redirect('gallery:landing')
+    
+    full_name = request.POST.get('customer_name', 'Клиент').split()
+    
+    # Имя и телефон обязательны
+    phone_val = request.POST.get('customer_phone', '').strip()
+    if not phone_val:
+        phone_val = "Не указан" 
+        
+    email_val = request.POST.get('customer_email', '').strip()
+    
+    # === ЭКСТРЕННЫЙ ФИКС БАЗЫ ДАННЫХ ===
+    # Отключаем проверки внешних ключей, чтобы обойти сломанную миграцию SQLite.
+    # PRAGMA внутри транзакции не действует, поэтому выполняем её ДО atomic().
+    is_sqlite = connection.vendor == 'sqlite'
+    cursor = connection.cursor()
+    if is_sqlite:
+        try:
+            cursor.execute('PRAGMA foreign_keys = OFF;')
+        except Exception:
+            pass
+
     try:
-        cursor.execute('PRAGMA foreign_keys = ON;')
+        with metrics.observe_time('photosite_checkout_seconds'):
+            order = _save_order_from_cart(
+                cart_data,
+                first_name=full_name[0] if full_name else 'Без имени',
+                last_name=' '.join(full_name[1:]) if len(full_name) > 1 else '',
+                email=email_val,
+                phone=phone_val,
+            )
+        metrics.inc('photosite_checkout_total', result='ok')
     except Exception:
-        pass
+        metrics.inc('photosite_checkout_total', result='error')
+        raise
+    finally:
+        # Включаем ключи обратно (соединение переиспользуется, см. CONN_MAX_AGE)
+        if is_sqlite:
+            try:
+                cursor.execute('PRAGMA foreign_keys = ON;')
+            except Exception:
+                pass
     # ===================================
 
-    if total_price >= bonus_threshold: order.received_bonus = True; order.save()
     if 'cart' in request.session: del request.session['cart']
-    EmailThread(order).start()
+    remember_order(request, order)
+    with timed('email'):
+        EmailThread(order).start()
     return redirect(reverse('orders:order_confirmation', args=[order.id]))
 
+def _order_version(request, order_id):
+    updated_at = Order.objects.filter(pk=order_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return [order_id, updated_at.isoformat()], updated_at
+
+@conditional_page(_order_version)
 def order_confirmation_view(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     total_price = sum(item.get_cost() for item in order.items.all())
@@ -279,10 +340,69 @@ def order_confirmation_view(request, order_id):
 def upload_receipt_view(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     if request.method == 'POST' and request.FILES.get('receipt'):
-        order.receipt = request.FILES['receipt']; order.status = 'paid'; order.save()
+        order.receipt = request.FILES['receipt']; order.status = 'paid'
+        retry_on_lock(order.save)()
         return redirect(reverse('orders:order_complete', args=[order.id]))
     return redirect(reverse('orders:order_confirmation', args=[order.id]))
 
 def order_complete_view(request, order_id):
     order = get_object_or_404(Order, id=order_id)
-    return render(request, 'orders/order_complete.html', {'order': order})
\ No newline at end of file
+    download_links = order.get_full_set_download_links() if links_visible(request, order) else []
+    return render(request, 'orders/order_complete.html', {'order': order, 'download_links': download_links})
+
+# === СКАЧИВАНИЕ ПОЛНОГО КОМПЛЕКТА (ZIP НА ЛЕТУ) ===
+def _parse_range(header, size):
+    """
+    Разбирает 'bytes=a-b' (один диапазон). Возвращает (start, end), None если заголовка нет
+    или он составной (отдаём целиком), и False если диапазон невыполним.
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', (header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+def full_set_download_view(request, order_id, token):
+    parsed = parse_download_token(token)
+    if not parsed or parsed[0] != order_id:
+        raise Http404("Ссылка недействительна или устарела")
+    order = get_object_or_404(Order, id=order_id)
+    album_id = parsed[1]
+    if not download_allowed(order) or not order.items.filter(is_full_set=True, album_set_id=album_id).exists():
+        raise Http404("Комплект недоступен для скачивания")
+    album = get_object_or_404(Album, pk=album_id)
+
+    archive, filename = build_album_zip(album)
+    etag = archive.etag
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:
+        byte_range = _parse_range(request.headers.get('Range'), archive.size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{archive.size}'
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(archive.iter_range(start, end), status=206, content_type='application/zip')
+        response['Content-Range'] = f'bytes {start}-{end}/{archive.size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = StreamingHttpResponse(archive.iter_range(), content_type='application/zip')
+        response['Content-Length'] = str(archive.size)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Cache-Control'] = 'private, no-store'
+    return response
\ No newline at end of file
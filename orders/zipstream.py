@@ -0,0 +1,204 @@
+"""
+Потоковая сборка ZIP-архива "на лету" для выдачи полного комплекта фото.
+
+- Записи без сжатия (STORED): JPEG всё равно не жмётся, а так мы просто
+  копируем файлы с диска кусками, не держа архив в памяти и без временных файлов.
+- Раскладка архива детерминированная (имена, размеры и даты известны заранее),
+  поэтому общий размер считается без чтения файлов и можно отдавать любой
+  диапазон байт (докачка через Range).
+- CRC32 считается во время отдачи; если для докачки нужен CRC уже пропущенных
+  файлов, он дочитывается с диска и кэшируется.
+
+Ограничения классического ZIP (без ZIP64): до 4 ГБ и 65535 файлов на архив —
+для альбома одного ребёнка этого с запасом.
+"""
+import hashlib
+import struct
+import zlib
+from collections import namedtuple
+
+from django.core.cache import cache
+
+CHUNK_SIZE = 1024 * 1024
+
+# Бит 3: CRC и размеры дублируются в data descriptor после данных.
+# Бит 11: имена файлов в UTF-8.
+FLAGS = 0x0808
+ZIP_VERSION = 20
+ZIP_LIMIT = 0xFFFFFFFF
+
+ZipEntry = namedtuple('ZipEntry', ['arcname', 'storage', 'name', 'size', 'date_time'])
+
+
+class ZipTooLarge(Exception):
+    pass
+
+
+def _dos_datetime(dt):
+    year = max(dt.year, 1980)
+    date = ((year - 1980) << 9) | (dt.month << 5) | dt.day
+    time = (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2)
+    return time, date
+
+
+class ZipStream:
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self._crcs = {}
+        self._segments = []
+        self._build_layout()
+
+    # --- Раскладка ---
+    def _build_layout(self):
+        """
+        Разбиваем архив на сегменты (offset, length, kind, index).
+        kind: 'local' | 'data' | 'descriptor' | 'central' | 'end'.
+        """
+        if len(self.entries) > 0xFFFF:
+            raise ZipTooLarge("Слишком много файлов для ZIP")
+
+        offset = 0
+        self._local_offsets = []
+        self._names = [e.arcname.encode('utf-8') for e in self.entries]
+
+        for i, entry in enumerate(self.entries):
+            self._local_offsets.append(offset)
+            local_len = 30 + len(self._names[i])
+            self._segments.append((offset, local_len, 'local', i))
+            offset += local_len
+            self._segments.append((offset, entry.size, 'data', i))
+            offset += entry.size
+            self._segments.append((offset, 16, 'descriptor', i))
+            offset += 16
+
+        self._central_offset = offset
+        for i in range(len(self.entries)):
+            central_len = 46 + len(self._names[i])
+            self._segments.append((offset, central_len, 'central', i))
+            offset += central_len
+        self._central_size = offset - self._central_offset
+
+        self._segments.append((offset, 22, 'end', None))
+        offset += 22
+
+        if offset > ZIP_LIMIT:
+            raise ZipTooLarge("Архив больше 4 ГБ")
+        self.size = offset
+
+    @property
+    def etag(self):
+        """Стабильный ETag раскладки (для If-Range)."""
+        h = hashlib.sha1()
+        for e in self.entries:
+            h.update(f"{e.arcname}\0{e.size}\0{e.date_time.isoformat()}\0".encode('utf-8'))
+        return f'"{h.hexdigest()}"'
+
+    # --- Заголовки ---
+    def _local_header(self, i):
+        e = self.entries[i]
+        time, date = _dos_datetime(e.date_time)
+        name = self._names[i]
+        # CRC = 0 (будет в descriptor), размеры известны заранее — пишем сразу
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034B50, ZIP_VERSION, FLAGS, 0, time, date,
+            0, e.size, e.size, len(name), 0,
+        ) + name
+
+    def _descriptor(self, i):
+        e = self.entries[i]
+        return struct.pack('<IIII', 0x08074B50, self._crc(i), e.size, e.size)
+
+    def _central_header(self, i):
+        e = self.entries[i]
+        time, date = _dos_datetime(e.date_time)
+        name = self._names[i]
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014B50, ZIP_VERSION, ZIP_VERSION, FLAGS, 0,
+            time, date, self._crc(i), e.size, e.size, len(name), 0, 0, 0, 0, 0,
+            self._local_offsets[i],
+        ) + name
+
+    def _end_record(self):
+        count = len(self.entries)
+        return struct.pack(
+            '<IHHHHIIH', 0x06054B50, 0, 0, count, count,
+            self._central_size, self._central_offset, 0,
+        )
+
+    # --- CRC ---
+    def _crc_cache_key(self, i):
+        e = self.entries[i]
+        raw = f"{e.name}:{e.size}".encode('utf-8')
+        return 'zipcrc:' + hashlib.md5(raw).hexdigest()
+
+    def _crc(self, i):
+        if i not in self._crcs:
+            key = self._crc_cache_key(i)
+            crc = cache.get(key)
+            if crc is None:
+                crc = 0
+                with self.entries[i].storage.open(self.entries[i].name, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        crc = zlib.crc32(chunk, crc)
+                cache.set(key, crc, 60 * 60 * 24 * 7)
+            self._crcs[i] = crc
+        return self._crcs[i]
+
+    # --- Отдача ---
+    def _iter_data(self, i, start, end):
+        """Байты файла i в диапазоне [start, end). Попутно считаем CRC, если файл читается целиком."""
+        e = self.entries[i]
+        if i not in self._crcs:
+            cached = cache.get(self._crc_cache_key(i))
+            if cached is not None:
+                self._crcs[i] = cached
+        crc = 0
+        pos = 0
+        with e.storage.open(e.name, 'rb') as f:
+            # Если CRC уже известен, можно сразу прыгнуть к нужному месту
+            if i in self._crcs and start > 0:
+                f.seek(start)
+                pos = start
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                chunk_start = pos
+                pos += len(chunk)
+                if i not in self._crcs:
+                    crc = zlib.crc32(chunk, crc)
+                if pos > start and chunk_start < end:
+                    yield chunk[max(start - chunk_start, 0):min(end - chunk_start, len(chunk))]
+                # Диапазон закончился посреди файла — CRC не понадобится
+                if pos >= end and (i in self._crcs or end < e.size):
+                    return
+        if pos != e.size:
+            raise IOError(f"Размер файла {e.name} изменился во время отдачи")
+        if i not in self._crcs:
+            self._crcs[i] = crc
+            cache.set(self._crc_cache_key(i), crc, 60 * 60 * 24 * 7)
+
+    def _segment_bytes(self, kind, i):
+        if kind == 'local':
+            return self._local_header(i)
+        if kind == 'descriptor':
+            return self._descriptor(i)
+        if kind == 'central':
+            return self._central_header(i)
+        return self._end_record()
+
+    def iter_range(self, start=0, end=None):
+        """Генератор байт архива в диапазоне [start, end] (включительно, как в HTTP Range)."""
+        stop = self.size if end is None else end + 1
+        for seg_offset, seg_len, kind, i in self._segments:
+            seg_end = seg_offset + seg_len
+            if seg_end <= start or seg_len == 0:
+                continue
+            if seg_offset >= stop:
+                break
+            lo = max(start - seg_offset, 0)
+            hi = min(stop - seg_offset, seg_len)
+            if kind == 'data':
+                yield from self._iter_data(i, lo, hi)
+            else:
+                yield self._segment_bytes(kind, i)[lo:hi]
+
+    def __iter__(self):
+        return self.iter_range()
@@ -0,0 +1,69 @@
+"""
+Условные GET для страниц сайта.
+
+Вьюха получает дешёвую функцию версии: (части версии, время изменения) из одного-двух
+лёгких запросов, без рендера. На If-None-Match / If-Modified-Since отвечаем 304 ещё до
+запуска вьюхи (django.views.decorators.http.condition), иначе отдаём страницу с ETag,
+Last-Modified и Cache-Control: no-cache — браузер и локальный кэш Nginx хранят страницу,
+но каждый раз сверяются с сервером.
+"""
+import functools
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+_NO_VERSION = object()
+
+
+def _session_parts(request):
+    """base.html зависит от сессии: значок корзины и ссылки для персонала."""
+    cart = request.session.get('cart') or {}
+    has_cart = bool(cart.get('photo_ids') or cart.get('buy_full_set'))
+    return has_cart, request.user.is_staff
+
+
+def _version(request, version_func, args, kwargs):
+    """Считается один раз на запрос — его читают и etag_func, и last_modified_func."""
+    cached = getattr(request, '_page_version', _NO_VERSION)
+    if cached is not _NO_VERSION:
+        return cached
+    version = None
+    # Непоказанные сообщения (messages) выводятся один раз — такую страницу нельзя отдавать из кэша
+    if request.method in ('GET', 'HEAD') and not len(get_messages(request)):
+        result = version_func(request, *args, **kwargs)
+        if result is not None:
+            parts, last_modified = result
+            raw = '|'.join(str(p) for p in (*parts, *_session_parts(request)))
+            version = hashlib.sha1(raw.encode()).hexdigest(), last_modified
+    request._page_version = version
+    return version
+
+
+def conditional_page(version_func, private=True):
+    """
+    Декоратор вьюхи. version_func(request, *args, **kwargs) -> ([части версии], last_modified или None),
+    либо None — страница без условного GET (например, вьюха сделает редирект).
+    private=False — страницу может хранить и общий кэш (Vary: Cookie разведёт разные сессии).
+    """
+    def decorator(view):
+        def etag_func(request, *args, **kwargs):
+            version = _version(request, version_func, args, kwargs)
+            return version and version[0]
+
+        def last_modified_func(request, *args, **kwargs):
+            version = _version(request, version_func, args, kwargs)
+            return version and version[1]
+
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(request, '_page_version', None) and response.status_code in (200, 304):
+                patch_cache_control(response, no_cache=True, **({'private': True} if private else {}))
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,55 @@
+"""
+Дисциплина коротких транзакций для SQLite.
+
+В проде несколько воркеров gunicorn пишут в один файл БД. WAL и busy_timeout
+(см. DATABASES в settings.py) снимают большую часть блокировок, а оставшиеся
+"database is locked" на пиках ловит retry_on_lock: транзакция откатывается
+целиком и повторяется с небольшой случайной паузой.
+
+Оборачивать можно только код, который целиком живёт внутри transaction.atomic()
+и не делает ничего необратимого вне БД (письма, файлы) — иначе повтор продублирует
+побочные эффекты.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.db import OperationalError, transaction
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(msg in str(exc) for msg in LOCK_ERRORS)
+
+
+def retry_on_lock(func=None, *, attempts=5, base_delay=0.05, atomic=True):
+    """
+    Декоратор: выполняет функцию в transaction.atomic() и повторяет её при блокировке SQLite.
+    Пауза растёт экспоненциально (0.05, 0.1, 0.2 … с) с джиттером, чтобы воркеры не
+    просыпались одновременно.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    if atomic:
+                        with transaction.atomic():
+                            return fn(*args, **kwargs)
+                    return fn(*args, **kwargs)
+                except OperationalError as exc:
+                    # Внутри внешней транзакции повторять бессмысленно — пусть откатывается она
+                    if not is_lock_error(exc) or attempt == attempts or transaction.get_connection().in_atomic_block:
+                        raise
+                    delay = base_delay * (2 ** (attempt - 1)) * (0.5 + random.random())
+                    logger.warning("SQLite занята (%s), попытка %s/%s через %.2f с", fn.__qualname__, attempt, attempts, delay)
+                    time.sleep(delay)
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,354 @@
+"""
+Метрики в формате Prometheus: GET /metrics (персонал или заголовок
+Authorization: Bearer <METRICS_TOKEN> — его и прописываем в scrape_config Prometheus).
+
+Каждый воркер gunicorn копит счётчики и гистограммы у себя в памяти (на горячем пути —
+только обновление словаря под локом), а фоновый поток раз в METRICS_FLUSH_SECONDS
+сбрасывает их в METRICS_DIR/<pid>.json. /metrics складывает файлы всех воркеров,
+поэтому неважно, какой воркер ответил на запрос Prometheus. Файлы умерших воркеров
+(перезапуск, max_requests) новый воркер при старте вливает в METRICS_DIR/aggregate.json и удаляет.
+
+Очередь превью, заказы по статусам и размер медиа считаются в момент запроса /metrics.
+"""
+import atexit
+import hmac
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows (локальная разработка)
+    fcntl = None
+    import ctypes
+    import msvcrt
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.http import HttpResponse, HttpResponseForbidden
+
+# name: (тип, описание, границы корзин для гистограмм)
+METRICS = {
+    'photosite_http_request_seconds': ('histogram', 'Время обработки запроса по имени URL',
+                                       (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'photosite_cache_requests_total': ('counter', 'Обращения к кэшу (result=hit|miss)', None),
+    'photosite_preview_render_seconds': ('histogram', 'Рендер превью с вотермаркой',
+                                         (0.1, 0.25, 0.5, 1, 2, 5, 10)),
+    'photosite_upload_files_total': ('counter', 'Загружено оригиналов через админку', None),
+    'photosite_upload_bytes_total': ('counter', 'Загружено байт оригиналов через админку', None),
+    'photosite_checkout_seconds': ('histogram', 'Оформление заказа (сохранение корзины в заказ)',
+                                   (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)),
+    'photosite_checkout_total': ('counter', 'Попытки оформления заказа (result=ok|error)', None),
+    'photosite_email_outbox': ('gauge', 'Письма о заказах, ожидающие отправки', None),
+    'photosite_emails_total': ('counter', 'Отправка писем о заказах (result=sent|failed)', None),
+}
+
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 5, 10)
+
+# Счётчики и гистограммы умерших воркеров, сложенные в один файл
+AGGREGATE_FILE = 'aggregate.json'
+
+
+def _metrics_dir():
+    return str(getattr(settings, 'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'photosite_metrics')))
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Метрики одного процесса + фоновый сброс в файл."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._values = {}
+        self._histograms = {}
+        self._dirty = False
+        self._thread = None
+
+    def _ensure_started(self):
+        # После fork (gunicorn --preload) у дочернего процесса свой файл и свой поток
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._thread.start()
+
+    # --- Запись (горячий путь) ---
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._ensure_started()
+            key = _key(name, labels)
+            self._values[key] = self._values.get(key, 0) + value
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2] or DEFAULT_BUCKETS
+        with self._lock:
+            self._ensure_started()
+            key = _key(name, labels)
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+            self._dirty = True
+
+    # --- Сброс на диск ---
+    def _snapshot(self):
+        with self._lock:
+            self._dirty = False
+            return {
+                'pid': self._pid,
+                'values': [[name, list(labels), value] for (name, labels), value in self._values.items()],
+                'histograms': [[name, list(labels), dict(h, buckets=list(h['buckets']))]
+                               for (name, labels), h in self._histograms.items()],
+            }
+
+    def flush(self):
+        if self._pid != os.getpid() or not self._dirty:
+            return
+        directory = _metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self._pid}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp, path)
+
+    def _flush_loop(self):
+        interval = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+        try:
+            merge_dead()
+        except OSError:
+            pass
+        while True:
+            time.sleep(interval)
+            try:
+                if self._dirty:
+                    self.flush()
+            except OSError:
+                pass
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+atexit.register(registry.flush)
+
+
+class observe_time:
+    """with observe_time('photosite_checkout_seconds'): ... — замер в гистограмму."""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+# === СБОР СО ВСЕХ ВОРКЕРОВ ===
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) в Windows не проверяет процесс, а завершает его
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        try:
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(values, histograms, data, alive):
+    """Добавляет файл воркера к суммам. Gauge берём только у живых процессов."""
+    for name, labels, value in data['values']:
+        if METRICS.get(name, ('counter',))[0] == 'gauge' and not alive:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        values[key] = values.get(key, 0) + value
+    for name, labels, hist in data['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        total = histograms.setdefault(key, {'buckets': [0] * len(hist['buckets']), 'sum': 0.0, 'count': 0})
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], hist['buckets'])]
+        total['sum'] += hist['sum']
+        total['count'] += hist['count']
+
+
+def _worker_files(directory):
+    """[(pid, путь)] файлов воркеров (без aggregate.json и недописанных .tmp)."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [(int(n[:-5]), os.path.join(directory, n)) for n in names if n.endswith('.json') and n[:-5].isdigit()]
+
+
+def _lock_exclusive(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            # LK_LOCK сам ждёт ~10 секунд и сдаётся с OSError — ждём дальше
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def merge_dead():
+    """Вливает файлы умерших воркеров в aggregate.json и удаляет их: папка не растёт с перезапусками."""
+    directory = _metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    # Воркеры стартуют одновременно — сливает один, остальные ждут на блокировке файла
+    with open(os.path.join(directory, '.merge.lock'), 'w') as lock:
+        _lock_exclusive(lock)
+        dead = [(pid, path) for pid, path in _worker_files(directory) if not _pid_alive(pid)]
+        if not dead:
+            return 0
+        values, histograms = {}, {}
+        aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+        for data in [_read(aggregate_path), *(_read(path) for _, path in dead)]:
+            if data:
+                _add(values, histograms, data, alive=False)
+        tmp = f'{aggregate_path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({
+                'pid': None,
+                'values': [[name, list(labels), value] for (name, labels), value in values.items()],
+                'histograms': [[name, list(labels), hist] for (name, labels), hist in histograms.items()],
+            }, f)
+        os.replace(tmp, aggregate_path)
+        for _, path in dead:
+            os.remove(path)
+        return len(dead)
+
+
+def collect():
+    """Суммирует файлы всех воркеров и aggregate.json умерших."""
+    registry.flush()
+    values = {}
+    histograms = {}
+    directory = _metrics_dir()
+    paths = [os.path.join(directory, AGGREGATE_FILE)] + [path for _, path in _worker_files(directory)]
+    for path in paths:
+        data = _read(path)
+        if data:
+            _add(values, histograms, data, alive=data['pid'] is not None and _pid_alive(data['pid']))
+    return values, histograms
+
+
+def _scrape_gauges():
+    """Значения, которые дешевле посчитать при опросе, чем поддерживать счётчиком."""
+    from gallery.models import MediaBlob, Photo
+    from orders.models import Order
+
+    gauges = []
+    pending = Photo.objects.filter(Q(processed_image__isnull=True) | Q(processed_image='')).count()
+    gauges.append(('photosite_preview_queue', 'Фото без превью (ждут рендера)', {}, pending))
+    for row in Order.objects.values('status').annotate(n=Count('id')):
+        gauges.append(('photosite_orders', 'Заказы по статусам', {'status': row['status']}, row['n']))
+    blobs = MediaBlob.objects.aggregate(size=Sum('size'), files=Count('id'))
+    gauges.append(('photosite_originals_bytes', 'Объём оригиналов в CAS-хранилище', {}, blobs['size'] or 0))
+    gauges.append(('photosite_originals_files', 'Файлов оригиналов в CAS-хранилище', {}, blobs['files']))
+    usage = shutil.disk_usage(settings.MEDIA_ROOT)
+    gauges.append(('photosite_media_disk_used_bytes', 'Занято на диске с MEDIA_ROOT', {}, usage.used))
+    gauges.append(('photosite_media_disk_free_bytes', 'Свободно на диске с MEDIA_ROOT', {}, usage.free))
+    return gauges
+
+
+# === ВЫВОД ===
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render_text():
+    values, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            bounds = buckets or DEFAULT_BUCKETS
+            for (metric, labels), hist in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(bounds, hist['buckets']):
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {count}')
+                lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {hist["count"]}')
+                lines.append(f'{name}_sum{_labels(labels)} {hist["sum"]}')
+                lines.append(f'{name}_count{_labels(labels)} {hist["count"]}')
+        else:
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+
+    seen = set()
+    for name, help_text, labels, value in _scrape_gauges():
+        if name not in seen:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            seen.add(name)
+        lines.append(f'{name}{_labels(sorted(labels.items()))} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _has_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def _allowed_ip(request):
+    # REMOTE_ADDR верен только без прокси: за nginx на той же машине каждый запрос приходит с 127.0.0.1.
+    # Поэтому список по умолчанию пуст — для сервера за прокси используйте METRICS_TOKEN
+    return request.META.get('REMOTE_ADDR', '') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+def metrics_view(request):
+    user = getattr(request, 'user', None)
+    is_staff = bool(user is not None and user.is_authenticated and user.is_staff)
+    if not (is_staff or _has_token(request) or _allowed_ip(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(render_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,221 @@
+"""
+Замер запросов: время view, число и время SQL-запросов, рендер шаблонов, попадания в кэш.
+
+- Персоналу (и при DEBUG) цифры уходят в заголовок Server-Timing — видно во вкладке
+  Network браузера.
+- Медленные запросы (дольше SLOW_REQUEST_MS) пишутся в лог 'perf.requests' одной JSON-строкой.
+- QUERY_BUDGETS задаёт лимит SQL-запросов по имени URL ('orders:cart' и т.п.).
+  Превышение — предупреждение в лог 'perf.budgets', а при QUERY_BUDGET_STRICT=True
+  (бенчмарки, нагрузочные прогоны) — исключение QueryBudgetExceeded. Так ловим N+1.
+
+Свои отрезки времени можно добавить через `with timed('email'):` в любом коде запроса.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+from . import metrics
+
+logger = logging.getLogger('perf.requests')
+budget_logger = logging.getLogger('perf.budgets')
+
+_current = ContextVar('request_stats', default=None)
+_MISS = object()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_name = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = {}
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def view_ms(self):
+        if self.view_started is None:
+            return None
+        return (time.perf_counter() - self.view_started) * 1000
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'total_ms': round(self.total_ms(), 1),
+            'view_ms': round(self.view_ms(), 1) if self.view_started is not None else None,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'spans': {name: round(sec * 1000, 1) for name, sec in self.spans.items()},
+        }
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Отрезок времени для Server-Timing и лога медленных запросов (вне запроса — ничего не делает)."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.spans[name] = stats.spans.get(name, 0.0) + time.perf_counter() - started
+
+
+# === ПЕРЕХВАТЧИКИ ===
+def _query_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def _patch_template_render():
+    """Template.render вызывается и для {% include %} — считаем только внешний рендер."""
+    if getattr(Template.render, '_timed', False):
+        return
+    original = Template.render
+
+    def render(self, context):
+        stats = _current.get()
+        if stats is None:
+            return original(self, context)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                stats.template_time += time.perf_counter() - started
+
+    render._timed = True
+    Template.render = render
+
+
+def _patch_cache_backends():
+    """Считаем попадания/промахи get() у всех настроенных бэкендов кэша."""
+    for alias in settings.CACHES:
+        backend_cls = type(caches[alias])
+        if getattr(backend_cls.get, '_timed', False):
+            continue
+        original = backend_cls.get
+
+        def get(self, key, default=None, version=None, _original=original):
+            value = _original(self, key, _MISS, version=version)
+            stats = _current.get()
+            if value is _MISS:
+                if stats is not None:
+                    stats.cache_misses += 1
+                return default
+            if stats is not None:
+                stats.cache_hits += 1
+            return value
+
+        get._timed = True
+        backend_cls.get = get
+
+
+# === MIDDLEWARE ===
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        _patch_template_render()
+        _patch_cache_backends()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        metrics.observe('photosite_http_request_seconds', stats.total_ms() / 1000, view=stats.view_name or '')
+        if stats.cache_hits:
+            metrics.inc('photosite_cache_requests_total', stats.cache_hits, result='hit')
+        if stats.cache_misses:
+            metrics.inc('photosite_cache_requests_total', stats.cache_misses, result='miss')
+
+        self._check_budget(request, stats)
+        if self._show_timing(request):
+            response['Server-Timing'] = self._server_timing(stats)
+        total_ms = stats.total_ms()
+        if total_ms >= self.slow_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **stats.as_dict(),
+            }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _current.get()
+        if stats is not None:
+            stats.view_started = time.perf_counter()
+            match = request.resolver_match
+            stats.view_name = match.view_name if match else None
+
+    def _check_budget(self, request, stats):
+        budget = self.budgets.get(stats.view_name)
+        if budget is None or stats.queries <= budget:
+            return
+        message = f"{stats.view_name}: {stats.queries} SQL-запросов при бюджете {budget} ({request.path})"
+        if self.strict:
+            raise QueryBudgetExceeded(message)
+        budget_logger.warning(message)
+
+    def _show_timing(self, request):
+        if settings.DEBUG:
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_authenticated and user.is_staff)
+
+    def _server_timing(self, stats):
+        parts = [f'total;dur={stats.total_ms():.1f}']
+        if stats.view_started is not None:
+            parts.append(f'view;dur={stats.view_ms():.1f}')
+        parts.append(f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"')
+        parts.append(f'tpl;dur={stats.template_time * 1000:.1f}')
+        parts.append(f'cache;desc="{stats.cache_hits} hit / {stats.cache_misses} miss"')
+        for name, sec in stats.spans.items():
+            parts.append(f'{name};dur={sec * 1000:.1f}')
+        return ', '.join(parts)
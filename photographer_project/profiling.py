@@ -0,0 +1,172 @@
+"""
+Профилирование отдельного запроса на живых данных (только для персонала).
+
+Запрос профилируется, если в нём есть подписанный токен текущего сотрудника:
+    ?__profile=<токен>            или заголовок  X-Profile: <токен>
+    ?__profile=<токен>&__profile_mode=cprofile   — вместо сэмплера cProfile
+Токен выдаётся на странице "Профили запросов" в админке и живёт PROFILE_TOKEN_MAX_AGE.
+
+- sample (по умолчанию): фоновый поток раз в PROFILE_SAMPLE_INTERVAL снимает стек потока
+  запроса. Результат — .folded (collapsed stacks): открывается в speedscope.app
+  или flamegraph.pl без конвертации.
+- cprofile: точные счётчики вызовов, .prof для snakeviz / flameprof / pstats.
+
+Файлы лежат в PROFILE_DIR, хранятся последние PROFILE_MAX_FILES штук.
+Без токена middleware только проверяет наличие параметра в строке запроса.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+PARAM = '__profile'
+MODE_PARAM = '__profile_mode'
+HEADER = 'HTTP_X_PROFILE'
+_SALT = 'photographer_project.profiling'
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def make_token(user):
+    return signing.TimestampSigner(salt=_SALT).sign(str(user.pk))
+
+
+def check_token(token, user):
+    try:
+        value = signing.TimestampSigner(salt=_SALT).unsign(
+            token, max_age=getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 8 * 60 * 60))
+    except signing.BadSignature:
+        return False
+    return value == str(user.pk)
+
+
+# === СЭМПЛЕР ===
+class SamplingProfiler:
+    """Периодически снимает стек одного потока и считает одинаковые стеки."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# === MIDDLEWARE ===
+class ProfilingMiddleware:
+    """Ставить после AuthenticationMiddleware: нужен request.user."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Обычный запрос: только поиск подстроки, без разбора GET и обращений к БД
+        if HEADER not in request.META and PARAM not in request.META.get('QUERY_STRING', ''):
+            return self.get_response(request)
+
+        token = request.META.get(HEADER) or request.GET.get(PARAM, '')
+        user = request.user
+        if not (user.is_authenticated and user.is_staff and check_token(token, user)):
+            return self.get_response(request)
+
+        mode = 'cprofile' if request.GET.get(MODE_PARAM) == 'cprofile' else 'sample'
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            samples = 0
+        else:
+            profiler = SamplingProfiler(getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005))
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+            samples = profiler.samples
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        record = save_profile(request, profiler, mode, duration_ms, samples)
+        response['X-Profile-Id'] = str(record.pk)
+        return response
+
+
+def save_profile(request, profiler, mode, duration_ms, samples):
+    from gallery.models import RequestProfile
+
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    ext = 'prof' if mode == 'cprofile' else 'folded'
+    file_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.{ext}"
+    path = os.path.join(directory, file_name)
+    if mode == 'cprofile':
+        profiler.dump_stats(path)
+    else:
+        profiler.write(path)
+
+    match = request.resolver_match
+    record = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        view_name=match.view_name if match else '',
+        mode=mode,
+        duration_ms=duration_ms,
+        samples=samples,
+        file_name=file_name,
+        size=os.path.getsize(path),
+        user=request.user,
+    )
+    prune_profiles()
+    return record
+
+
+def prune_profiles():
+    """Оставляем последние PROFILE_MAX_FILES профилей (файлы удаляет сигнал post_delete)."""
+    from gallery.models import RequestProfile
+
+    keep = getattr(settings, 'PROFILE_MAX_FILES', 50)
+    old_ids = list(RequestProfile.objects.order_by('-created_at', '-id').values_list('id', flat=True)[keep:])
+    for profile in RequestProfile.objects.filter(id__in=old_ids):
+        profile.delete()
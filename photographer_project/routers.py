@@ -0,0 +1,68 @@
+"""
+Маршрутизация чтения на реплику.
+
+Вьюхи, помеченные @use_replica (просмотр альбома, корзина, списки в админке),
+читают модели gallery и orders с алиаса 'replica', если он настроен
+(POSTGRES_REPLICA_HOST). Всё остальное — запись, сессии, auth и любое чтение
+внутри транзакции — идёт в 'default', чтобы не ловить отставание реплики.
+"""
+import contextvars
+import functools
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA_ALIAS = 'replica'
+REPLICA_APPS = {'gallery', 'orders'}
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_enabled():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def use_replica(view):
+    """Декоратор вьюхи: чтение моделей gallery/orders во время вьюхи — с реплики."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReplicaChangelistMixin:
+    """Для ModelAdmin: список объектов в админке читается с реплики (только GET, не действия)."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        return use_replica(super().changelist_view)(request, extra_context)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or not replica_enabled():
+            return None
+        if model._meta.app_label not in REPLICA_APPS:
+            return None
+        # Внутри транзакции читаем то, что только что записали
+        if connections['default'].in_atomic_block:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия default, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_ALIAS:
+            return False
+        return None
@@ -0,0 +1,16 @@
+"""
+Сессии в БД с повтором при блокировке SQLite.
+
+Корзина живёт в сессии, поэтому каждый клик "+/-" в корзине — это запись в
+django_session. Сохранение сессии делается короткой транзакцией с retry_on_lock.
+"""
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+
+from .db import retry_on_lock
+
+
+class SessionStore(DBSessionStore):
+
+    @retry_on_lock
+    def save(self, must_create=False):
+        return super().save(must_create=must_create)
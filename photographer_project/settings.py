@@ -53,11 +53,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Время запроса, SQL, шаблоны, кэш -> Server-Timing и лог медленных запросов
+    'photographer_project.monitoring.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # Профилирование запроса по токену персонала (см. photographer_project/profiling.py)
+    'photographer_project.profiling.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -82,13 +86,64 @@ TEMPLATES = [
 WSGI_APPLICATION = 'photographer_project.wsgi.application'
 
 # Database
-# Для 50 заказов в день SQLite вполне хватит и его проще бэкапить (просто скачать файл)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DJANGO_DB_ENGINE=postgres переключает gallery/orders (и всё остальное) на PostgreSQL.
+# Данные из db.sqlite3 переносятся командой manage.py migrate_sqlite_to_postgres.
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'photosite'),
+        'USER': os.environ.get('POSTGRES_USER', 'photosite'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
-}
+    DATABASES = {'default': _postgres}
+    # Реплика для чтения (просмотр альбомов, корзина, списки в админке) — см. photographer_project/routers.py
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **_postgres,
+            'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', _postgres['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    # Для 50 заказов в день SQLite вполне хватит и его проще бэкапить (просто скачать файл)
+    # Продакшен-профиль SQLite для нескольких воркеров gunicorn:
+    # - WAL: читатели не блокируют писателя и наоборот;
+    # - synchronous=NORMAL: в режиме WAL безопасно и заметно быстрее FULL;
+    # - timeout/busy_timeout: ждём освобождения БД вместо мгновенного "database is locked";
+    # - transaction_mode=IMMEDIATE: транзакция сразу берёт блокировку на запись,
+    #   а не падает посередине при попытке "повысить" читающую транзакцию;
+    # - CONN_MAX_AGE: не открываем файл и не выполняем PRAGMA на каждый запрос.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=20000;'
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA cache_size=-32000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+
+DATABASE_ROUTERS = ['photographer_project.routers.ReplicaRouter']
+
+# Сессии (в них живёт корзина) сохраняются короткой транзакцией с повтором при блокировке
+SESSION_ENGINE = 'photographer_project.sessions'
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -123,6 +178,130 @@ STATIC_ROOT = BASE_DIR / 'static_root'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# --- ON-DEMAND РЕСАЙЗ ФОТО (gallery/resize.py) ---
+# Кэш лежит внутри MEDIA_ROOT, чтобы Nginx мог отдавать готовые файлы сам
+RESIZE_CACHE_DIR = 'resized'
+RESIZE_CACHE_MAX_BYTES = int(os.environ.get('RESIZE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+RESIZE_MAX_DIMENSION = 2000
+# True — отдаём файл через X-Accel-Redirect (нужен internal location в Nginx)
+RESIZE_USE_X_ACCEL = os.environ.get('RESIZE_USE_X_ACCEL', 'False') == 'True'
+
+# --- ХОЛОДНОЕ ХРАНЕНИЕ ИСТЁКШИХ АЛЬБОМОВ (manage.py archive_expired_albums) ---
+COLD_STORAGE_ROOT = os.environ.get('COLD_STORAGE_ROOT', str(BASE_DIR / 'cold_storage'))
+ARCHIVE_GRACE_DAYS = 30  # сколько дней после окончания доступа держим альбом на быстром диске
+
+# Папки внутри MEDIA_ROOT, которые manage.py gc_media не трогает (кэши со своей чисткой)
+MEDIA_GC_EXCLUDE_DIRS = [RESIZE_CACHE_DIR]
+
+# --- СКАЧИВАНИЕ ПОЛНОГО КОМПЛЕКТА (orders/downloads.py) ---
+FULL_SET_DOWNLOAD_MAX_AGE = 7 * 24 * 60 * 60  # ссылка живёт неделю
+# Скачивать можно только после того, как оператор подтвердил оплату
+FULL_SET_DOWNLOAD_STATUSES = ('processing', 'completed')
+
+# --- СТАТИЧЕСКИЕ СНИМКИ СТРАНИЦ ПАПОК (gallery/snapshots.py, manage.py publish_snapshots) ---
+# Nginx отдаёт /album/<token>/ из SNAPSHOT_ROOT/<token>/index.html, если снимок есть
+SNAPSHOTS_ENABLED = os.environ.get('SNAPSHOTS_ENABLED', 'True') == 'True'
+SNAPSHOT_ROOT = os.environ.get('SNAPSHOT_ROOT', str(BASE_DIR / 'snapshots'))
+SNAPSHOT_REBUILD_DELAY = 2.0  # секунды: изменения за это время пересобираются одним проходом
+
+# --- JSON API /api/v1/ (gallery/api.py) ---
+API_PAGE_SIZE = 50
+# Ресайзы в ответе API: имя -> (ширина, высота, формат), ссылки подписаны (gallery/resize.py)
+API_RENDITIONS = {
+    'thumb': (400, 400, 'webp'),
+    'large': (1200, 1200, 'jpeg'),
+}
+
+# --- ПОХОЖИЕ ФОТО: ДУБЛИ И СЕРИИ (gallery/duplicates.py) ---
+# Расстояние Хэмминга между 64-битными dHash: до 6 — тот же кадр (пережатый, уменьшенный)
+DUPLICATE_HAMMING_THRESHOLD = 6
+# Серия: кадры непохожи настолько же, но сняты одной камерой подряд
+BURST_HAMMING_THRESHOLD = 12
+BURST_SECONDS = 3
+
+# --- ПУБЛИКАЦИЯ С ПРОГРЕВОМ (gallery/publish.py, действие «Опубликовать» в админке) ---
+PUBLISH_WORKERS = int(os.environ.get('PUBLISH_WORKERS', 0))  # 0 — по числу ядер, не больше 8
+# Подтянуть превью и ресайзы в page cache ОС (имеет смысл, если памяти хватает на весь садик)
+PUBLISH_PREREAD = os.environ.get('PUBLISH_PREREAD', 'False') == 'True'
+
+# --- ОБЛОЖКИ ПАПОК (gallery/covers.py, manage.py refresh_covers) ---
+# Плитка 3:4 на страницах папок (~300px в сетке, с запасом на плотные экраны) и миниатюра для админки
+COVER_TILE_SIZE = (600, 800)
+COVER_THUMB_SIZE = (120, 120)
+# Изменения фото за это время склеиваются в одну пересборку обложек
+COVER_REFRESH_DELAY = 2.0
+
+# --- ЗАМЕР ЗАПРОСОВ (photographer_project/monitoring.py) ---
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+# Лимит SQL-запросов на страницу (по имени URL). Число не должно расти с количеством фото.
+QUERY_BUDGETS = {
+    'gallery:album_detail': 15,
+    'orders:cart': 15,
+    'orders:cart_photos': 10,
+    'orders:update_cart': 10,
+    'orders:create_order': 25,
+    'orders:order_confirmation': 10,
+    'orders:order_complete': 10,
+    'api_v1:album': 10,
+    'api_v1:album_photos': 10,
+    'api_v1:formats': 10,
+    'api_v1:cart': 10,
+    'admin:orders_order_changelist': 15,
+    'admin:orders_orderitem_changelist': 15,
+    'admin:gallery_photo_changelist': 15,
+}
+# True — превышение бюджета роняет запрос (бенчмарки, нагрузочные прогоны); иначе только предупреждение
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# --- МЕТРИКИ /metrics (photographer_project/metrics.py) ---
+# Общая папка для файлов метрик всех воркеров gunicorn (очищается при перезагрузке сервера)
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/photosite_metrics')
+METRICS_FLUSH_SECONDS = 5
+# Prometheus ходит с заголовком Authorization: Bearer <METRICS_TOKEN>; пустой токен — только персонал
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Адреса без авторизации — только если gunicorn слушает без прокси: за nginx REMOTE_ADDR всегда 127.0.0.1
+METRICS_ALLOWED_IPS = ()
+
+# --- ПРОФИЛИРОВАНИЕ ЗАПРОСОВ ПЕРСОНАЛОМ (photographer_project/profiling.py) ---
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True') == 'True'
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_MAX_FILES = 50
+PROFILE_SAMPLE_INTERVAL = 0.005  # 5 мс между снимками стека
+PROFILE_TOKEN_MAX_AGE = 8 * 60 * 60
+
+# --- КЭШ ---
+# Фрагменты шаблонов ({% cache %} в корзине) — в файлах: общий для всех воркеров gunicorn и переживает рестарт.
+# Django сам берёт для {% cache %} бэкенд с именем 'template_fragments'.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_DIR', str(BASE_DIR / 'cache' / 'fragments')),
+        'TIMEOUT': 7 * 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+# Сколько живёт карточка фото в корзине. Ключ сам меняется при новом превью или правке форматов.
+CART_FRAGMENT_TIMEOUT = 7 * 24 * 60 * 60
+# Корзина больше порога отдаётся первой страницей, остальное браузер догружает при прокрутке (orders:cart_photos)
+CART_PAGINATE_THRESHOLD = 60
+CART_PAGE_SIZE = 24
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_line': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'perf_console': {'class': 'logging.StreamHandler', 'formatter': 'json_line'},
+    },
+    'loggers': {
+        'perf': {'handlers': ['perf_console'], 'level': 'INFO', 'propagate': False},
+    },
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from gallery.models import Photo
+from orders.models import Order
+
+from .routers import REPLICA_ALIAS, ReplicaRouter, use_replica
+
+
+def with_replica():
+    """Реплика-зеркало default: в тестах оба алиаса смотрят в одну БД, как TEST MIRROR в settings.py."""
+    replica = {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    # Роутер смотрит только в settings.DATABASES; override_settings(DATABASES=...) Django не одобряет
+    return mock.patch.dict(settings.DATABASES, {REPLICA_ALIAS: replica})
+
+
+@use_replica
+def read_alias(model):
+    """Алиас, с которого «вьюха» с @use_replica прочитала бы модель."""
+    return model.objects.all().db
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    # TestCase оборачивает каждый тест в транзакцию, а внутри неё роутер и должен читать с default
+
+    def test_use_replica_view_reads_from_replica(self):
+        with with_replica():
+            self.assertEqual(read_alias(Photo), REPLICA_ALIAS)
+            self.assertEqual(read_alias(Order), REPLICA_ALIAS)
+
+    def test_reads_outside_use_replica_go_to_default(self):
+        with with_replica():
+            self.assertEqual(Photo.objects.all().db, 'default')
+
+    def test_other_apps_stay_on_default(self):
+        with with_replica():
+            self.assertEqual(read_alias(User), 'default')
+
+    def test_reads_inside_atomic_block_go_to_default(self):
+        with with_replica(), transaction.atomic():
+            self.assertEqual(read_alias(Photo), 'default')
+
+    def test_without_replica_reads_go_to_default(self):
+        self.assertNotIn(REPLICA_ALIAS, settings.DATABASES)
+        self.assertEqual(read_alias(Photo), 'default')
+
+    def test_writes_go_to_default(self):
+        with with_replica():
+            self.assertIsNone(use_replica(ReplicaRouter().db_for_write)(Photo))
+
+    def test_no_migrations_on_replica(self):
+        router = ReplicaRouter()
+        self.assertIs(router.allow_migrate(REPLICA_ALIAS, 'gallery', 'photo'), False)
+        self.assertIs(router.allow_migrate(REPLICA_ALIAS, 'auth'), False)
+        self.assertIsNone(router.allow_migrate('default', 'gallery', 'photo'))
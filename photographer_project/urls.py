@@ -3,6 +3,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
@@ -12,6 +14,12 @@ urlpatterns = [
 
     # URL для заказов остаются с префиксом 'order/'
     path('order/', include('orders.urls')),
+
+    # JSON API для PWA-фронтенда (доступ по access_token альбома)
+    path('api/v1/', include('gallery.api')),
+
+    # Метрики для Prometheus (персонал или METRICS_TOKEN)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Это нужно для того, чтобы в режиме разработки Django мог отдавать медиа-файлы